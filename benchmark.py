@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import project
+
+
+parser = argparse.ArgumentParser(description="Benchmarks of the Mortgage class, external functions and batch pricing")
+parser.add_argument('--output', help="Path of the .json file with results", type=str,
+                    default="Benchmark_results.json")
+parser.add_argument('--repeat', help="Number of measured calls of every benchmark", type=int, default=200)
+parser.add_argument('--months', help="Repayment periods, months", type=int, nargs='+', default=[12, 120, 360, 480])
+parser.add_argument('--batch-sizes', help="Numbers of loans priced at once by MortgageBatch", type=int, nargs='+',
+                    default=[1000, 10000, 100000])
+parser.add_argument('--compare', help="Path of a previous .json file with results to compare with", type=str)
+parser.add_argument('--threshold', help="Relative slowdown of median latency reported as regression", type=float,
+                    default=0.2)
+
+LOAN = 300000
+RATE = 6.5
+OVERPAYMENT = 50000
+
+
+def measure(name, params, function, repeat, setup=None, calls_per_run=1):
+    """
+    :return: Dictionary with throughput (calls per second), latency percentiles (microseconds) and peak memory
+    (kilobytes, measured with tracemalloc in a separate run) of the given function.
+    """
+    latencies = np.empty(repeat)
+    for i in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        latencies[i] = time.perf_counter() - start
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    function()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'name': name,
+            'params': params,
+            'calls': repeat,
+            'throughput_per_s': calls_per_run * repeat / latencies.sum(),
+            'latency_us': {f'p{percentile}': np.percentile(latencies, percentile) * 1e6
+                           for percentile in (50, 90, 99)},
+            'peak_memory_kb': peak_memory / 1024}
+
+
+def measure_startup(repeat):
+    """
+    :return: Dictionary with latency percentiles of importing the program and calculating one loan in a new process.
+    """
+    code = "import project; project.Mortgage(300000, 6.5, 360, 'equal', 50000).summarize()"
+    latencies = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        latencies[i] = time.perf_counter() - start
+
+    return {'name': 'startup',
+            'params': {},
+            'calls': repeat,
+            'throughput_per_s': repeat / latencies.sum(),
+            'latency_us': {f'p{percentile}': np.percentile(latencies, percentile) * 1e6
+                           for percentile in (50, 90, 99)},
+            'peak_memory_kb': None}
+
+
+def run_benchmarks(repeat, months_list, batch_sizes, startup_repeat=5):
+    """
+    :return: List of results of all benchmarks.
+    """
+    results = []
+
+    for months in months_list:
+        for installments in [project.Mortgage.INSTALLMENTS_TYPE_EQUAL, project.Mortgage.INSTALLMENTS_TYPE_DECREASING]:
+            for overpayment in [None, OVERPAYMENT]:
+                params = {'months': months, 'installments': installments, 'overpayment': overpayment}
+
+                results.append(measure('mortgage_summary', params, lambda: project.Mortgage(
+                    LOAN, RATE, months, installments, overpayment).summarize(), repeat))
+                results.append(measure('mortgage_characteristics', params, lambda: project.Mortgage(
+                    LOAN, RATE, months, installments, overpayment).calculate_loan_characteristics(), repeat))
+
+                def all_outputs():
+                    mortgage = project.Mortgage(LOAN, RATE, months, installments, overpayment)
+                    mortgage.calculate_loan_characteristics()
+                    mortgage.mortgage_attributes_sheet, mortgage.calculation_summary, mortgage.payment_schedule
+                    mortgage.payment_schedule_with_overpayment
+                results.append(measure('mortgage_all_outputs', params, all_outputs, repeat))
+
+                def schedule_buffer():
+                    mortgage = project.Mortgage(LOAN, RATE, months, installments, overpayment)
+                    mortgage.schedule_buffer
+                results.append(measure('mortgage_schedule', params, schedule_buffer, repeat))
+                results.append(measure('mortgage_schedule_in_cents', params, lambda: project.Mortgage(
+                    LOAN, RATE, months, installments, overpayment).calculate_schedule_in_cents(), repeat))
+
+                with tempfile.TemporaryDirectory() as directory:
+                    mortgage = project.Mortgage(LOAN, RATE, months, installments, overpayment)
+                    mortgage.calculate_loan_characteristics()
+                    path_to_save = os.path.join(directory, "Payment_schedule.csv")
+                    results.append(measure('save_schedule_to_csv', params,
+                                           lambda: mortgage.save_schedule_to_csv(path_to_save), repeat))
+
+        params = {'months': months, 'installments': 'equal', 'overpayment': OVERPAYMENT}
+        results.append(measure('generate_mortgage_attributes_sheet', params, lambda: project.
+                               generate_mortgage_attributes_sheet(LOAN, RATE, months, 'equal', OVERPAYMENT), repeat))
+        results.append(measure('calculate_overpayment_saving', params, lambda: project.calculate_overpayment_saving(
+            LOAN, RATE, months, 'equal', OVERPAYMENT), repeat, setup=project.quote_cache.clear))
+        params = {'months': months}
+        results.append(measure('calculate_decreasing_installments_saving', params, lambda: project.
+                               calculate_decreasing_installments_saving(LOAN, RATE, months), repeat,
+                               setup=project.quote_cache.clear))
+
+    generator = np.random.default_rng(0)
+    for batch_size in batch_sizes:
+        loans = (generator.uniform(10000, 900000, batch_size).round(2),
+                 generator.uniform(1, 10, batch_size).round(2),
+                 generator.choice(months_list, batch_size),
+                 generator.choice([project.Mortgage.INSTALLMENTS_TYPE_EQUAL,
+                                   project.Mortgage.INSTALLMENTS_TYPE_DECREASING], batch_size),
+                 np.where(generator.random(batch_size) < 0.5, 5000.0, np.nan))
+        results.append(measure('mortgage_batch', {'batch_size': batch_size}, lambda: project.MortgageBatch(*loans),
+                               max(1, repeat // 20), calls_per_run=batch_size))
+        batch = project.MortgageBatch(*loans)
+        results.append(measure('mortgage_batch_apr', {'batch_size': batch_size}, batch.calculate_apr,
+                               max(1, repeat // 20), calls_per_run=batch_size))
+
+    for installments in [project.Mortgage.INSTALLMENTS_TYPE_EQUAL, project.Mortgage.INSTALLMENTS_TYPE_DECREASING]:
+        mortgage = project.Mortgage(LOAN, RATE, max(months_list), installments, OVERPAYMENT)
+        axes = {'nominal_rate': np.linspace(3, 9, 100), 'period_in_months': np.linspace(120, 480, 100).astype(int),
+                'loan_amount': np.linspace(100000, 1000000, 10)}
+        results.append(measure('mortgage_grid', {'installments': installments, 'shape': [100, 100, 10]},
+                               lambda: project.MortgageGrid(mortgage, **axes), max(1, repeat // 20),
+                               calls_per_run=100 * 100 * 10))
+
+    mortgage = project.Mortgage(LOAN, RATE, max(months_list), project.Mortgage.INSTALLMENTS_TYPE_EQUAL)
+    results.append(measure('rate_scenarios', {'months': max(months_list), 'paths': 1000, 'workers': 1},
+                           lambda: project.simulate_rate_scenarios([mortgage], paths=1000, workers=1),
+                           max(1, repeat // 20), calls_per_run=1000))
+
+    if startup_repeat:
+        results.append(measure_startup(startup_repeat))
+
+    return results
+
+
+def compare_results(results, previous_results, threshold):
+    """
+    :return: List of benchmarks (name, params, previous and current median latency) slower than the previous
+    run by more than the threshold.
+    """
+    previous = {(result['name'], json.dumps(result['params'], sort_keys=True)): result for result in previous_results}
+    regressions = []
+    for result in results:
+        key = (result['name'], json.dumps(result['params'], sort_keys=True))
+        if key in previous:
+            before = previous[key]['latency_us']['p50']
+            after = result['latency_us']['p50']
+            if after > before * (1 + threshold):
+                regressions.append((result['name'], result['params'], before, after))
+    return regressions
+
+
+def main():
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.repeat, args.months, args.batch_sizes)
+    report = {'timestamp': datetime.now(timezone.utc).isoformat(),
+              'python': platform.python_version(),
+              'numpy': np.__version__,
+              'platform': platform.platform(),
+              'results': results}
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    for result in results:
+        print(f"{result['name']:42} {json.dumps(result['params']):70} "
+              f"{result['throughput_per_s']:>14.1f} /s  p50 {result['latency_us']['p50']:>12.1f} us  "
+              f"p99 {result['latency_us']['p99']:>12.1f} us")
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare_results(results, json.load(file)['results'], args.threshold)
+        for name, params, before, after in regressions:
+            print(f"REGRESSION {name} {json.dumps(params)}: p50 {before:.1f} us -> {after:.1f} us")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,16 @@
 import argparse
-import pandas as pd
+import contextlib
+import csv
+import functools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 
 
 parser = argparse.ArgumentParser()
@@ -8,8 +19,283 @@ parser.add_argument('--rate', '-r', help="Nominal interest rate (per year), %",
 parser.add_argument('--months', '-m', help="Repayment period, months", type=int)
 parser.add_argument('--installments', '-i', help="Type of installments [equal, decreasing]", type=str)
 parser.add_argument('--overpayment', '-o', help="Overpayment value, USD (optional)", type=float)
+parser.add_argument('--portfolio', '-p', help="Portfolio mode - path to .csv or .jsonl file with loan parameters "
+                                              "(columns: loan, rate, months, installments, overpayment)", type=str)
+parser.add_argument('--workers', '-w', help="Portfolio mode - number of worker processes (default: number of CPUs)",
+                    type=int)
+parser.add_argument('--output', help="Portfolio mode - path of the summary .csv file", type=str,
+                    default="Portfolio_summary.csv")
+parser.add_argument('--chunk-size', help="Portfolio mode - number of loans priced by a worker at once", type=int,
+                    default=10000)
+parser.add_argument('--store', help="Path of the SQLite result store reused by portfolio mode and runs", type=str)
+parser.add_argument('--store-action', help="Warm the result store with loans of the portfolio file, inspect "
+                                            "or purge it", choices=['warm', 'inspect', 'purge'])
+parser.add_argument('--stream', help="Streaming mode - read loan parameters as JSON lines from stdin and write results "
+                                      "as JSON lines to stdout", action='store_true')
+parser.add_argument('--schedules', help="Streaming mode - add payment schedules to all results", action='store_true')
+parser.add_argument('--serve', help="Serve quotes over HTTP on the given port (GET /quote, /schedule, /metrics)",
+                    type=int)
+parser.add_argument('--host', help="Quote server - host to listen on", type=str, default='127.0.0.1')
+parser.add_argument('--style', help="Style of printed sheets and schedules", choices=['fixed', 'markdown', 'csv'],
+                    default='fixed')
+parser.add_argument('--profile', help="Print wall time and allocated memory blocks of every calculation stage",
+                    action='store_true')
+
+def _pandas():
+    """
+    :return: The pandas module, imported on first use - importing the program and calculating loan characteristics
+    does not need pandas, only DataFrames do.
+    """
+    import pandas
+    return pandas
+
+def _round_array(values, ndigits=2):
+    """
+    Vectorized equivalent of the built-in round() - results are identical to rounding every element separately.
+    Elements lying (almost) exactly halfway between two results are delegated to round() itself.
+    """
+    values = np.asarray(values, dtype=float)
+    scale = 10.0 ** ndigits
+    scaled = values * scale
+    rounded = np.rint(scaled) / scale
+    ambiguous = np.abs(np.abs(scaled - np.floor(scaled)) - 0.5) < 1e-6
+    if ambiguous.any():
+        rounded = np.array(rounded, ndmin=1)
+        rounded[np.array(ambiguous, ndmin=1)] = [round(float(value), ndigits)
+                                                 for value in np.array(values, ndmin=1)[np.array(ambiguous, ndmin=1)]]
+        rounded = rounded.reshape(values.shape)
+    return rounded
+
+def _to_cents(values):
+    """
+    Converting amounts to int64 cents. Amounts are rounded in the same way as by round(value, 2) - this is the only
+    rounding step of the integer cents engine, sums and differences of cents are exact.
+    """
+    return np.rint(_round_array(values) * 100).astype(np.int64)[()]
+
+_profiling_hooks = []
+
+def add_profiling_hook(hook):
+    """
+    Registering a function called after every profiled calculation stage of every Mortgage object with arguments:
+    mortgage, stage (method name), seconds (wall time, including nested stages) and allocations (net change
+    of the number of allocated memory blocks).
+    """
+    _profiling_hooks.append(hook)
+
+def remove_profiling_hook(hook):
+    """
+    Unregistering a function registered with add_profiling_hook.
+    """
+    _profiling_hooks.remove(hook)
+
+def _profiled(method):
+    """
+    Decorator of Mortgage calculation stages - calls profiling hooks if any are registered.
+    Without registered hooks only one list check is added to the call.
+    """
+    stage = method.__name__
+
+    @functools.wraps(method)
+    def profiled_method(self, *args, **kwargs):
+        if not _profiling_hooks:
+            return method(self, *args, **kwargs)
+        allocated_blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        result = method(self, *args, **kwargs)
+        seconds = time.perf_counter() - start
+        allocations = sys.getallocatedblocks() - allocated_blocks
+        for hook in tuple(_profiling_hooks):
+            hook(self, stage, seconds, allocations)
+        return result
+
+    return profiled_method
+
+
+class StageProfiler:
+    """
+    Profiling hook aggregating wall time and allocations of calculation stages across many Mortgage objects.
+    Wall times are collected in histograms with power-of-two microsecond buckets.
+    Can be used as a context manager - it is registered as a profiling hook inside the with block.
+    """
+    def __init__(self):
+        self.stages = defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'allocations': 0,
+                                           'histogram': defaultdict(int)})
+
+    def __call__(self, mortgage, stage, seconds, allocations):
+        statistics = self.stages[stage]
+        statistics['count'] += 1
+        statistics['seconds'] += seconds
+        statistics['max_seconds'] = max(statistics['max_seconds'], seconds)
+        statistics['allocations'] += allocations
+        # bucket b holds wall times shorter than 2 ** b microseconds (and not shorter than 2 ** (b - 1))
+        statistics['histogram'][int(seconds * 1e6).bit_length()] += 1
+
+    def __enter__(self):
+        add_profiling_hook(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        remove_profiling_hook(self)
+
+    @staticmethod
+    def _percentile(histogram, count, percentile):
+        """
+        :return: Upper bound (microseconds) of the histogram bucket holding the given percentile of wall times.
+        """
+        seen = 0
+        for bucket in sorted(histogram):
+            seen += histogram[bucket]
+            if seen >= count * percentile / 100:
+                return 2 ** bucket
+        return 0
+
+    def summary(self):
+        """
+        :return: Dictionary with count, total and mean wall time, approximate p50/p99 wall time (upper bound
+        of the histogram bucket), max wall time and mean allocations of every stage.
+        """
+        return {stage: {'count': statistics['count'],
+                        'total_ms': statistics['seconds'] * 1e3,
+                        'mean_us': statistics['seconds'] / statistics['count'] * 1e6,
+                        'p50_us': self._percentile(statistics['histogram'], statistics['count'], 50),
+                        'p99_us': self._percentile(statistics['histogram'], statistics['count'], 99),
+                        'max_us': statistics['max_seconds'] * 1e6,
+                        'mean_allocations': statistics['allocations'] / statistics['count']}
+                for stage, statistics in self.stages.items()}
+
+    def report(self):
+        """
+        :return: Text table with the summary of all stages, sorted by total wall time.
+        """
+        lines = [f"{'Stage':46}{'Count':>8}{'Total, ms':>12}{'Mean, us':>12}{'p50, us':>10}{'p99, us':>10}"
+                 f"{'Max, us':>12}{'Allocations':>13}"]
+        for stage, statistics in sorted(self.summary().items(), key=lambda item: -item[1]['total_ms']):
+            lines.append(f"{stage:46}{statistics['count']:>8}{statistics['total_ms']:>12.3f}"
+                         f"{statistics['mean_us']:>12.1f}{'<' + str(statistics['p50_us']):>10}"
+                         f"{'<' + str(statistics['p99_us']):>10}{statistics['max_us']:>12.1f}"
+                         f"{statistics['mean_allocations']:>13.1f}")
+        return "\n".join(lines)
+
+
+SCHEDULE_CSV_HEADER = ['', 'Installments', 'Remaining']
+SCHEDULE_WITH_OVERPAYMENT_CSV_HEADER = ['', 'Installments', 'New installments', 'Remaining', 'New remaining']
+DECOMPOSITION_CSV_HEADER = ['Interest', 'Principal', 'Outstanding principal']
+DECOMPOSITION_WITH_OVERPAYMENT_CSV_HEADER = ['Interest', 'New interest', 'Principal', 'New principal',
+                                             'Outstanding principal', 'New outstanding principal']
+SCHEDULE_COLUMNS = ['installments', 'new_installments', 'remaining', 'new_remaining', 'interest', 'new_interest',
+                    'principal', 'new_principal', 'outstanding_principal', 'new_outstanding_principal']
+SUMMARY_DTYPE = np.dtype([('loan_amount', 'f8'), ('nominal_rate', 'f8'), ('period_in_months', 'i8'),
+                          ('installments_type', 'U10'), ('overpayment', 'f8'), ('monthly_payment', 'f8'),
+                          ('total_amount', 'f8'), ('total_interest', 'f8'), ('new_monthly_payment', 'f8'),
+                          ('new_total_amount', 'f8'), ('new_total_interest', 'f8'), ('overpayment_saving', 'f8')])
+
+def _schedule_csv_headers(decomposition):
+    """
+    :return: Headers of payment schedule csv files without and with overpayment.
+    """
+    if decomposition:
+        return (SCHEDULE_CSV_HEADER + DECOMPOSITION_CSV_HEADER,
+                SCHEDULE_WITH_OVERPAYMENT_CSV_HEADER + DECOMPOSITION_WITH_OVERPAYMENT_CSV_HEADER)
+    return SCHEDULE_CSV_HEADER, SCHEDULE_WITH_OVERPAYMENT_CSV_HEADER
+
+RENDER_STYLES = ['fixed', 'markdown', 'csv']
+
+def _format_cell(value):
+    """
+    :return: Text of a sheet value - floats with two decimal places, as in printed DataFrames.
+    """
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+def render_sheet(title, labels, values, file=None, style='fixed'):
+    """
+    Writing a sheet (labelled values, e.g. the calculation summary) to the file (default: stdout) in the fixed-width,
+    Markdown or csv style, without pandas.
+    """
+    if style not in RENDER_STYLES:
+        raise ValueError(Mortgage.VALUE_ERROR_MESSAGES['render_style'])
+    file = file or sys.stdout
+    cells = [_format_cell(value) for value in values]
+    if style == 'csv':
+        csv.writer(file, lineterminator='\n').writerows([['', title]] + list(zip(labels, cells)))
+        return
+    if style == 'markdown':
+        lines = [f"| | {title} |", "|:---|---:|"] + [f"| {label} | {cell} |" for label, cell in zip(labels, cells)]
+    else:
+        label_width = max(map(len, labels))
+        value_width = max(len(title), *map(len, cells))
+        lines = [f"{'':{label_width}}  {title:>{value_width}}"] + \
+                [f"{label:<{label_width}}  {cell:>{value_width}}" for label, cell in zip(labels, cells)]
+    file.write("\n".join(lines) + "\n")
+
+def render_table(values, columns, file=None, style='fixed', index_name='', block_size=1024):
+    """
+    Writing a numeric table (2D array, e.g. the schedule buffer) with rows numbered from 1 to the file
+    (default: stdout) in the fixed-width, Markdown or csv style, without pandas and without truncating rows.
+    Rows are formatted straight from the array, block_size rows at a time, with two decimal places.
+    """
+    if style not in RENDER_STYLES:
+        raise ValueError(Mortgage.VALUE_ERROR_MESSAGES['render_style'])
+    file = file or sys.stdout
+    values = np.asarray(values, dtype=float)
+    if style == 'csv':
+        header = ",".join([index_name] + list(columns))
+        row_format = "{}" + ",{:.2f}" * len(columns)
+    elif style == 'markdown':
+        header = "| " + " | ".join([index_name] + list(columns)) + " |\n|" + "---:|" * (len(columns) + 1)
+        row_format = "| {} |" + " {:.2f} |" * len(columns)
+    else:
+        # column widths fit the header and the longest of the largest and the smallest values
+        index_width = max(len(index_name), len(str(len(values))))
+        widths = [max(len(column), len(f"{values[:, number].max():.2f}"), len(f"{values[:, number].min():.2f}"))
+                  for number, column in enumerate(columns)]
+        header = f"{index_name:>{index_width}}" + "".join(f"  {column:>{width}}"
+                                                            for column, width in zip(columns, widths))
+        row_format = f"{{:>{index_width}}}" + "".join(f"  {{:>{width}.2f}}" for width in widths)
+
+    file.write(header + "\n")
+    for start in range(0, len(values), block_size):
+        file.write("".join(row_format.format(number, *row) + "\n" for number, row in
+                           enumerate(values[start:start + block_size].tolist(), start=start + 1)))
+
+MortgageQuote = namedtuple('MortgageQuote', ['loan_amount', 'nominal_rate', 'period_in_months', 'installments_type',
+                                             'overpayment', 'monthly_payment', 'total_amount', 'total_interest',
+                                             'new_monthly_payment', 'new_total_amount', 'new_total_interest',
+                                             'overpayment_saving'])
+
+IRRResult = namedtuple('IRRResult', ['rate', 'converged', 'iterations'])
+
+ScenarioResult = namedtuple('ScenarioResult', ['percentiles', 'total_interest', 'payment_shock'])
+
+ValidationResult = namedtuple('ValidationResult', ['valid', 'errors'])
+
+
+class _cached_attribute:
+    """
+    Attribute calculated by the decorated method on first access and stored in the instance's cache.
+    The cache is cleared whenever one of the input parameters is changed.
+    """
+    def __init__(self, method):
+        self.method = method
+        self.name = method.__name__
+        self.__doc__ = method.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        try:
+            return instance._cache[self.name]
+        except KeyError:
+            value = instance._cache[self.name] = self.method(instance)
+            return value
+
+    def __set__(self, instance, value):
+        instance._cache[self.name] = value
+
 
 class Mortgage:
+    __slots__ = ('_loan_amount', '_nominal_rate', '_period_in_months', '_installments_type', '_overpayment', '_cache')
+
     INSTALLMENTS_TYPE_EQUAL = 'equal'
     INSTALLMENTS_TYPE_DECREASING = 'decreasing'
     VALUE_ERROR_MESSAGES = {
@@ -32,38 +318,26 @@ class Mortgage:
         'installments_type_wrong_format': "Wrong installments type format given. Please use string out "
                                           "of: 'equal', 'decreasing'.\n\n",
         'overpayment_wrong_format': "Wrong overpayment format given. Please use float or int value "
-                                    "greater than 0 and less than or equal to the amount of the loan.\n\n"}
+                                    "greater than 0 and less than or equal to the amount of the loan.\n\n",
+        'overpayment_event': "An incorrect overpayment event was given. Please use pairs of month (int value from "
+                             "0 to the repayment period) and amount (float or int value greater than 0).\n\n",
+        'overpayment_strategy': "An incorrect overpayment strategy was given. Please use string out "
+                                "of: 'shorten', 'reduce'.\n\n",
+        'rate_change': "An incorrect rate change was given. Please use pairs of month (int value from 1 to the "
+                       "repayment period) and nominal rate (float or int value greater than 0).\n\n",
+        'render_style': "An incorrect render style was given. Please use string out of: 'fixed', 'markdown', "
+                        "'csv'.\n\n",
+        'portfolio_format': "An incorrect portfolio file was given. Please use a file with one of extensions: "
+                            "'.csv', '.jsonl', '.json'.\n\n"}
 
     def __init__(self, loan_amount, nominal_rate, period_in_months, installments_type, overpayment=None):
+        self._cache = {}
         self.loan_amount = loan_amount
         self.nominal_rate = nominal_rate
         self.period_in_months = period_in_months
         self.installments_type = installments_type
         self.overpayment = overpayment
 
-        self.monthly_payment = None
-        self.all_installments = None
-        self.total_amount = None
-        self.total_interest = None
-        self.remaining = None
-        self.new_monthly_payment = None
-        self.new_all_installments = None
-        self.new_total_amount = None
-        self.new_total_interest = None
-        self.new_remaining = None
-
-        self.calculate_loan_characteristics()
-        if self.overpayment:
-            self.overpayment_saving = self.calculate_overpayment_saving()
-
-        self.mortgage_attributes_sheet = self.generate_mortgage_attributes_sheet()
-        self.calculation_summary = self.generate_calculation_summary()
-        self.payment_schedule = self.generate_payment_schedule()
-        if self.overpayment:
-            self.payment_schedule_with_overpayment = self.generate_payment_schedule_with_overpayment()
-
-        pd.options.display.float_format = '{:.2f}'.format
-
     @property
     def loan_amount(self):
         return self._loan_amount
@@ -73,7 +347,12 @@ class Mortgage:
         if isinstance(loan_amount, float) or isinstance(loan_amount, int):
             if loan_amount <= 0:
                 raise ValueError(self.VALUE_ERROR_MESSAGES['loan_amount'])
+            # overpayment is not set yet when the loan amount is set in __init__
+            overpayment = getattr(self, '_overpayment', None)
+            if overpayment and overpayment > loan_amount:
+                raise ValueError(self.VALUE_ERROR_MESSAGES['overpayment'])
             self._loan_amount = loan_amount
+            self._cache.clear()
         else:
             raise ValueError(self.VALUE_ERROR_MESSAGES['loan_amount_wrong_format'])
 
@@ -87,6 +366,7 @@ class Mortgage:
             if nominal_rate <= 0:
                 raise ValueError(self.VALUE_ERROR_MESSAGES['nominal_rate'])
             self._nominal_rate = nominal_rate
+            self._cache.clear()
         else:
             raise ValueError(self.VALUE_ERROR_MESSAGES['nominal_rate_wrong_format'])
 
@@ -100,6 +380,7 @@ class Mortgage:
             if period_in_months <= 0:
                 raise ValueError(self.VALUE_ERROR_MESSAGES['period_in_months'])
             self._period_in_months = period_in_months
+            self._cache.clear()
         else:
             raise ValueError(self.VALUE_ERROR_MESSAGES['period_in_months_wrong_format'])
 
@@ -113,6 +394,7 @@ class Mortgage:
             if installments_type not in [self.INSTALLMENTS_TYPE_EQUAL, self.INSTALLMENTS_TYPE_DECREASING]:
                 raise ValueError(self.VALUE_ERROR_MESSAGES['installments_type'])
             self._installments_type = installments_type
+            self._cache.clear()
         else:
             raise ValueError(self.VALUE_ERROR_MESSAGES['installments_type_wrong_format'])
 
@@ -131,26 +413,175 @@ class Mortgage:
                 raise ValueError(self.VALUE_ERROR_MESSAGES['overpayment_wrong_format'])
         else:
             self._overpayment = overpayment
+        self._cache.clear()
+
+    @_cached_attribute
+    def schedule_buffer(self):
+        """
+        Payment schedule stored once in one contiguous float array, one row per month. Columns: installments,
+        remaining or (with overpayment) installments, new installments, remaining, new remaining.
+        Installment and remaining attributes as well as payment schedule DataFrames are views of this array.
+        The array is read-only and cached only when it is completely filled.
+        """
+        buffer = np.empty((self.period_in_months, 4 if self.overpayment else 2))
+        installments = ['all_installments', 'new_all_installments'] if self.overpayment else ['all_installments']
+        try:
+            # installments are stored first - remaining amounts are calculated from them through views of the buffer
+            for column, name in enumerate(installments):
+                buffer[:, column] = self.calculate_all_installments(if_overpayment=bool(column))
+                self._cache[name] = buffer[:, column]
+            for column in range(len(installments)):
+                buffer[:, len(installments) + column] = self.calculate_remaining(if_overpayment=bool(column))
+        except BaseException:
+            for name in installments:
+                self._cache.pop(name, None)
+            raise
+
+        buffer.setflags(write=False)
+        # views cached while the buffer was filled are writable - they are replaced with read-only views
+        for column, name in enumerate(installments):
+            self._cache[name] = buffer[:, column]
+        return buffer
+
+    @_cached_attribute
+    def decomposition_buffer(self):
+        """
+        Split of every installment stored in one contiguous float array, one row per month. Columns: interest,
+        principal, outstanding principal or (with overpayment) interest, new interest, principal, new principal,
+        outstanding principal, new outstanding principal.
+        """
+        if not self.overpayment:
+            return self.calculate_decomposition(if_overpayment=False)
+        buffer = np.empty((self.period_in_months, 6))
+        buffer[:, ::2] = self.calculate_decomposition(if_overpayment=False)
+        buffer[:, 1::2] = self.calculate_decomposition(if_overpayment=True)
+        return buffer
+
+    @_cached_attribute
+    def monthly_payment(self):
+        return self.calculate_monthly_payment(if_overpayment=False)
+
+    @_cached_attribute
+    def all_installments(self):
+        return self.schedule_buffer[:, 0]
+
+    @_cached_attribute
+    def total_amount(self):
+        return self.calculate_total_amount(if_overpayment=False)
+
+    @_cached_attribute
+    def total_interest(self):
+        return self.calculate_total_interest(if_overpayment=False)
+
+    @_cached_attribute
+    def remaining(self):
+        return self.schedule_buffer[:, 2 if self.overpayment else 1]
+
+    @_cached_attribute
+    def new_monthly_payment(self):
+        return self.calculate_monthly_payment(if_overpayment=True) if self.overpayment else None
+
+    @_cached_attribute
+    def new_all_installments(self):
+        return self.schedule_buffer[:, 1] if self.overpayment else None
+
+    @_cached_attribute
+    def new_total_amount(self):
+        return self.calculate_total_amount(if_overpayment=True) if self.overpayment else None
+
+    @_cached_attribute
+    def new_total_interest(self):
+        return self.calculate_total_interest(if_overpayment=True) if self.overpayment else None
 
+    @_cached_attribute
+    def new_remaining(self):
+        return self.schedule_buffer[:, 3] if self.overpayment else None
+
+    @_cached_attribute
+    def apr(self):
+        return self.calculate_apr(if_overpayment=False)
+
+    @_cached_attribute
+    def new_apr(self):
+        return self.calculate_apr(if_overpayment=True) if self.overpayment else None
+
+    @_cached_attribute
+    def interest(self):
+        return self.decomposition_buffer[:, 0]
+
+    @_cached_attribute
+    def principal(self):
+        return self.decomposition_buffer[:, 2 if self.overpayment else 1]
+
+    @_cached_attribute
+    def outstanding_principal(self):
+        return self.decomposition_buffer[:, 4 if self.overpayment else 2]
+
+    @_cached_attribute
+    def new_interest(self):
+        return self.decomposition_buffer[:, 1] if self.overpayment else None
+
+    @_cached_attribute
+    def new_principal(self):
+        return self.decomposition_buffer[:, 3] if self.overpayment else None
+
+    @_cached_attribute
+    def new_outstanding_principal(self):
+        return self.decomposition_buffer[:, 5] if self.overpayment else None
+
+    @_cached_attribute
+    def overpayment_saving(self):
+        return self.calculate_overpayment_saving() if self.overpayment else None
+
+    @_cached_attribute
+    def mortgage_attributes_sheet(self):
+        return self.generate_mortgage_attributes_sheet()
+
+    @_cached_attribute
+    def calculation_summary(self):
+        return self.generate_calculation_summary()
+
+    @_cached_attribute
+    def payment_schedule(self):
+        return self.generate_payment_schedule()
+
+    @_cached_attribute
+    def payment_schedule_with_overpayment(self):
+        return self.generate_payment_schedule_with_overpayment() if self.overpayment else None
+
+    @_cached_attribute
+    def payment_decomposition(self):
+        return self.generate_payment_decomposition()
+
+    @_cached_attribute
+    def payment_decomposition_with_overpayment(self):
+        return self.generate_payment_decomposition_with_overpayment() if self.overpayment else None
+
+    @_profiled
     def calculate_loan_characteristics(self):
         """
         Calling methods that calculate loan characteristics before and after overpayment.
+        All characteristics are also calculated lazily on first access - this method calculates them at once.
+        Installments and remaining amounts are views of the schedule buffer, as on lazy access.
         """
+        schedule_buffer = self.schedule_buffer
+
         # all characteristics
         self.monthly_payment = self.calculate_monthly_payment(if_overpayment=False)
-        self.all_installments = self.calculate_all_installments(if_overpayment=False)
+        self.all_installments = schedule_buffer[:, 0]
         self.total_amount = self.calculate_total_amount(if_overpayment=False)
         self.total_interest = self.calculate_total_interest(if_overpayment=False)
-        self.remaining = self.calculate_remaining(if_overpayment=False)
+        self.remaining = schedule_buffer[:, 2 if self.overpayment else 1]
 
         # all characteristics updated by overpayment
         if self.overpayment:
             self.new_monthly_payment = self.calculate_monthly_payment(if_overpayment=True)
-            self.new_all_installments = self.calculate_all_installments(if_overpayment=True)
+            self.new_all_installments = schedule_buffer[:, 1]
             self.new_total_amount = self.calculate_total_amount(if_overpayment=True)
             self.new_total_interest = self.calculate_total_interest(if_overpayment=True)
-            self.new_remaining = self.calculate_remaining(if_overpayment=True)
+            self.new_remaining = schedule_buffer[:, 3]
 
+    @_profiled
     def calculate_monthly_payment(self, if_overpayment):
         """
         Calculating one of loan characteristics - monthly payment
@@ -161,19 +592,16 @@ class Mortgage:
             overpayment = 0
 
         if self.installments_type == self.INSTALLMENTS_TYPE_EQUAL:
-            sigma = 0
-            i = 1
-            while i <= self.period_in_months:
-                sigma += (1 + self.nominal_rate / 100 / 12) ** (-i)
-                i += 1
+            sigma = calculate_annuity_factor(self.nominal_rate, self.period_in_months)
             monthly_payment = (self.loan_amount - overpayment) / sigma
-            return round(monthly_payment, 2)
+            return round(float(monthly_payment), 2)
 
         elif self.installments_type == self.INSTALLMENTS_TYPE_DECREASING:
             first_month_payment = (self.loan_amount - overpayment) / self.period_in_months * \
                                   (1 + (self.period_in_months * self.nominal_rate / 100 / 12))
             return round(first_month_payment, 2)
 
+    @_profiled
     def calculate_all_installments(self, if_overpayment):
         """
         Calculating one of loan characteristics - all installments
@@ -186,25 +614,25 @@ class Mortgage:
             overpayment = 0
 
         if self.installments_type == self.INSTALLMENTS_TYPE_EQUAL:
-            return [monthly_payment] * self.period_in_months
+            return np.full(self.period_in_months, monthly_payment)
 
         elif self.installments_type == self.INSTALLMENTS_TYPE_DECREASING:
-            all_installments = []
-            for month in reversed(range(1, self.period_in_months + 1)):
-                installment = (self.loan_amount - overpayment) / self.period_in_months * \
-                              (1 + (month * self.nominal_rate / 100 / 12))
-                all_installments.append(round(installment, 2))
-            return all_installments
+            month = np.arange(self.period_in_months, 0, -1, dtype=float)
+            return _round_array((self.loan_amount - overpayment) / self.period_in_months *
+                                (1 + (month * self.nominal_rate / 100 / 12)))
 
+    @_profiled
     def calculate_total_amount(self, if_overpayment):
         """
         Calculating one of loan characteristics - total amount
         """
+        # cumulative sum adds installments one by one, in the same order as sum() of all installments
         if if_overpayment:
-            return round(sum(self.new_all_installments), 2)
+            return round(float(np.cumsum(self.new_all_installments)[-1]), 2)
         else:
-            return round(sum(self.all_installments), 2)
+            return round(float(np.cumsum(self.all_installments)[-1]), 2)
 
+    @_profiled
     def calculate_total_interest(self, if_overpayment):
         """
         Calculating one of loan characteristics - total interest
@@ -214,139 +642,2385 @@ class Mortgage:
         else:
             return round(self.total_amount - self.loan_amount, 2)
 
+    @_profiled
     def calculate_remaining(self, if_overpayment):
         """
         Calculating one of loan characteristics - remainig
         """
+        # adding 0.0 turns -0.0 (rounded tiny negative differences) into 0.0
         if if_overpayment:
-            remaining = [round(self.new_total_amount - self.new_all_installments[0], 2)]
-            for i in range(0, len(self.new_all_installments) - 1):
-                remaining.append(round(remaining[i] - self.new_all_installments[i + 1], 2))
+            return _round_array(self.new_total_amount - np.cumsum(self.new_all_installments)) + 0.0
         else:
-            remaining = [round(self.total_amount - self.all_installments[0], 2)]
-            for i in range(0, len(self.all_installments) - 1):
-                remaining.append(round(remaining[i] - self.all_installments[i + 1], 2))
+            return _round_array(self.total_amount - np.cumsum(self.all_installments)) + 0.0
+
+    @_profiled
+    def calculate_decomposition(self, if_overpayment):
+        """
+        Calculating interest, principal and outstanding principal of every installment (columns of returned array).
+        Balance after month k follows from all installments I(j) with cumulative products and sums:
+        B(k) = (1 + r) ** k * (L - sum of I(j) * (1 + r) ** (-j) for j <= k), interest of month k is B(k - 1) * r
+        rounded to cents and principal is the rest of the installment (at most the outstanding principal). The last
+        principal repays the outstanding principal, hence principal sums to the loan amount and interest to the total
+        interest (interest absorbs the difference between the rounded and the exact equal installment). No part is
+        negative: when installments do not repay the loan, the last interest is 0 and the rest of the loan is left as
+        the last outstanding principal.
+        """
+        loan_amount = self.loan_amount - (self.overpayment if if_overpayment else 0)
+        monthly_rate = self.nominal_rate / 100 / 12
+        installments = self._installments_in_cents(if_overpayment)
+
+        growth = np.cumprod(np.full(self.period_in_months, 1 + monthly_rate))
+        balance = growth * (loan_amount - np.cumsum(installments / 100 / growth))
+        interest = _to_cents(np.concatenate(([loan_amount], balance[:-1])) * monthly_rate)
+        principal = installments - interest
+        principal[-1] = installments[-1]
+        # outstanding principal is not negative - installments exceeding it (after rounding) are paid as interest,
+        # and the part of the loan not repaid by the last installment is left as outstanding principal
+        outstanding_principal = np.maximum(_to_cents(loan_amount) - np.cumsum(principal), 0)
+        principal = -np.diff(outstanding_principal, prepend=_to_cents(loan_amount))
+        interest = installments - principal
 
-        return remaining
+        return np.column_stack((interest, principal, outstanding_principal)) / 100
+
+    @_profiled
+    def calculate_apr(self, if_overpayment):
+        """
+        Calculating APR - effective annual rate (%) of cash flows of the loan: amount received (loan amount less
+        overpayment, which is treated as an upfront cash flow) and all installments.
+        """
+        if if_overpayment:
+            received, installments = self.loan_amount - self.overpayment, self.new_all_installments
+        else:
+            received, installments = self.loan_amount, self.all_installments
+        cash_flows = np.concatenate(([-received], installments))
+        monthly_rate = calculate_irr(cash_flows, guess=self.nominal_rate / 100 / 12).rate[0]
+        return float(calculate_effective_annual_rate(monthly_rate))
 
+    @_profiled
     def calculate_overpayment_saving(self):
         """
         Calculating overpayment saving.
         """
         return round(self.total_interest - self.new_total_interest, 2)
 
+    @_profiled
+    def calculate_totals(self, if_overpayment):
+        """
+        Calculating monthly payment, total amount and total interest without calculating all installments
+        (no per-month lists are created). Results are identical to the ones of the calculate_* methods.
+        """
+        if if_overpayment:
+            overpayment = self.overpayment
+        else:
+            overpayment = 0
+
+        monthly_payment = self.calculate_monthly_payment(if_overpayment)
+        if self.installments_type == self.INSTALLMENTS_TYPE_EQUAL:
+            total_amount = round(monthly_payment * self.period_in_months, 2)
+        else:
+            month = np.arange(self.period_in_months, 0, -1, dtype=float)
+            installments = _round_array((self.loan_amount - overpayment) / self.period_in_months *
+                                        (1 + (month * self.nominal_rate / 100 / 12)))
+            # cumulative sum adds installments one by one, in the same order as sum() of all installments
+            total_amount = round(float(np.cumsum(installments)[-1]), 2)
+        total_interest = round(total_amount - (self.loan_amount - overpayment), 2)
+        return monthly_payment, total_amount, total_interest
+
+    def simulate_overpayments(self, events, strategy='shorten'):
+        """
+        Simulating the loan with overpayment events - pairs of (month, amount), e.g. from recurring_overpayments.
+        Overpayment of the Mortgage object (if any) is an additional event in month 0.
+        :return: OverpaymentPlanBatch with one plan.
+        """
+        if self.overpayment:
+            events = [(0, self.overpayment)] + list(events)
+        return OverpaymentPlanBatch(self.loan_amount, self.nominal_rate, self.period_in_months, self.installments_type,
+                                    [events], strategy)
+
+    def simulate_rate_changes(self, rate_changes):
+        """
+        Simulating the loan with variable nominal rate - rate_changes are pairs of (month, nominal rate), the rate
+        applies from the given month onwards. Overpayment of the Mortgage object (if any) lowers the loan amount.
+        :return: VariableRateBatch with one loan.
+        """
+        return VariableRateBatch(self.loan_amount - (self.overpayment or 0), self.nominal_rate, self.period_in_months,
+                                 self.installments_type, [rate_changes])
+
+    def summarize(self):
+        """
+        The method returns an immutable MortgageQuote with input parameters and summary characteristics.
+        Characteristics that were not calculated yet are calculated without payment schedules.
+        """
+        if 'total_amount' not in self._cache:
+            self.monthly_payment, self.total_amount, self.total_interest = self.calculate_totals(False)
+        if self.overpayment and 'new_total_amount' not in self._cache:
+            self.new_monthly_payment, self.new_total_amount, self.new_total_interest = self.calculate_totals(True)
+
+        return MortgageQuote(self.loan_amount, self.nominal_rate, self.period_in_months, self.installments_type,
+                             self.overpayment, self.monthly_payment, self.total_amount, self.total_interest,
+                             self.new_monthly_payment, self.new_total_amount, self.new_total_interest,
+                             self.overpayment_saving)
+
+    @classmethod
+    def quote(cls, loan_amount, nominal_rate, period_in_months, installments_type, overpayment=None):
+        """
+        Validating input values and calculating summary characteristics only (no payment schedules, no DataFrames).
+        :return: MortgageQuote - immutable record of input parameters and summary characteristics.
+        """
+        return cls(loan_amount, nominal_rate, period_in_months, installments_type, overpayment).summarize()
+
+    def _installments_in_cents(self, if_overpayment):
+        """
+        :return: All installments in int64 cents - every installment is rounded to cents once.
+        """
+        overpayment = self.overpayment if if_overpayment else 0
+        if self.installments_type == self.INSTALLMENTS_TYPE_EQUAL:
+            sigma = calculate_annuity_factor(self.nominal_rate, self.period_in_months)
+            return np.full(self.period_in_months, _to_cents((self.loan_amount - overpayment) / sigma))
+        month = np.arange(self.period_in_months, 0, -1, dtype=float)
+        return _to_cents((self.loan_amount - overpayment) / self.period_in_months *
+                         (1 + (month * self.nominal_rate / 100 / 12)))
+
+    @_profiled
+    def calculate_schedule_in_cents(self):
+        """
+        Integer cents counterpart of the schedule buffer - payment schedule in int64 cents with the same columns.
+        Installments are rounded to cents once, remaining amounts are exact differences of integers (no float drift
+        and no rounding of every month). The schedule is not cached.
+        """
+        schedule = np.empty((self.period_in_months, 4 if self.overpayment else 2), dtype=np.int64)
+        step = 2 if self.overpayment else 1
+        for column, if_overpayment in enumerate([False, True][:step]):
+            installments = self._installments_in_cents(if_overpayment)
+            paid = np.cumsum(installments)
+            schedule[:, column] = installments
+            schedule[:, column + step] = paid[-1] - paid
+        return schedule
+
+    def summarize_in_cents(self):
+        """
+        Integer cents counterpart of summarize - MortgageQuote with all amounts (loan amount, overpayment and summary
+        characteristics) in int64 cents. Totals are exact sums of installments rounded to cents.
+        """
+        totals = []
+        for if_overpayment in [False, True][:2 if self.overpayment else 1]:
+            principal = _to_cents(self.loan_amount - (self.overpayment if if_overpayment else 0))
+            if self.installments_type == self.INSTALLMENTS_TYPE_EQUAL:
+                monthly_payment = int(self._installments_in_cents(if_overpayment)[0])
+                total_amount = monthly_payment * self.period_in_months
+            else:
+                installments = self._installments_in_cents(if_overpayment)
+                monthly_payment, total_amount = int(installments[0]), int(installments.sum())
+            totals += [monthly_payment, total_amount, total_amount - int(principal)]
+        if not self.overpayment:
+            return MortgageQuote(int(_to_cents(self.loan_amount)), self.nominal_rate, self.period_in_months,
+                                 self.installments_type, None, *totals, None, None, None, None)
+        return MortgageQuote(int(_to_cents(self.loan_amount)), self.nominal_rate, self.period_in_months,
+                             self.installments_type, int(_to_cents(self.overpayment)), *totals, totals[2] - totals[5])
+
+    def cross_check_cents(self):
+        """
+        Comparing results of the integer cents engine with the float results of the Mortgage class.
+        :return: List of differences - (characteristic, month or None, float result in cents, integer cents result).
+        Empty list if both engines give identical results.
+        """
+        differences = []
+        for name, float_value, cents_value in zip(MortgageQuote._fields, self.summarize(), self.summarize_in_cents()):
+            if name != 'nominal_rate' and isinstance(float_value, float) and _to_cents(float_value) != cents_value:
+                differences.append((name, None, int(_to_cents(float_value)), cents_value))
+
+        float_schedule = _to_cents(self.schedule_buffer)
+        cents_schedule = self.calculate_schedule_in_cents()
+        columns = SCHEDULE_COLUMNS if self.overpayment else SCHEDULE_COLUMNS[::2]
+        for row, column in zip(*np.nonzero(float_schedule != cents_schedule)):
+            differences.append((columns[column], int(row) + 1, int(float_schedule[row, column]),
+                                int(cents_schedule[row, column])))
+        return differences
+
+    @_profiled
     def generate_mortgage_attributes_sheet(self):
         """
         The method returns a DataFrame with input loan parameters.
         """
+        row_labels, all_data = self._attributes_sheet_rows()
+        data = {'Mortgage attributes sheet': all_data}
+
+        return _pandas().DataFrame(data=data, index=row_labels)
+
+    def _attributes_sheet_rows(self):
+        """
+        :return: Row labels and values of the mortgage attributes sheet.
+        """
         all_data = [self.loan_amount, self.nominal_rate, self.period_in_months, self.installments_type]
         row_labels = ['Loan amount', 'Nominal interest rate, %', 'Repayment period, months', 'Type of installments']
         if self.overpayment:
             all_data += ['------', self.overpayment]
             row_labels += ['---', 'Overpayment']
+        return row_labels, all_data
 
-        data = {'Mortgage attributes sheet': all_data}
-
-        return pd.DataFrame(data=data, index=row_labels)
-
+    @_profiled
     def generate_calculation_summary(self):
         """
         The method returns a DataFrame with loan characteristics calculated based on input parameters.
         """
+        row_labels, all_data = self._calculation_summary_rows()
+        data = {'Calculation result': all_data}
+
+        return _pandas().DataFrame(data=data, index=row_labels)
+
+    def _calculation_summary_rows(self):
+        """
+        :return: Row labels and values of the calculation summary.
+        """
         all_data = [self.total_amount, self.total_interest, self.monthly_payment]
         row_labels = ['Total amount to be repaid', 'Total interest', 'Monthly payment']
         if self.overpayment:
             all_data += ['------', self.overpayment_saving, self.new_total_amount, self.new_total_interest, self.new_monthly_payment]
             row_labels += ['---', 'Overpayment saving', 'New total amount to be repaid', 'New total interest', 'New monthly payment', ]
-        data = {'Calculation result': all_data}
-
-        return pd.DataFrame(data=data, index=row_labels)
+        return row_labels, all_data
 
+    @_profiled
     def generate_payment_schedule(self):
         """
         The method returns a DataFrame with calculated payment schedule (not including overpayment).
+        The DataFrame is a view of the schedule buffer (no data is copied).
         """
-        data = {'Installments': self.all_installments,
-                'Remaining': self.remaining}
+        data = self.schedule_buffer[:, ::2] if self.overpayment else self.schedule_buffer
         row_labels = range(1, self.period_in_months+1)
-        return pd.DataFrame(data=data, index=row_labels)
+        return _pandas().DataFrame(data=data, index=row_labels, columns=['Installments', 'Remaining'], copy=False)
 
+    @_profiled
     def generate_payment_schedule_with_overpayment(self):
         """
         The method returns a DataFrame with calculated payment schedule (including overpayment).
+        The DataFrame is a view of the schedule buffer (no data is copied).
+        """
+        row_labels = range(1, self.period_in_months+1)
+        return _pandas().DataFrame(data=self.schedule_buffer, index=row_labels,
+                            columns=['Installments', 'New installments', 'Remaining', 'New remaining'], copy=False)
+
+    @_profiled
+    def generate_payment_decomposition(self):
+        """
+        The method returns a DataFrame with installments split into interest and principal (not including
+        overpayment).
+        """
+        decomposition = self.decomposition_buffer[:, ::2] if self.overpayment else self.decomposition_buffer
+        row_labels = range(1, self.period_in_months+1)
+        return _pandas().DataFrame(data=np.column_stack((self.all_installments, decomposition)), index=row_labels,
+                                   columns=['Installments'] + DECOMPOSITION_CSV_HEADER)
+
+    @_profiled
+    def generate_payment_decomposition_with_overpayment(self):
+        """
+        The method returns a DataFrame with installments split into interest and principal (including overpayment).
+        """
+        row_labels = range(1, self.period_in_months+1)
+        return _pandas().DataFrame(data=np.column_stack((self.schedule_buffer[:, :2], self.decomposition_buffer)),
+                                   index=row_labels,
+                                   columns=['Installments', 'New installments'] + DECOMPOSITION_WITH_OVERPAYMENT_CSV_HEADER)
+
+    def clear_cache(self):
+        """
+        Removing all calculated characteristics, summaries and schedules - they are calculated again on next access.
+        """
+        self._cache.clear()
+
+    def iter_schedule(self, with_overpayment=False, decomposition=False):
+        """
+        Generator of payment schedule rows, one month at a time: (month, installment, remaining) or, with overpayment,
+        (month, installment, new installment, remaining, new remaining). Values are identical to the payment
+        schedule DataFrames, but no per-month arrays are built unless the schedule buffer was already calculated.
+        With decomposition, rows end with interest, principal and outstanding principal (and their new values with
+        overpayment) - these rows are read from the schedule and decomposition buffers.
         """
-        new_df = self.payment_schedule.copy(deep=True)
-        new_df['New installments'] = self.new_all_installments
-        new_df['New remaining'] = self.new_remaining
-        return new_df[['Installments','New installments','Remaining','New remaining']]
+        with_overpayment = bool(with_overpayment and self.overpayment)
+        if decomposition:
+            columns = self.schedule_buffer if with_overpayment or not self.overpayment else self.schedule_buffer[:, ::2]
+            split = self.decomposition_buffer if with_overpayment or not self.overpayment else \
+                self.decomposition_buffer[:, ::2]
+            for month, row in enumerate(np.hstack((columns, split)).tolist(), start=1):
+                yield (month, *row)
+            return
+        if 'schedule_buffer' in self._cache:
+            columns = self.schedule_buffer if with_overpayment or not self.overpayment else self.schedule_buffer[:, ::2]
+            for month, row in enumerate(columns.tolist(), start=1):
+                yield (month, *row)
+            return
 
-    def save_schedule_to_csv(self, path_to_save):
+        schedules = [self._iter_installments_and_remaining(if_overpayment=False)]
+        if with_overpayment:
+            schedules.append(self._iter_installments_and_remaining(if_overpayment=True))
+        for month, rows in enumerate(zip(*schedules), start=1):
+            if with_overpayment:
+                (installment, remaining), (new_installment, new_remaining) = rows
+                yield month, installment, new_installment, remaining, new_remaining
+            else:
+                yield (month, *rows[0])
+
+    def _iter_installments_and_remaining(self, if_overpayment):
+        """
+        Generator of (installment, remaining) pairs calculated month by month in the same way as
+        calculate_all_installments and calculate_remaining.
+        """
+        if if_overpayment:
+            overpayment = self.overpayment
+            monthly_payment, total_amount, total_interest = self.calculate_totals(if_overpayment=True)
+        else:
+            overpayment = 0
+            monthly_payment, total_amount, total_interest = self.calculate_totals(if_overpayment=False)
+
+        # adding 0.0 turns -0.0 (rounded tiny negative differences) into 0.0, as in calculate_remaining
+        paid = 0.0
+        if self.installments_type == self.INSTALLMENTS_TYPE_EQUAL:
+            for month in range(self.period_in_months):
+                paid += monthly_payment
+                yield monthly_payment, round(total_amount - paid, 2) + 0.0
+        else:
+            principal_part = (self.loan_amount - overpayment) / self.period_in_months
+            nominal_rate = self.nominal_rate
+            for month in reversed(range(1, self.period_in_months + 1)):
+                installment = round(principal_part * (1 + (month * nominal_rate / 100 / 12)), 2)
+                paid += installment
+                yield installment, round(total_amount - paid, 2) + 0.0
+
+    @_profiled
+    def save_schedule_to_csv(self, path_to_save, decomposition=False):
         """
-        Saving payment schedule to csv file.
+        Saving payment schedule to csv file. Rows are streamed from iter_schedule - no DataFrames are built.
+        With decomposition, interest, principal and outstanding principal columns are added.
         """
-        self.payment_schedule.to_csv(path_to_save)
+        header, header_with_overpayment = _schedule_csv_headers(decomposition)
+        with open(path_to_save, 'w', newline='') as file:
+            writer = csv.writer(file, lineterminator='\n')
+            writer.writerow(header)
+            writer.writerows(self.iter_schedule(decomposition=decomposition))
         if self.overpayment:
-            self.payment_schedule_with_overpayment.to_csv(path_to_save[:-4] + "_with_overpayment.csv")
+            with open(path_to_save[:-4] + "_with_overpayment.csv", 'w', newline='') as file:
+                writer = csv.writer(file, lineterminator='\n')
+                writer.writerow(header_with_overpayment)
+                writer.writerows(self.iter_schedule(with_overpayment=True, decomposition=decomposition))
 
+    def render_sheets(self, file=None, style='fixed'):
+        """
+        Writing the mortgage attributes sheet and the calculation summary to the file (default: stdout) in the
+        fixed-width, Markdown or csv style - same values as the DataFrames, formatted without pandas.
+        """
+        file = file or sys.stdout
+        render_sheet('Mortgage attributes sheet', *self._attributes_sheet_rows(), file, style)
+        file.write("\n")
+        render_sheet('Calculation result', *self._calculation_summary_rows(), file, style)
 
-def generate_mortgage_attributes_sheet(loan, rate, months, installments, overpayment=None):
+    def render_schedule(self, file=None, style='fixed', with_overpayment=False, decomposition=False):
+        """
+        Writing the full payment schedule (or the schedule with overpayment) to the file (default: stdout) in the
+        fixed-width, Markdown or csv style, formatted straight from the schedule buffer (and the decomposition buffer
+        with decomposition) - no DataFrames are built and no rows are truncated.
+        """
+        with_overpayment = bool(with_overpayment and self.overpayment)
+        header, header_with_overpayment = _schedule_csv_headers(decomposition)
+        header = header_with_overpayment if with_overpayment else header
+        values = self.schedule_buffer if with_overpayment or not self.overpayment else self.schedule_buffer[:, ::2]
+        if decomposition:
+            split = self.decomposition_buffer if with_overpayment or not self.overpayment else \
+                self.decomposition_buffer[:, ::2]
+            values = np.hstack((values, split))
+        render_table(values, header[1:], file, style, index_name=header[0])
+
+
+# field names and messages are references to shared strings, not copies
+VALIDATION_ERROR_DTYPE = np.dtype([('row', 'i8'), ('field', object), ('message', object)])
+
+def _numeric_column(values, integer=False):
     """
-    :return: Using the Mortgage class, the function generates a mortgage attributes sheet.
+    :return: Float array of a column and a mask of values of the format accepted by the Mortgage setters (int or
+    float, only int with integer). NumPy arrays of numeric dtypes are accepted as a whole, other values are checked
+    one by one.
     """
-    mortgage_to_calculate = Mortgage(loan_amount=loan, nominal_rate=rate, period_in_months=months,
-                                     installments_type=installments, overpayment=overpayment)
-    return mortgage_to_calculate.mortgage_attributes_sheet
+    if isinstance(values, np.ndarray) and values.dtype.kind in ('biu' if integer else 'biuf'):
+        return values.astype(float), np.ones(len(values), dtype=bool)
+    types = int if integer else (int, float)
+    formats = np.fromiter((isinstance(value, types) for value in values), dtype=bool, count=len(values))
+    numbers = np.fromiter((value if is_number else np.nan for value, is_number in zip(values, formats)),
+                          dtype=float, count=len(values))
+    return numbers, formats
 
-def calculate_overpayment_saving(loan, rate, months, installments, overpayment=None):
+def validate_loans(loan_amount, nominal_rate, period_in_months, installments_type, overpayment=None):
     """
-    :return: Using the Mortgage class, the function calculates total savings resulting from the overpayment.
+    Validating columns of input parameters (lists or arrays, one element per loan) at once with the rules of the
+    Mortgage setters, including overpayment less than or equal to the loan amount. Empty overpayment (None, 0) or NaN
+    (as in MortgageBatch) means no overpayment. NumPy arrays of numeric dtypes are valid formats of numeric
+    parameters (integer dtypes for the period in months). No exception is raised for incorrect rows.
+    :return: ValidationResult - boolean mask of valid rows and structured array of errors (row, field and message
+    of the Mortgage class) ordered by rows and fields - the first error of a row is the one raised by
+    the Mortgage class.
     """
-    mortgage_to_calculate = Mortgage(loan_amount=loan, nominal_rate=rate, period_in_months=months,
-                                     installments_type=installments, overpayment=overpayment)
-    return mortgage_to_calculate.overpayment_saving
+    messages = Mortgage.VALUE_ERROR_MESSAGES
+    installments_types = [Mortgage.INSTALLMENTS_TYPE_EQUAL, Mortgage.INSTALLMENTS_TYPE_DECREASING]
+    loan_amount, loan_format = _numeric_column(loan_amount)
+    nominal_rate, rate_format = _numeric_column(nominal_rate)
+    period_in_months, period_format = _numeric_column(period_in_months, integer=True)
+    if isinstance(installments_type, np.ndarray) and installments_type.dtype.kind == 'U':
+        type_format = np.ones(len(installments_type), dtype=bool)
+        known_type = np.isin(installments_type, installments_types)
+    else:
+        type_format = np.fromiter((isinstance(value, str) for value in installments_type), dtype=bool,
+                                  count=len(installments_type))
+        known_type = np.fromiter((isinstance(value, str) and value in installments_types
+                                  for value in installments_type), dtype=bool, count=len(installments_type))
 
-def calculate_decreasing_installments_saving(loan, rate, months):
+    if overpayment is None:
+        overpayment = np.zeros(len(loan_amount))
+    values = overpayment
+    overpayment, overpayment_format = _numeric_column(values)
+    if not overpayment_format.all():
+        # values other than numbers are correct only if they are empty (None, '') - no overpayment
+        empty = np.fromiter((not value for value in values), dtype=bool, count=len(overpayment))
+        overpayment_format |= empty
+    given = overpayment_format & (overpayment != 0) & ~np.isnan(overpayment)
+
+    # (field, message, rows with the error) in the order of validation by the Mortgage class
+    checks = [('loan_amount', 'loan_amount_wrong_format', ~loan_format),
+              ('loan_amount', 'loan_amount', loan_format & (loan_amount <= 0)),
+              ('nominal_rate', 'nominal_rate_wrong_format', ~rate_format),
+              ('nominal_rate', 'nominal_rate', rate_format & (nominal_rate <= 0)),
+              ('period_in_months', 'period_in_months_wrong_format', ~period_format),
+              ('period_in_months', 'period_in_months', period_format & (period_in_months <= 0)),
+              ('installments_type', 'installments_type_wrong_format', ~type_format),
+              ('installments_type', 'installments_type', type_format & ~known_type),
+              ('overpayment', 'overpayment_wrong_format', ~overpayment_format),
+              ('overpayment', 'overpayment', given & ((overpayment <= 0) | (overpayment > loan_amount)))]
+
+    valid = np.ones(len(loan_amount), dtype=bool)
+    errors = []
+    for field, message, rows in checks:
+        valid &= ~rows
+        error = np.empty(rows.sum(), dtype=VALIDATION_ERROR_DTYPE)
+        error['row'], error['field'], error['message'] = np.flatnonzero(rows), field, messages[message].strip()
+        errors.append(error)
+    errors = np.concatenate(errors)
+    return ValidationResult(valid, errors[np.argsort(errors['row'], kind='stable')])
+
+def _first_errors(errors):
     """
-    :return: Using the Mortgage class, the function calculates savings resulting from the choice of decreasing
-    installments.
+    :return: Dictionary of incorrect rows and messages of their first errors (the ones raised by the Mortgage class).
     """
-    mortgage_to_calculate_equal = Mortgage(loan_amount=loan, nominal_rate=rate, period_in_months=months,
-                                           installments_type='equal')
-    mortgage_to_calculate_decreasing = Mortgage(loan_amount=loan, nominal_rate=rate, period_in_months=months,
-                                                installments_type='decreasing')
-    return round(mortgage_to_calculate_equal.total_interest - mortgage_to_calculate_decreasing.total_interest, 2)
+    rows, first = np.unique(errors['row'], return_index=True)
+    return dict(zip(rows.tolist(), errors['message'][first].tolist()))
 
-def main():
-    args = parser.parse_args()
 
-    mortgage = Mortgage(args.loan, args.rate, args.months, args.installments, args.overpayment)
+class MortgageBatch:
+    """
+    Vectorized counterpart of the Mortgage class. Calculates summary characteristics of many loans at once
+    (one row per loan) using NumPy array operations instead of building a Mortgage object per loan.
+    Results are identical to the ones calculated by the Mortgage class. With exact=False, total amounts of decreasing
+    installments are calculated from the closed form sum of installments (not rounded one by one) - much faster for
+    long periods, but they may differ from the Mortgage class by a few cents.
+    """
+    # maximum number of installments calculated at once for decreasing installments (memory bound)
+    CHUNK_SIZE = 1 << 20
 
-    print(mortgage.mortgage_attributes_sheet)
-    print()
-    print(mortgage.calculation_summary)
-    print()
-    print(mortgage.payment_schedule)
-    print()
-    if mortgage.overpayment:
-        print(mortgage.payment_schedule_with_overpayment)
-    print()
+    def __init__(self, loan_amount, nominal_rate, period_in_months, installments_type, overpayment=None, exact=True):
+        self.exact = exact
+        self.loan_amount = np.atleast_1d(np.asarray(loan_amount, dtype=float))
+        self.nominal_rate = np.broadcast_to(np.asarray(nominal_rate, dtype=float), self.loan_amount.shape)
+        self.period_in_months = np.broadcast_to(np.asarray(period_in_months, dtype=np.int64), self.loan_amount.shape)
+        self.installments_type = np.broadcast_to(np.asarray(installments_type, dtype=str), self.loan_amount.shape)
+        if overpayment is None:
+            overpayment = 0.0
+        overpayment = np.asarray(overpayment, dtype=float)
+        self.overpayment = np.broadcast_to(np.where(np.isnan(overpayment), 0.0, overpayment), self.loan_amount.shape)
 
-    mortgage.save_schedule_to_csv("Payment_schedule.csv")
+        if not np.isin(self.installments_type, [Mortgage.INSTALLMENTS_TYPE_EQUAL,
+                                                Mortgage.INSTALLMENTS_TYPE_DECREASING]).all():
+            raise ValueError(Mortgage.VALUE_ERROR_MESSAGES['installments_type'])
 
-    print("--- Additional functions usages ---: ")
-    print("calculate_mortgage_attributes_sheet: ")
-    if mortgage.overpayment:
-        print(generate_mortgage_attributes_sheet(args.loan, args.rate, args.months, args.installments, args.overpayment))
-    else:
-        print(generate_mortgage_attributes_sheet(args.loan, args.rate, args.months, args.installments))
+        self.has_overpayment = self.overpayment != 0
+        self.is_equal = self.installments_type == Mortgage.INSTALLMENTS_TYPE_EQUAL
 
-    if mortgage.overpayment:
-        print("calculate_overpayment_saving: ")
-        print(calculate_overpayment_saving(args.loan, args.rate, args.months, args.installments, args.overpayment))
+        self.monthly_payment = None
+        self.total_amount = None
+        self.total_interest = None
+        self.new_monthly_payment = None
+        self.new_total_amount = None
+        self.new_total_interest = None
+        self.overpayment_saving = None
+        self.apr = None
+        self.new_apr = None
+        self.apr_converged = None
 
-    print("calculate_decreasing_installments_saving: ")
-    print(calculate_decreasing_installments_saving(args.loan, args.rate, args.months))
+        self.calculate_loan_characteristics()
+
+    def __len__(self):
+        return len(self.loan_amount)
+
+    @classmethod
+    def validated(cls, loan_amount, nominal_rate, period_in_months, installments_type, overpayment=None, exact=True):
+        """
+        Validating input columns with validate_loans and pricing only valid rows - incorrect rows are skipped
+        instead of raising ValueError.
+        :return: MortgageBatch of valid rows (None if no row is valid) and ValidationResult of all rows.
+        """
+        validation = validate_loans(loan_amount, nominal_rate, period_in_months, installments_type, overpayment)
+        rows = np.flatnonzero(validation.valid)
+        if not len(rows):
+            return None, validation
+
+        def select(column):
+            return column[rows] if isinstance(column, np.ndarray) else np.asarray(column, dtype=object)[rows]
+        if overpayment is not None:
+            overpayment = [value or np.nan for value in select(overpayment)]
+        return cls(select(loan_amount).astype(float), select(nominal_rate).astype(float),
+                   select(period_in_months).astype(np.int64), select(installments_type).astype(str), overpayment,
+                   exact), validation
+
+    def calculate_loan_characteristics(self):
+        """
+        Calculating loan characteristics of all rows before and after overpayment.
+        Rows without overpayment have NaN in all characteristics updated by overpayment.
+        """
+        self.monthly_payment, self.total_amount = self.calculate_totals(np.zeros_like(self.loan_amount))
+        self.total_interest = _round_array(self.total_amount - self.loan_amount)
+
+        new_monthly_payment, new_total_amount = self.calculate_totals(self.overpayment)
+        new_total_interest = _round_array(new_total_amount - (self.loan_amount - self.overpayment))
+        overpayment_saving = _round_array(self.total_interest - new_total_interest)
+
+        self.new_monthly_payment = np.where(self.has_overpayment, new_monthly_payment, np.nan)
+        self.new_total_amount = np.where(self.has_overpayment, new_total_amount, np.nan)
+        self.new_total_interest = np.where(self.has_overpayment, new_total_interest, np.nan)
+        self.overpayment_saving = np.where(self.has_overpayment, overpayment_saving, np.nan)
+
+    def calculate_apr(self):
+        """
+        Calculating APR (effective annual rate, %) of all rows - apr without overpayment and new_apr with overpayment
+        treated as an upfront cash flow (NaN in rows without overpayment). Monthly internal rates of return are found
+        with the vectorized Newton method starting from the monthly nominal rate. Present value of installments is
+        calculated in closed form - for decreasing installments with the present value of rounding differences of
+        installments (calculated once, at the nominal rate) added - skipped with exact=False.
+        :return: Boolean array (also stored as apr_converged) - True for rows where all solutions converged.
+        """
+        guess = self.nominal_rate / 100 / 12
+        principals = [self.loan_amount, self.loan_amount - self.overpayment]
+
+        # present value of rounding differences of decreasing installments, before and after overpayment
+        rounding = [np.zeros_like(self.loan_amount), np.zeros_like(self.loan_amount)]
+        decreasing = np.flatnonzero(~self.is_equal) if self.exact else np.empty(0, dtype=int)
+        for period in np.unique(self.period_in_months[decreasing]):
+            rows = decreasing[self.period_in_months[decreasing] == period]
+            month = np.arange(period, 0, -1)
+            step = max(1, self.CHUNK_SIZE // int(period))
+            for start in range(0, len(rows), step):
+                chunk = rows[start:start + step]
+                factors = 1 + (month[None, :] * self.nominal_rate[chunk][:, None] / 100 / 12)
+                discount = np.cumprod(np.broadcast_to((1 / (1 + guess[chunk]))[:, None], factors.shape), axis=1)
+                for principal, rounding_difference in zip(principals, rounding):
+                    installments = (principal[chunk] / period)[:, None] * factors
+                    rounding_difference[chunk] = ((_round_array(installments) - installments) * discount).sum(axis=1)
+
+        results = []
+        for principal, rounding_difference, monthly_payment in zip(principals, rounding, [
+                self.monthly_payment, np.where(self.has_overpayment, self.new_monthly_payment, self.monthly_payment)]):
+            # installment of month k: level + slope * (period - k + 1) plus rounding difference
+            level = np.where(self.is_equal, monthly_payment, principal / self.period_in_months)
+            slope = np.where(self.is_equal, 0.0, principal / self.period_in_months * guess)
+            monthly_rate, converged = _linear_schedule_irr(principal, self.period_in_months, guess, level, slope,
+                                                           rounding_difference)
+            results.append((calculate_effective_annual_rate(monthly_rate), converged))
+
+        (self.apr, converged), (new_apr, new_converged) = results
+        self.new_apr = np.where(self.has_overpayment, new_apr, np.nan)
+        self.apr_converged = converged & (new_converged | ~self.has_overpayment)
+        return self.apr_converged
+
+    def calculate_totals(self, overpayment):
+        """
+        Calculating monthly payment and total amount to be repaid of all rows for given overpayment.
+        """
+        principal = self.loan_amount - overpayment
+        monthly_payment = np.empty_like(principal)
+        total_amount = np.empty_like(principal)
+
+        # equal installments
+        equal = self.is_equal
+        sigma = calculate_annuity_factor(self.nominal_rate[equal], self.period_in_months[equal])
+        monthly_payment[equal] = _round_array(principal[equal] / sigma)
+        total_amount[equal] = _round_array(monthly_payment[equal] * self.period_in_months[equal])
+
+        # decreasing installments - every installment is rounded separately, hence grouping rows by period
+        decreasing = np.flatnonzero(~equal)
+        monthly_payment[decreasing] = _round_array(principal[decreasing] / self.period_in_months[decreasing] *
+                                                   (1 + (self.period_in_months[decreasing] *
+                                                         self.nominal_rate[decreasing] / 100 / 12)))
+        if not self.exact:
+            total_amount[decreasing] = _round_array(principal[decreasing] * (1 + self.nominal_rate[decreasing] / 100 /
+                                                                             12 * (self.period_in_months[decreasing]
+                                                                                   + 1) / 2))
+            return monthly_payment, total_amount
+        for period in np.unique(self.period_in_months[decreasing]):
+            rows = decreasing[self.period_in_months[decreasing] == period]
+            month = np.arange(1, period + 1)
+            step = max(1, self.CHUNK_SIZE // int(period))
+            for start in range(0, len(rows), step):
+                chunk = rows[start:start + step]
+                installments = _round_array((principal[chunk] / period)[:, None] *
+                                            (1 + (month[None, :] * self.nominal_rate[chunk][:, None] / 100 / 12)))
+                total_amount[chunk] = _round_array(installments.sum(axis=1))
+
+        return monthly_payment, total_amount
+
+
+def recurring_overpayments(amount, end, every=1, start=None):
+    """
+    Rule of recurring overpayments, e.g. every=12 for yearly overpayments.
+    :return: List of (month, amount) events - from month start (default: every) to month end, every given months.
+    """
+    start = every if start is None else start
+    return [(month, amount) for month in range(start, end + 1, every)]
+
+
+class OverpaymentPlanBatch:
+    """
+    Simulation of many loans (one row per loan), each with its own plan of overpayment events - pairs of (month,
+    amount) paid together with the installment of the month (month 0 - before the first installment).
+    After every event the installment is recalculated from the outstanding principal and the remaining period:
+    - 'shorten' strategy keeps the installment (equal) or principal part of installments (decreasing), so the loan
+    is repaid earlier,
+    - 'reduce' strategy keeps the end of the repayment period and lowers installments.
+    Loans are simulated month by month for all rows at once in integer cents: interest is the outstanding principal
+    times the monthly rate rounded to cents, the schedule is recalculated only in months with events, and the
+    last installment repays the outstanding principal with interest. Without events, installments are identical to
+    the ones calculated by the Mortgage class (except the last one, which settles rounding differences).
+    Schedules are 2D arrays (rows - loans, columns - months, zeros after the loan is repaid).
+    """
+    STRATEGY_SHORTEN = 'shorten'
+    STRATEGY_REDUCE = 'reduce'
+
+    def __init__(self, loan_amount, nominal_rate, period_in_months, installments_type, plans, strategy='shorten'):
+        self.loan_amount = np.atleast_1d(np.asarray(loan_amount, dtype=float))
+        if len(plans) != len(self.loan_amount):
+            self.loan_amount = np.broadcast_to(self.loan_amount, len(plans))
+        self.nominal_rate = np.broadcast_to(np.asarray(nominal_rate, dtype=float), self.loan_amount.shape)
+        self.period_in_months = np.broadcast_to(np.asarray(period_in_months, dtype=np.int64), self.loan_amount.shape)
+        self.installments_type = np.broadcast_to(np.asarray(installments_type, dtype=str), self.loan_amount.shape)
+        self.strategy = np.broadcast_to(np.asarray(strategy, dtype=str), self.loan_amount.shape)
+
+        if not np.isin(self.installments_type, [Mortgage.INSTALLMENTS_TYPE_EQUAL,
+                                                Mortgage.INSTALLMENTS_TYPE_DECREASING]).all():
+            raise ValueError(Mortgage.VALUE_ERROR_MESSAGES['installments_type'])
+        if not np.isin(self.strategy, [self.STRATEGY_SHORTEN, self.STRATEGY_REDUCE]).all():
+            raise ValueError(Mortgage.VALUE_ERROR_MESSAGES['overpayment_strategy'])
+
+        # overpayment events in cents - columns are months from 0 to the longest period
+        self.events = np.zeros((len(self.loan_amount), int(self.period_in_months.max()) + 1), dtype=np.int64)
+        rows = np.repeat(np.arange(len(plans)), [len(plan) for plan in plans])
+        try:
+            months, amounts = np.array([event for plan in plans for event in plan], dtype=float).reshape(-1, 2).T
+        except (TypeError, ValueError):
+            raise ValueError(Mortgage.VALUE_ERROR_MESSAGES['overpayment_event'])
+        if not ((months % 1 == 0) & (months >= 0) & (months <= self.period_in_months[rows]) & (amounts > 0)).all():
+            raise ValueError(Mortgage.VALUE_ERROR_MESSAGES['overpayment_event'])
+        np.add.at(self.events, (rows, months.astype(np.int64)), _to_cents(amounts))
+
+        self.installments = None
+        self.overpayments = None
+        self.interest = None
+        self.principal = None
+        self.outstanding_principal = None
+        self.months = None
+
+        self.simulate()
+
+    def __len__(self):
+        return len(self.loan_amount)
+
+    def simulate(self):
+        """
+        Simulating all loans month by month. Schedules are recalculated only for rows with events in given month.
+        """
+        rows, columns = len(self), self.events.shape[1] - 1
+        is_equal = self.installments_type == Mortgage.INSTALLMENTS_TYPE_EQUAL
+        reduce = self.strategy == self.STRATEGY_REDUCE
+        monthly_rate = self.nominal_rate / 100 / 12
+
+        balance = _to_cents(self.loan_amount)
+        remaining = self.period_in_months.astype(float)
+        equal_installment = _to_cents(self.loan_amount / calculate_annuity_factor(self.nominal_rate, remaining))
+        principal_part = self.loan_amount / remaining
+
+        installments = np.zeros((rows, columns), dtype=np.int64)
+        overpayments = np.zeros((rows, columns + 1), dtype=np.int64)
+        interest = np.zeros((rows, columns), dtype=np.int64)
+        outstanding_principal = np.zeros((rows, columns + 1), dtype=np.int64)
+
+        def pay_overpayments(month):
+            changed = np.flatnonzero((self.events[:, month] > 0) & (balance > 0))
+            if not len(changed):
+                return
+            overpayments[changed, month] = np.minimum(self.events[changed, month], balance[changed])
+            balance[changed] -= overpayments[changed, month]
+            # recalculating schedules of changed rows only, from the outstanding principal onwards
+            changed = changed[balance[changed] > 0]
+            principal_amount = balance[changed] / 100
+            with np.errstate(divide='ignore', invalid='ignore'):
+                shortened = np.where(
+                    is_equal[changed],
+                    np.ceil(-np.log1p(-principal_amount * monthly_rate[changed] / (equal_installment[changed] / 100))
+                            / np.log1p(monthly_rate[changed]) - 1e-9),
+                    np.ceil(principal_amount / principal_part[changed] - 1e-9))
+            remaining[changed] = np.where(reduce[changed], remaining[changed],
+                                          np.clip(np.nan_to_num(shortened, nan=np.inf), 1, remaining[changed]))
+            reduced = changed[reduce[changed]]
+            equal_installment[reduced] = _to_cents(balance[reduced] / 100 / calculate_annuity_factor(
+                self.nominal_rate[reduced], remaining[reduced]))
+            principal_part[reduced] = balance[reduced] / 100 / remaining[reduced]
+
+        pay_overpayments(0)
+        outstanding_principal[:, 0] = balance
+        for month in range(1, columns + 1):
+            active = np.flatnonzero(balance > 0)
+            if not len(active):
+                break
+            monthly_interest = np.rint(balance[active] * monthly_rate[active]).astype(np.int64)
+            scheduled = np.where(is_equal[active], equal_installment[active], _to_cents(
+                principal_part[active] * (1 + (remaining[active] * self.nominal_rate[active] / 100 / 12))))
+            due = balance[active] + monthly_interest
+            paid = np.where((remaining[active] <= 1) | (due <= scheduled), due, scheduled)
+            installments[active, month - 1] = paid
+            interest[active, month - 1] = monthly_interest
+            balance[active] = due - paid
+            remaining[active] -= 1
+            pay_overpayments(month)
+            outstanding_principal[:, month] = balance
+
+        self.installments = installments / 100
+        self.overpayments = overpayments / 100
+        self.interest = interest / 100
+        self.principal = (installments - interest) / 100
+        self.outstanding_principal = outstanding_principal[:, 1:] / 100
+        self.months = (installments > 0).sum(axis=1)
+
+    @property
+    def total_interest(self):
+        return _round_array(self.interest.sum(axis=1))
+
+    @property
+    def total_overpayment(self):
+        return _round_array(self.overpayments.sum(axis=1))
+
+    @property
+    def total_amount(self):
+        """
+        Total amount repaid - all installments and overpayments.
+        """
+        return _round_array(self.installments.sum(axis=1) + self.overpayments.sum(axis=1))
+
+    def schedule(self, row):
+        """
+        :return: DataFrame with payment schedule of the loan in the given row (until the loan is repaid).
+        """
+        months = int(self.months[row])
+        return _pandas().DataFrame(
+            data={'Installments': self.installments[row, :months], 'Overpayment': self.overpayments[row, 1:months + 1],
+                  'Interest': self.interest[row, :months], 'Principal': self.principal[row, :months],
+                  'Outstanding principal': self.outstanding_principal[row, :months]},
+            index=range(1, months + 1))
+
+
+class VariableRateBatch:
+    """
+    Simulation of many variable rate loans (one row per loan). Nominal rates of every month are stored in rates
+    (2D array - rows: loans, columns: months). Loans are simulated month by month for all rows at once in integer
+    cents, with the same rules as OverpaymentPlanBatch: interest is the outstanding principal times the monthly rate
+    rounded to cents, equal installments are recalculated from the outstanding principal and the remaining period in
+    months when the rate changes, decreasing installments keep their principal part and the last installment repays
+    the outstanding principal with interest. Without rate changes installments are identical to the ones calculated
+    by the Mortgage class (except the last one, which settles rounding differences).
+    The state of every month is stored, so update_rates recalculates only months from the rate change onwards, and
+    only for the updated rows - cost scales with the number of affected months, not with the full periods.
+    recalculated_months counts all recalculated months of all rows.
+    """
+    def __init__(self, loan_amount, nominal_rate, period_in_months, installments_type, rate_changes=None):
+        """
+        Nominal rate is the rate of the first month (a single value or one value per row) or a 2D array of rates
+        of every month. Rate changes are lists (one per row) of (month, nominal rate) pairs.
+        """
+        self.loan_amount = np.atleast_1d(np.asarray(loan_amount, dtype=float))
+        nominal_rate = np.asarray(nominal_rate, dtype=float)
+        if rate_changes is not None and len(rate_changes) != len(self.loan_amount):
+            self.loan_amount = np.broadcast_to(self.loan_amount, len(rate_changes))
+        elif nominal_rate.ndim == 2 and len(nominal_rate) != len(self.loan_amount):
+            self.loan_amount = np.broadcast_to(self.loan_amount, len(nominal_rate))
+        self.period_in_months = np.broadcast_to(np.asarray(period_in_months, dtype=np.int64), self.loan_amount.shape)
+        self.installments_type = np.broadcast_to(np.asarray(installments_type, dtype=str), self.loan_amount.shape)
+        if not np.isin(self.installments_type, [Mortgage.INSTALLMENTS_TYPE_EQUAL,
+                                                Mortgage.INSTALLMENTS_TYPE_DECREASING]).all():
+            raise ValueError(Mortgage.VALUE_ERROR_MESSAGES['installments_type'])
+        self.is_equal = self.installments_type == Mortgage.INSTALLMENTS_TYPE_EQUAL
+
+        shape = (len(self.loan_amount), int(self.period_in_months.max()))
+        self.rates = np.empty(shape)
+        if nominal_rate.ndim == 2:
+            self.rates[:] = nominal_rate[:, :shape[1]]
+        else:
+            self.rates[:] = np.broadcast_to(nominal_rate, self.loan_amount.shape)[:, None]
+        if not (self.rates > 0).all():
+            raise ValueError(Mortgage.VALUE_ERROR_MESSAGES['nominal_rate'])
+        for row, changes in enumerate(rate_changes or []):
+            for month, rate in sorted(changes):
+                self._set_rates(np.array([row]), month, rate)
+
+        # principal part of decreasing installments and state of every month (in cents)
+        self.principal_part = self.loan_amount / self.period_in_months
+        self._installments = np.zeros(shape, dtype=np.int64)
+        self._interest = np.zeros(shape, dtype=np.int64)
+        self._outstanding_principal = np.zeros(shape, dtype=np.int64)
+        self._scheduled = np.zeros(shape, dtype=np.int64)
+        self.recalculated_months = 0
+
+        self.recalculate(np.arange(len(self)), 1)
+
+    def __len__(self):
+        return len(self.loan_amount)
+
+    def _set_rates(self, rows, month, nominal_rate):
+        """
+        Setting nominal rate of given rows from the month onwards, after validating the month and rate.
+        """
+        nominal_rate = np.broadcast_to(np.asarray(nominal_rate, dtype=float), rows.shape)
+        if not isinstance(month, (int, np.integer)) or month < 1 or (month > self.period_in_months[rows]).any() or \
+                not (nominal_rate > 0).all():
+            raise ValueError(Mortgage.VALUE_ERROR_MESSAGES['rate_change'])
+        self.rates[rows, month - 1:] = nominal_rate[:, None]
+
+    def update_rates(self, month, nominal_rate, rows=None):
+        """
+        Changing nominal rate of given rows (default: all) from the month onwards, e.g. on a rate index reset.
+        Months before the change are reused, only the following ones are recalculated.
+        """
+        rows = np.arange(len(self)) if rows is None else np.atleast_1d(np.asarray(rows))
+        self._set_rates(rows, month, nominal_rate)
+        self.recalculate(rows, month)
+
+    def recalculate(self, rows, month):
+        """
+        Recalculating months of given rows from the month onwards, starting from the state of the previous month.
+        """
+        last_month = int(self.period_in_months[rows].max())
+        self._installments[rows, month - 1:] = 0
+        self._interest[rows, month - 1:] = 0
+        self._outstanding_principal[rows, month - 1:] = 0
+        self._scheduled[rows, month - 1:] = 0
+
+        if month == 1:
+            balance = _to_cents(self.loan_amount[rows])
+            scheduled = np.zeros(len(rows), dtype=np.int64)
+        else:
+            balance = self._outstanding_principal[rows, month - 2]
+            scheduled = self._scheduled[rows, month - 2]
+
+        for month in range(month, last_month + 1):
+            active = np.flatnonzero(balance > 0)
+            if not len(active):
+                break
+            row = rows[active]
+            rate = self.rates[row, month - 1]
+            remaining = (self.period_in_months[row] - month + 1).astype(float)
+
+            # equal installments are recalculated in the first month and when the rate changes
+            changed = self.is_equal[row] & ((month == 1) | (rate != self.rates[row, month - 2]))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                recalculated = _to_cents(balance[active] / 100 / calculate_annuity_factor(rate, remaining))
+            scheduled[active] = np.where(changed, recalculated, scheduled[active])
+            installment = np.where(self.is_equal[row], scheduled[active], _to_cents(
+                self.principal_part[row] * (1 + (remaining * rate / 100 / 12))))
+
+            interest = np.rint(balance[active] * (rate / 100 / 12)).astype(np.int64)
+            due = balance[active] + interest
+            paid = np.where((remaining <= 1) | (due <= installment), due, installment)
+            balance[active] = due - paid
+
+            self._installments[row, month - 1] = paid
+            self._interest[row, month - 1] = interest
+            self._outstanding_principal[row, month - 1] = balance[active]
+            self._scheduled[row, month - 1] = scheduled[active]
+            self.recalculated_months += len(active)
+
+    @property
+    def installments(self):
+        return self._installments / 100
+
+    @property
+    def interest(self):
+        return self._interest / 100
+
+    @property
+    def principal(self):
+        return (self._installments - self._interest) / 100
+
+    @property
+    def outstanding_principal(self):
+        return self._outstanding_principal / 100
+
+    @property
+    def total_interest(self):
+        return self._interest.sum(axis=1) / 100
+
+    @property
+    def total_amount(self):
+        return self._installments.sum(axis=1) / 100
+
+    def schedule(self, row):
+        """
+        :return: DataFrame with payment schedule of the loan in the given row.
+        """
+        months = int(self.period_in_months[row])
+        return _pandas().DataFrame(
+            data={'Nominal rate': self.rates[row, :months], 'Installments': self.installments[row, :months],
+                  'Interest': self.interest[row, :months], 'Principal': self.principal[row, :months],
+                  'Outstanding principal': self.outstanding_principal[row, :months]},
+            index=range(1, months + 1))
+
+
+class MortgageGrid:
+    """
+    Summary characteristics of a base loan (Mortgage object) for every combination of values along given axes -
+    any of loan_amount, nominal_rate, period_in_months and overpayment, e.g. rates from 3 to 9% by 0.05 for periods
+    from 120 to 480 months. Characteristics are N-dimensional arrays with one dimension per axis (in the order
+    the axes were given), calculated at once by MortgageBatch on the broadcast grid - no Mortgage object is built
+    per cell. Cells without overpayment have NaN in all characteristics updated by overpayment.
+    By default totals of decreasing installments are calculated in closed form (see MortgageBatch, exact=False).
+    """
+    AXES = ['loan_amount', 'nominal_rate', 'period_in_months', 'overpayment']
+    CHARACTERISTICS = ['monthly_payment', 'total_amount', 'total_interest', 'new_monthly_payment', 'new_total_amount',
+                       'new_total_interest', 'overpayment_saving']
+
+    def __init__(self, mortgage, exact=False, **axes):
+        for name in axes:
+            if name not in self.AXES:
+                raise ValueError(f"Unknown grid axis: {name}. Please use any of: {', '.join(self.AXES)}.")
+        self.mortgage = mortgage
+        self.axes = {name: np.atleast_1d(np.asarray(values)) for name, values in axes.items()}
+        self.shape = tuple(len(values) for values in self.axes.values())
+        self.validate_axes()
+
+        parameters = {name: getattr(mortgage, name) for name in self.AXES}
+        if not parameters['overpayment']:
+            parameters['overpayment'] = np.nan
+        for dimension, (name, values) in enumerate(self.axes.items()):
+            parameters[name] = values.reshape([-1 if i == dimension else 1 for i in range(len(self.shape))])
+        parameters = dict(zip(parameters, np.broadcast_arrays(*parameters.values())))
+
+        overpayment = np.asarray(parameters['overpayment'], dtype=float)
+        if (overpayment > parameters['loan_amount']).any():
+            raise ValueError(Mortgage.VALUE_ERROR_MESSAGES['overpayment'])
+        batch = MortgageBatch(parameters['loan_amount'].ravel(), parameters['nominal_rate'].ravel(),
+                              parameters['period_in_months'].ravel(), mortgage.installments_type,
+                              np.where(overpayment == 0, np.nan, overpayment).ravel(), exact=exact)
+        for name in self.CHARACTERISTICS:
+            setattr(self, name, getattr(batch, name).reshape(self.shape))
+
+    def validate_axes(self):
+        """
+        Validating every value of every axis with the same rules as input parameters of the Mortgage class
+        (overpayment is compared with the largest loan amount of the grid).
+        """
+        probe = Mortgage(self.mortgage.loan_amount, self.mortgage.nominal_rate, self.mortgage.period_in_months,
+                         self.mortgage.installments_type)
+        if 'loan_amount' in self.axes:
+            for loan_amount in self.axes['loan_amount'].tolist():
+                probe.loan_amount = loan_amount
+            probe.loan_amount = max(self.axes['loan_amount'].tolist())
+        for name in ['nominal_rate', 'period_in_months', 'overpayment']:
+            for value in self.axes.get(name, np.empty(0)).tolist():
+                setattr(probe, name, value)
+
+    def __getitem__(self, name):
+        """
+        :return: N-dimensional array of the characteristic.
+        """
+        if name not in self.CHARACTERISTICS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def to_frame(self):
+        """
+        :return: DataFrame with one row per cell of the grid (MultiIndex of axes values) and characteristics columns.
+        """
+        pandas = _pandas()
+        index = pandas.MultiIndex.from_product(list(self.axes.values()), names=list(self.axes))
+        return pandas.DataFrame({name: getattr(self, name).ravel() for name in self.CHARACTERISTICS}, index=index)
+
+
+class QuoteCache:
+    """
+    Bounded, thread-safe cache of Mortgage quotes keyed on normalized input parameters.
+    The least recently used quote is evicted when the cache is full. Cached MortgageQuote records are immutable,
+    so they can be safely shared by all callers.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._quotes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._quotes)
+
+    @staticmethod
+    def make_key(loan_amount, nominal_rate, period_in_months, installments_type, overpayment=None):
+        """
+        :return: Normalized input parameters (e.g. 50000 and 50000.0 give the same key) or None if they are
+        not of the formats accepted by the Mortgage class.
+        """
+        numbers = [loan_amount, nominal_rate] + ([overpayment] if overpayment else [])
+        if not all(isinstance(number, (float, int)) for number in numbers) or not isinstance(period_in_months, int) \
+                or not isinstance(installments_type, str):
+            return None
+        return (float(loan_amount), float(nominal_rate), period_in_months, installments_type,
+                float(overpayment) if overpayment else None)
+
+    def quote(self, loan_amount, nominal_rate, period_in_months, installments_type, overpayment=None):
+        """
+        :return: Cached MortgageQuote of the given input parameters. Quotes missing in the cache are calculated
+        with Mortgage.quote (which raises ValueError for incorrect input) and stored.
+        """
+        key = self.make_key(loan_amount, nominal_rate, period_in_months, installments_type, overpayment)
+        if key is None:
+            return Mortgage.quote(loan_amount, nominal_rate, period_in_months, installments_type, overpayment)
+
+        with self._lock:
+            quote = self._quotes.get(key)
+            if quote is not None:
+                self._quotes.move_to_end(key)
+                self.hits += 1
+                return quote
+            self.misses += 1
+
+        quote = Mortgage.quote(loan_amount, nominal_rate, period_in_months, installments_type, overpayment)
+
+        with self._lock:
+            self._quotes[key] = quote
+            self._quotes.move_to_end(key)
+            while len(self._quotes) > self.maxsize:
+                self._quotes.popitem(last=False)
+                self.evictions += 1
+        return quote
+
+    def stats(self):
+        """
+        :return: Dictionary with hit, miss and eviction counters and the current size of the cache.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self._quotes), 'maxsize': self.maxsize}
+
+    def clear(self):
+        """
+        Removing all quotes from the cache and resetting counters.
+        """
+        with self._lock:
+            self._quotes.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+quote_cache = QuoteCache()
+
+
+def calculate_annuity_factor(nominal_rate, period_in_months):
+    """
+    :return: Closed form of the annuity factor - sum of (1 + monthly rate) ** (-i) for i from 1 to period_in_months.
+    """
+    monthly_rate = np.asarray(nominal_rate, dtype=float) / 100 / 12
+    return ((1 - (1 + monthly_rate) ** -np.asarray(period_in_months, dtype=float)) / monthly_rate)[()]
+
+def _closed_form(loan_amount, nominal_rate, period_in_months, installments_type, month, equal, decreasing):
+    """
+    Broadcasting inputs of the closed form functions and choosing the formula according to installments type.
+    Month is clipped to the repayment period. Formulas get loan amount, monthly rate, period and month as arrays.
+    """
+    loan_amount = np.asarray(loan_amount, dtype=float)
+    monthly_rate = np.asarray(nominal_rate, dtype=float) / 100 / 12
+    period_in_months = np.asarray(period_in_months, dtype=float)
+    month = np.clip(np.asarray(month, dtype=float), 0, period_in_months)
+    is_equal = np.asarray(installments_type) == Mortgage.INSTALLMENTS_TYPE_EQUAL
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(is_equal, equal(loan_amount, monthly_rate, period_in_months, month),
+                          decreasing(loan_amount, monthly_rate, period_in_months, month))
+    return result[()]
+
+def closed_form_installment(loan_amount, nominal_rate, period_in_months, installments_type, month=1):
+    """
+    :return: Installment due in the given month (not rounded). Inputs may be scalars or arrays.
+    """
+    return _closed_form(loan_amount, nominal_rate, period_in_months, installments_type, np.maximum(month, 1),
+                        lambda loan, r, n, k: loan * r / (1 - (1 + r) ** -n),
+                        lambda loan, r, n, k: loan / n * (1 + (n - k + 1) * r))
+
+def closed_form_balance(loan_amount, nominal_rate, period_in_months, installments_type, month):
+    """
+    :return: Outstanding principal after paying the installment of the given month (not rounded).
+    """
+    return _closed_form(loan_amount, nominal_rate, period_in_months, installments_type, month,
+                        lambda loan, r, n, k: loan * ((1 + r) ** n - (1 + r) ** k) / ((1 + r) ** n - 1),
+                        lambda loan, r, n, k: loan * (n - k) / n)
+
+def closed_form_cumulative_principal(loan_amount, nominal_rate, period_in_months, installments_type, month):
+    """
+    :return: Principal repaid in installments from the first month up to the given month (not rounded).
+    """
+    return _closed_form(loan_amount, nominal_rate, period_in_months, installments_type, month,
+                        lambda loan, r, n, k: loan * ((1 + r) ** k - 1) / ((1 + r) ** n - 1),
+                        lambda loan, r, n, k: loan * k / n)
+
+def closed_form_cumulative_interest(loan_amount, nominal_rate, period_in_months, installments_type, month):
+    """
+    :return: Interest paid in installments from the first month up to the given month (not rounded).
+    """
+    return _closed_form(loan_amount, nominal_rate, period_in_months, installments_type, month,
+                        lambda loan, r, n, k: (k * r / (1 - (1 + r) ** -n) - ((1 + r) ** k - 1) / ((1 + r) ** n - 1))
+                                              * loan,
+                        lambda loan, r, n, k: loan * r / n * k * (2 * n - k + 1) / 2)
+
+def closed_form_remaining(loan_amount, nominal_rate, period_in_months, installments_type, month):
+    """
+    :return: Amount remaining to be repaid (sum of all future installments) after the given month (not rounded).
+    """
+    return _closed_form(loan_amount, nominal_rate, period_in_months, installments_type, month,
+                        lambda loan, r, n, k: (n - k) * loan * r / (1 - (1 + r) ** -n),
+                        lambda loan, r, n, k: loan * (n - k) / n + loan * r / n * (n - k) * (n - k + 1) / 2)
+
+
+def _monthly_payments(loan_amount, nominal_rate, period_in_months, is_equal):
+    """
+    :return: Monthly payments (first installments for decreasing installments) of arrays of loans, calculated and
+    rounded in the same way as by the Mortgage class.
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        equal = loan_amount / calculate_annuity_factor(nominal_rate, period_in_months)
+        decreasing = loan_amount / period_in_months * (1 + (period_in_months * nominal_rate / 100 / 12))
+        return _round_array(np.where(is_equal, equal, decreasing))
+
+def _solver_inputs(installments_type, *arrays):
+    """
+    Broadcasting inputs of the inverse solvers and validating installments types.
+    :return: Broadcast shape, flat float arrays of inputs and a flat boolean array - True for equal installments.
+    """
+    *arrays, installments_type = np.broadcast_arrays(*[np.asarray(array, dtype=float) for array in arrays],
+                                                     np.asarray(installments_type, dtype=str))
+    if not np.isin(installments_type, [Mortgage.INSTALLMENTS_TYPE_EQUAL, Mortgage.INSTALLMENTS_TYPE_DECREASING]).all():
+        raise ValueError(Mortgage.VALUE_ERROR_MESSAGES['installments_type'])
+    return (installments_type.shape, *[np.array(array, ndmin=1).ravel() for array in arrays],
+            np.array(installments_type == Mortgage.INSTALLMENTS_TYPE_EQUAL, ndmin=1).ravel())
+
+def _step_to_limit(units, fits, valid, largest, lower=1, upper=np.inf):
+    """
+    Moving approximate integer solutions of valid rows to the exact limit - the largest (or the smallest) number
+    of units between lower and upper that fits. Solutions are moved by single units while they do not fit, then
+    while the next number of units still fits. NaN in rows where nothing fits.
+    """
+    step = 1 if largest else -1
+    units = np.clip(np.where(valid, units, lower), lower, upper)
+    valid = valid.copy()
+    moving = valid & ~fits(units)
+    while moving.any():
+        units[moving] -= step
+        valid &= (units >= lower) & (units <= upper)
+        moving = valid & ~fits(units)
+
+    def can_move():
+        return valid & (units + step >= lower) & (units + step <= upper) & fits(units + step)
+    moving = can_move()
+    while moving.any():
+        units[moving] += step
+        moving = can_move()
+    return np.where(valid, units, np.nan)
+
+def max_affordable_loan(max_monthly_payment, nominal_rate, period_in_months, installments_type):
+    """
+    :return: Largest loan amount (whole cents) with monthly payment (first installment for decreasing installments)
+    not exceeding max_monthly_payment. Closed forms: payment * annuity factor for equal installments and
+    payment / (1 / period + monthly rate) for decreasing, corrected by single cents for rounding of the payment.
+    Inputs may be scalars or arrays (e.g. one element per applicant). NaN where no loan fits.
+    """
+    shape, cap, rate, months, is_equal = _solver_inputs(installments_type, max_monthly_payment, nominal_rate,
+                                                        period_in_months)
+    valid = (cap > 0) & (rate > 0) & (months > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = np.where(is_equal, calculate_annuity_factor(rate, months), 1 / (1 / months + rate / 100 / 12))
+        cents = np.floor((cap + 0.005) * factor * 100)
+    cents = _step_to_limit(cents, lambda cents: _monthly_payments(cents / 100, rate, months, is_equal) <= cap,
+                           valid, largest=True)
+    return (cents / 100).reshape(shape)[()]
+
+def min_period_for_payment(max_monthly_payment, loan_amount, nominal_rate, installments_type,
+                           max_period_in_months=None):
+    """
+    :return: Shortest repayment period (months) with monthly payment (first installment for decreasing installments)
+    not exceeding max_monthly_payment. Closed forms: -log(1 - loan * monthly rate / payment) / log(1 + monthly rate)
+    for equal installments and loan / (payment - loan * monthly rate) for decreasing, corrected by single months for
+    rounding of the payment. NaN where no period (up to max_period_in_months, if given) fits.
+    """
+    shape, cap, loan, rate, is_equal = _solver_inputs(installments_type, max_monthly_payment, loan_amount,
+                                                      nominal_rate)
+    monthly_rate = rate / 100 / 12
+    # the payment is always greater than interest of the first month - no period fits if the cap does not cover it
+    valid = (cap > 0) & (loan > 0) & (rate > 0) & (loan * monthly_rate < cap + 0.005)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        months = np.ceil(np.where(is_equal, -np.log1p(-loan * monthly_rate / (cap + 0.005)) / np.log1p(monthly_rate),
+                                  loan / (cap + 0.005 - loan * monthly_rate)))
+    months = _step_to_limit(months, lambda months: _monthly_payments(loan, rate, months, is_equal) <= cap, valid,
+                            largest=False, upper=np.inf if max_period_in_months is None else max_period_in_months)
+    return months.reshape(shape)[()]
+
+def max_rate_for_payment(max_monthly_payment, loan_amount, period_in_months, installments_type, decimals=2):
+    """
+    :return: Highest nominal rate (%, rounded down to given decimals) with monthly payment (first installment for
+    decreasing installments) not exceeding max_monthly_payment. Closed form for decreasing installments:
+    12 * (payment / loan - 1 / period), vectorized bisection for equal installments (no closed form exists),
+    both corrected by single units of the last decimal for rounding of the payment. NaN where no rate fits.
+    """
+    shape, cap, loan, months, is_equal = _solver_inputs(installments_type, max_monthly_payment, loan_amount,
+                                                        period_in_months)
+    unit = 10.0 ** -decimals
+    # the payment is always greater than loan / period - no rate fits if the cap does not cover it
+    valid = (cap > 0) & (loan > 0) & (months > 0) & (loan / months < cap + 0.005)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        target = (cap + 0.005) / loan
+        low, high = np.zeros_like(target), target.copy()
+        for _ in range(64):
+            middle = (low + high) / 2
+            too_high = middle / (1 - (1 + middle) ** -months) > target
+            high = np.where(too_high, middle, high)
+            low = np.where(too_high, low, middle)
+        monthly_rate = np.where(is_equal, low, target - 1 / months)
+        units = np.floor(monthly_rate * 1200 / unit)
+    units = _step_to_limit(units, lambda units: _monthly_payments(loan, units * unit, months, is_equal) <= cap,
+                           valid, largest=True)
+    return np.round(units * unit, decimals).reshape(shape)[()]
+
+def calculate_effective_annual_rate(monthly_rate):
+    """
+    :return: Effective annual rate (%) of the monthly rate compounded monthly.
+    """
+    return (np.power(1 + np.asarray(monthly_rate, dtype=float), 12) - 1) * 100
+
+def calculate_irr(cash_flows, guess=0.01, tolerance=1e-12, max_iterations=50):
+    """
+    Internal rates of return (per period) of many cash flow schedules at once - rows of a 2D array with cash flows of
+    periods 0, 1, 2, ... (shorter schedules padded with zeros). Vectorized Newton method: all rows which did not
+    converge yet are updated in every iteration, until the step is smaller than the tolerance or max_iterations is
+    reached. Guess may be a single value or one value per row.
+    :return: IRRResult - array of rates, boolean array of converged rows and number of iterations performed.
+    """
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    periods = np.arange(cash_flows.shape[1])
+    rate = np.array(np.broadcast_to(np.asarray(guess, dtype=float), len(cash_flows)))
+    converged = np.zeros(len(cash_flows), dtype=bool)
+
+    iteration = 0
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        while iteration < max_iterations and not converged.all():
+            iteration += 1
+            active = np.flatnonzero(~converged)
+            discount = np.empty((len(active), len(periods)))
+            discount[:, 0] = 1
+            discount[:, 1:] = (1 / (1 + rate[active]))[:, None]
+            discount = np.cumprod(discount, axis=1)
+            value = (cash_flows[active] * discount).sum(axis=1)
+            derivative = -(cash_flows[active] * periods * discount).sum(axis=1) / (1 + rate[active])
+            step = value / derivative
+            # rates not greater than -100% have no meaning - such steps are shortened
+            rate[active] = np.maximum(rate[active] - step, (rate[active] - 1) / 2)
+            converged[active] = np.abs(step) < tolerance
+
+    return IRRResult(rate, converged, iteration)
+
+def _linear_schedule_irr(principal, period_in_months, guess, level, slope, rounding, tolerance=1e-12,
+                         max_iterations=50):
+    """
+    Vectorized Newton method for monthly internal rates of return of installments level + slope * (period - k + 1)
+    in month k (slope is 0 for equal installments) with present value of rounding differences added. Present value
+    of installments and its derivative are calculated in closed form (no per-month arrays):
+    level * a + slope * (period - a) / rate, where a is the annuity factor.
+    :return: Array of rates and boolean array of converged rows.
+    """
+    rate = np.array(guess, dtype=float)
+    converged = np.zeros(len(rate), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for _ in range(max_iterations):
+            active = np.flatnonzero(~converged)
+            if not len(active):
+                break
+            r, n = rate[active], period_in_months[active]
+            discount = (1 + r) ** -n
+            annuity_factor = (1 - discount) / r
+            annuity_factor_derivative = (n * discount / (1 + r) - annuity_factor) / r
+            value = level[active] * annuity_factor + slope[active] * (n - annuity_factor) / r + rounding[active] - \
+                principal[active]
+            derivative = level[active] * annuity_factor_derivative - \
+                slope[active] * (annuity_factor_derivative + (n - annuity_factor) / r) / r
+            step = value / derivative
+            rate[active] = np.maximum(r - step, (r - 1) / 2)
+            converged[active] = np.abs(step) < tolerance
+    return rate, converged
+
+@contextlib.contextmanager
+def _temporary_cache(mortgage):
+    """
+    Removing characteristics calculated inside the block from the cache of the mortgage, so that exports of many
+    loans hold only one schedule in memory at a time. Characteristics calculated before are kept.
+    """
+    cached = set(mortgage._cache)
+    try:
+        yield mortgage
+    finally:
+        for name in set(mortgage._cache) - cached:
+            del mortgage._cache[name]
+
+def save_schedules_to_csv(mortgages, path_to_save, loans_per_file=None, buffer_size=1 << 20, decomposition=False):
+    """
+    Streaming payment schedules of many loans (any iterable of Mortgage objects, e.g. a generator) to csv files.
+    Files have the layout of save_schedule_to_csv with an additional first column - number of the loan (from 1).
+    Schedules including overpayment are saved to the "_with_overpayment.csv" file (only loans with overpayment,
+    the file is created even if there are none).
+    With loans_per_file, files are split and numbered, e.g. Payment_schedules_1.csv, Payment_schedules_2.csv.
+    Only one schedule is held in memory at a time and rows are written through a buffer of buffer_size bytes.
+    With decomposition, interest, principal and outstanding principal columns are added.
+    :return: List of paths of saved files.
+    """
+    header, header_with_overpayment = _schedule_csv_headers(decomposition)
+    saved_paths = []
+    files = []
+
+    def open_files(file_number):
+        for file in files:
+            file.close()
+        files.clear()
+        path = path_to_save if loans_per_file is None else f"{path_to_save[:-4]}_{file_number}.csv"
+        for path, file_header in [(path, header), (path[:-4] + "_with_overpayment.csv", header_with_overpayment)]:
+            files.append(open(path, 'w', newline='', buffering=buffer_size))
+            csv.writer(files[-1], lineterminator='\n').writerow(['Loan'] + file_header)
+            saved_paths.append(path)
+        return csv.writer(files[0], lineterminator='\n'), csv.writer(files[1], lineterminator='\n')
+
+    try:
+        writer, writer_with_overpayment = open_files(1)
+        for loan_number, mortgage in enumerate(mortgages, start=1):
+            if loans_per_file and loan_number > 1 and (loan_number - 1) % loans_per_file == 0:
+                writer, writer_with_overpayment = open_files((loan_number - 1) // loans_per_file + 1)
+            with _temporary_cache(mortgage):
+                writer.writerows((loan_number, *row) for row in mortgage.iter_schedule(decomposition=decomposition))
+                if mortgage.overpayment:
+                    writer_with_overpayment.writerows((loan_number, *row) for row in mortgage.iter_schedule(
+                        with_overpayment=True, decomposition=decomposition))
+    finally:
+        for file in files:
+            file.close()
+
+    return saved_paths
+
+
+def _schedule_columns(mortgage):
+    """
+    :return: Payment schedule of the mortgage as an array with SCHEDULE_COLUMNS (NaN in columns updated
+    by overpayment if there is no overpayment) and its summary as a tuple of SUMMARY_DTYPE fields.
+    Schedules calculated only for the export are not kept in the Mortgage object.
+    """
+    schedule = np.full((mortgage.period_in_months, len(SCHEDULE_COLUMNS)), np.nan)
+    with _temporary_cache(mortgage):
+        if mortgage.overpayment:
+            schedule[:, :4] = mortgage.schedule_buffer
+            schedule[:, 4:] = mortgage.decomposition_buffer
+        else:
+            schedule[:, :4:2] = mortgage.schedule_buffer
+            schedule[:, 4::2] = mortgage.decomposition_buffer
+        quote = mortgage.summarize()
+    summary = tuple(np.nan if value is None else value for value in quote)
+    return schedule, summary
+
+def save_schedules_to_npy(mortgages, directory):
+    """
+    Saving payment schedules and summaries of many loans to NumPy .npy files which can be memory-mapped
+    (see ScheduleStore):
+    - schedules.npy - float array, one row per month of every loan, columns: SCHEDULE_COLUMNS,
+    - offsets.npy - int array, months of the i-th loan are rows from offsets[i] to offsets[i + 1] of schedules,
+    - summaries.npy - structured array (SUMMARY_DTYPE), one row per loan.
+    Schedules are written directly to the memory-mapped file, one loan at a time.
+    :return: Number of saved loans.
+    """
+    if not hasattr(mortgages, '__len__'):
+        mortgages = list(mortgages)
+    os.makedirs(directory, exist_ok=True)
+
+    offsets = np.zeros(len(mortgages) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([mortgage.period_in_months for mortgage in mortgages])
+    np.save(os.path.join(directory, "offsets.npy"), offsets)
+
+    schedules = np.lib.format.open_memmap(os.path.join(directory, "schedules.npy"), mode='w+', dtype=np.float64,
+                                          shape=(int(offsets[-1]), len(SCHEDULE_COLUMNS)))
+    summaries = np.lib.format.open_memmap(os.path.join(directory, "summaries.npy"), mode='w+', dtype=SUMMARY_DTYPE,
+                                          shape=(len(mortgages),))
+    for loan_number, mortgage in enumerate(mortgages):
+        schedules[offsets[loan_number]:offsets[loan_number + 1]], summaries[loan_number] = _schedule_columns(mortgage)
+    schedules.flush()
+    summaries.flush()
+    del schedules, summaries
+
+    return len(mortgages)
+
+def save_schedules_to_parquet(mortgages, directory, row_group_size=100000):
+    """
+    Saving payment schedules and summaries of many loans (any iterable of Mortgage objects) to Parquet files:
+    - schedules.parquet - columns: loan (number of the loan, from 0), month and SCHEDULE_COLUMNS,
+    - summaries.parquet - columns: loan and SUMMARY_DTYPE fields.
+    Requires the optional pyarrow package. Rows are written in row groups of about row_group_size months.
+    :return: Number of saved loans.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Saving schedules to Parquet files requires the pyarrow package (pip install pyarrow).")
+    os.makedirs(directory, exist_ok=True)
+
+    schedule_schema = pyarrow.schema([('loan', pyarrow.int64()), ('month', pyarrow.int32())] +
+                                     [(column, pyarrow.float64()) for column in SCHEDULE_COLUMNS])
+    summary_schema = pyarrow.schema([('loan', pyarrow.int64())] +
+                                    [(name, pyarrow.string() if SUMMARY_DTYPE[name].kind == 'U' else
+                                      pyarrow.from_numpy_dtype(SUMMARY_DTYPE[name])) for name in SUMMARY_DTYPE.names])
+
+    loan_count = 0
+    with pyarrow.parquet.ParquetWriter(os.path.join(directory, "schedules.parquet"), schedule_schema) as writer:
+        summaries = []
+        group = []
+        group_size = 0
+        for loan_count, mortgage in enumerate(mortgages, start=1):
+            schedule, summary = _schedule_columns(mortgage)
+            summaries.append((loan_count - 1,) + summary)
+            group.append((loan_count - 1, schedule))
+            group_size += len(schedule)
+            if group_size >= row_group_size:
+                writer.write_table(_parquet_schedule_table(group, schedule_schema))
+                group = []
+                group_size = 0
+        if group:
+            writer.write_table(_parquet_schedule_table(group, schedule_schema))
+
+    pyarrow.parquet.write_table(pyarrow.Table.from_pylist(
+        [dict(zip(summary_schema.names, summary)) for summary in summaries], schema=summary_schema),
+        os.path.join(directory, "summaries.parquet"))
+    return loan_count
+
+def _parquet_schedule_table(group, schema):
+    """
+    :return: pyarrow Table with schedules of the group of (loan number, schedule) pairs.
+    """
+    import pyarrow
+    schedules = np.concatenate([schedule for loan, schedule in group])
+    loans = np.concatenate([np.full(len(schedule), loan) for loan, schedule in group])
+    months = np.concatenate([np.arange(1, len(schedule) + 1, dtype=np.int32) for loan, schedule in group])
+    return pyarrow.Table.from_arrays([pyarrow.array(loans), pyarrow.array(months)] +
+                                     [pyarrow.array(schedules[:, i]) for i in range(len(SCHEDULE_COLUMNS))],
+                                     schema=schema)
+
+
+class ScheduleStore:
+    """
+    Read-only access to schedules and summaries saved with save_schedules_to_npy. Files are memory-mapped on first
+    access, so schedules of any loan are read without loading (or parsing) the whole set.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._arrays = {}
+
+    def _array(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode='r')
+        return self._arrays[name]
+
+    @property
+    def offsets(self):
+        return self._array('offsets')
+
+    @property
+    def schedules(self):
+        return self._array('schedules')
+
+    @property
+    def summaries(self):
+        return self._array('summaries')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, loan_number):
+        """
+        :return: Memory-mapped payment schedule of the loan - one row per month, columns: SCHEDULE_COLUMNS.
+        """
+        if not -len(self) <= loan_number < len(self):
+            raise IndexError("Loan number out of range.")
+        loan_number %= len(self)
+        return self.schedules[self.offsets[loan_number]:self.offsets[loan_number + 1]]
+
+
+def generate_mortgage_attributes_sheet(loan, rate, months, installments, overpayment=None):
+    """
+    :return: Using the Mortgage class, the function generates a mortgage attributes sheet.
+    Loan characteristics are not calculated - only input values are validated.
+    """
+    mortgage_to_calculate = Mortgage(loan_amount=loan, nominal_rate=rate, period_in_months=months,
+                                     installments_type=installments, overpayment=overpayment)
+    return mortgage_to_calculate.mortgage_attributes_sheet
+
+def calculate_overpayment_saving(loan, rate, months, installments, overpayment=None):
+    """
+    :return: Using the Mortgage class, the function calculates total savings resulting from the overpayment.
+    Only summary characteristics are calculated (no payment schedules) and reused through quote_cache.
+    """
+    return quote_cache.quote(loan_amount=loan, nominal_rate=rate, period_in_months=months,
+                             installments_type=installments, overpayment=overpayment).overpayment_saving
+
+def calculate_decreasing_installments_saving(loan, rate, months):
+    """
+    :return: Using the Mortgage class, the function calculates savings resulting from the choice of decreasing
+    installments. Only summary characteristics are calculated (no payment schedules) and reused through quote_cache.
+    """
+    quote_equal = quote_cache.quote(loan_amount=loan, nominal_rate=rate, period_in_months=months,
+                                    installments_type='equal')
+    quote_decreasing = quote_cache.quote(loan_amount=loan, nominal_rate=rate, period_in_months=months,
+                                         installments_type='decreasing')
+    return round(quote_equal.total_interest - quote_decreasing.total_interest, 2)
+
+PORTFOLIO_COLUMNS = ['loan', 'rate', 'months', 'installments', 'overpayment']
+PORTFOLIO_FORMATS = ['.csv', '.jsonl', '.json']
+RECORD_ERROR_MESSAGE = "Record is not a JSON object."
+NON_FINITE_ERROR_MESSAGE = "Loan parameters give infinite or undefined results."
+PORTFOLIO_SUMMARY_COLUMNS = ['row'] + PORTFOLIO_COLUMNS + ['monthly_payment', 'total_amount', 'total_interest',
+                                                           'overpayment_saving', 'error']
+
+def _convert_portfolio_value(value, convert):
+    """
+    :return: Value read from a .csv file converted with given function. Values that cannot be converted are returned
+    unchanged - the Mortgage setters report them as a wrong format.
+    """
+    if not isinstance(value, str):
+        return value
+    try:
+        return convert(value)
+    except ValueError:
+        return value
+
+def _portfolio_parameters(row):
+    """
+    :return: Mortgage input parameters of a loan parameter row read from a portfolio file.
+    """
+    loan, rate, months, installments, overpayment = row
+    return (_convert_portfolio_value(loan, float), _convert_portfolio_value(rate, float),
+            _convert_portfolio_value(months, int), installments, _convert_portfolio_value(overpayment or None, float))
+
+def _parse_record(line):
+    """
+    :return: JSON object (dictionary) of the line or None if the line is not a JSON object.
+    """
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+def read_portfolio(path, chunk_size):
+    """
+    :return: Generator of lists (chunks) of at most chunk_size loan parameter rows read from a .csv or .jsonl (.json)
+    file - the extension is checked at once (in any case), other files raise ValueError.
+    Every row is a list of values in the order of PORTFOLIO_COLUMNS. Lines of .jsonl files that are not JSON objects
+    are rows with RECORD_ERROR_MESSAGE instead - they do not stop reading the file.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in PORTFOLIO_FORMATS:
+        raise ValueError(Mortgage.VALUE_ERROR_MESSAGES['portfolio_format'])
+    return _read_portfolio_chunks(path, chunk_size, extension == '.csv')
+
+def _read_portfolio_chunks(path, chunk_size, is_csv):
+    """
+    :return: Generator of chunks of loan parameter rows of the portfolio file (see read_portfolio).
+    """
+    with open(path, newline='') as file:
+        if is_csv:
+            records = csv.DictReader(file)
+        else:
+            records = (_parse_record(line) for line in file if line.strip())
+
+        chunk = []
+        for record in records:
+            chunk.append(RECORD_ERROR_MESSAGE if record is None else
+                         [record.get(column) for column in PORTFOLIO_COLUMNS])
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def price_portfolio_chunk(rows, store_path=None):
+    """
+    :return: Summary rows (without row numbers) of the given loan parameter rows. All rows are validated at once
+    by validate_loans, valid rows are priced at once with MortgageBatch - with the result store, only rows missing
+    in the store are priced (and stored). Incorrect rows are not priced - the error column contains the message
+    of the Mortgage class (or the error message of records that are not JSON objects) instead.
+    """
+    summary = [[None] * 9 + [row] if isinstance(row, str) else list(_portfolio_parameters(row)) for row in rows]
+    loans = [row for row in summary if len(row) == len(PORTFOLIO_COLUMNS)]
+    errors = _first_errors(validate_loans(*zip(*loans)).errors) if loans else {}
+    valid = []
+    for number, row in enumerate(loans):
+        if number in errors:
+            row += [None, None, None, None, errors[number]]
+        else:
+            valid.append(row)
+
+    if valid:
+        keys = [QuoteCache.make_key(*row) for row in valid]
+        if store_path:
+            with ResultStore(store_path) as store:
+                quotes = store.quote_many(keys)
+        else:
+            quotes = price_quotes(keys)
+        for row, quote in zip(valid, quotes):
+            row += [quote.monthly_payment, quote.total_amount, quote.total_interest, quote.overpayment_saving, None]
+    return summary
+
+def price_portfolio(path, path_to_save, workers=None, chunk_size=10000, store_path=None):
+    """
+    Pricing all loans of the portfolio file in chunks spread across worker processes. Summary rows are saved
+    to a .csv file in the order of the input file. At most two chunks per worker are held in memory at once.
+    With the result store, workers reuse stored quotes and store the new ones.
+    :return: Number of priced rows and number of incorrect rows.
+    """
+    workers = workers or os.cpu_count() or 1
+    row_count = error_count = 0
+
+    chunks = read_portfolio(path, chunk_size)
+    with open(path_to_save, 'w', newline='') as file, ProcessPoolExecutor(workers) as executor:
+        writer = csv.writer(file)
+        writer.writerow(PORTFOLIO_SUMMARY_COLUMNS)
+
+        pending = deque()
+        while True:
+            for chunk in chunks:
+                pending.append(executor.submit(price_portfolio_chunk, chunk, store_path))
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                break
+            for summary_row in pending.popleft().result():
+                row_count += 1
+                error_count += summary_row[-1] is not None
+                writer.writerow([row_count] + summary_row)
+
+    return row_count, error_count
+
+def warm_store(path, store_path, chunk_size=10000):
+    """
+    Storing quotes and payment schedules of all correct loans of the portfolio file in the result store.
+    Loans already stored with schedules are skipped.
+    :return: Number of correct rows and number of newly stored loans.
+    """
+    row_count = stored = 0
+    with ResultStore(store_path) as store:
+        for chunk in read_portfolio(path, chunk_size):
+            mortgages = []
+            for parameters in map(_portfolio_parameters, (row for row in chunk if not isinstance(row, str))):
+                try:
+                    mortgages.append(Mortgage(*parameters))
+                except ValueError:
+                    pass
+            row_count += len(mortgages)
+            stored += store.warm(mortgages)
+    return row_count, stored
+
+def manage_store(args):
+    """
+    Warming (with loans of the portfolio file), inspecting or purging the result store given by command line
+    arguments. Statistics of the store are printed after every action.
+    """
+    if args.store_action == 'warm':
+        if not args.portfolio:
+            parser.error("warming the result store requires the --portfolio file")
+        row_count, stored = warm_store(args.portfolio, args.store, args.chunk_size)
+        print(f"Result store warmed: {row_count} correct rows, {stored} loans stored")
+    with ResultStore(args.store) as store:
+        if args.store_action == 'purge':
+            print(f"Result store purged: {store.purge()} results removed")
+        print(json.dumps(store.stats(), indent=2))
+
+def quote_records(lines, schedules=False, store=None):
+    """
+    :return: Result records (dictionaries) of JSON lines with loan parameters (keys as in portfolio files, optional
+    id copied to the result and schedule flag). Every record has the id (if given) and either MortgageQuote fields
+    (and the schedule) or the error message only. Correct loans are priced at once with MortgageBatch (with the result
+    store - only loans missing in the store) and get MortgageQuote fields, and payment schedules if requested.
+    Incorrect records get the error message of the Mortgage class (all records are validated at once by
+    validate_loans) instead, loans failing to be priced (e.g. too long periods for NumPy arrays) get the exception
+    (the other loans of the batch are priced separately) and loans with infinite or undefined (NaN) results (e.g. of
+    an infinite loan amount) get an error as well - records are valid JSON. Blank lines are skipped.
+    """
+    results = []
+    loans = []
+    for line in lines:
+        if not line.strip():
+            continue
+        record = _parse_record(line)
+        if record is None:
+            results.append({'error': RECORD_ERROR_MESSAGE})
+            continue
+
+        result = {'id': record['id']} if 'id' in record else {}
+        parameters = _portfolio_parameters([record.get(column) for column in PORTFOLIO_COLUMNS])
+        loans.append((result, parameters, schedules or record.get('schedule')))
+        results.append(result)
+    if not loans:
+        return results
+
+    errors = _first_errors(validate_loans(*zip(*(parameters for _, parameters, _ in loans))).errors)
+    valid = []
+    for number, (result, parameters, schedule) in enumerate(loans):
+        if number in errors:
+            result['error'] = errors[number]
+        else:
+            valid.append((result, parameters, schedule))
+
+    if valid:
+        keys = [QuoteCache.make_key(*parameters) for _, parameters, _ in valid]
+        quotes = price_quotes_separately(keys, store.quote_many if store is not None else price_quotes)
+        for (result, parameters, schedule), quote in zip(valid, quotes):
+            if isinstance(quote, Exception):
+                result['error'] = f"{type(quote).__name__}: {quote}"
+                continue
+            # infinity and NaN are not JSON numbers
+            if not all(np.isfinite(value) for value in quote if isinstance(value, float)):
+                result['error'] = NON_FINITE_ERROR_MESSAGE
+                continue
+            result.update(quote._asdict())
+            if schedule:
+                result['schedule'] = schedule_rows(Mortgage(*parameters))
+    return results
+
+def _read_lines(file, lines):
+    """
+    Putting lines of the file into the bounded queue (blocks while the queue is full) and None at the end.
+    An exception raised while reading (e.g. UnicodeDecodeError) is put into the queue before None.
+    """
+    try:
+        for line in file:
+            lines.put(line)
+    except Exception as error:
+        lines.put(error)
+    finally:
+        lines.put(None)
+
+def stream_quotes(input_file, output_file, chunk_size=1000, schedules=False, store_path=None):
+    """
+    Streaming result records of JSON lines read from the input file to the output file (see quote_records).
+    Lines are read by a thread into a queue of at most two chunks - when the output is not consumed, reading
+    the input stops as well. Lines available at once (at most chunk_size) are priced together and their results
+    are written and flushed before the next lines are read, so every result is written as soon as it is calculated.
+    If reading the input fails, results of lines read before are written, followed by an error record of the
+    exception, and streaming stops.
+    :return: Number of result records and number of error records.
+    """
+    lines = queue.Queue(maxsize=2 * chunk_size)
+    threading.Thread(target=_read_lines, args=(input_file, lines), daemon=True).start()
+    record_count = error_count = 0
+
+    with ResultStore(store_path) if store_path else contextlib.nullcontext() as store:
+        finished = False
+        while not finished:
+            chunk = [lines.get()]
+            while len(chunk) < chunk_size and isinstance(chunk[-1], str):
+                try:
+                    chunk.append(lines.get_nowait())
+                except queue.Empty:
+                    break
+            # the end of input - None or the exception of the reading thread
+            end = None
+            if not isinstance(chunk[-1], str):
+                finished = True
+                end = chunk.pop()
+
+            results = quote_records(chunk, schedules, store)
+            if isinstance(end, Exception):
+                results.append({'error': f"Reading input failed - {type(end).__name__}: {end}"})
+            output_file.write("".join(json.dumps(result, allow_nan=False) + "\n" for result in results))
+            output_file.flush()
+            record_count += len(results)
+            error_count += sum('error' in result for result in results)
+
+    return record_count, error_count
+
+
+def _vasicek_paths(initial_rate, shocks, mean_rate, reversion_speed, volatility, reset_every, min_rate):
+    """
+    :return: Nominal rate paths (rows: paths, columns: months) driven by given standard normal shocks
+    (one column less than months - the first month has the initial rate).
+    """
+    paths, months = len(shocks), shocks.shape[1] + 1
+    rates = np.empty((paths, months))
+    rates[:, 0] = initial_rate
+    for month in range(1, months):
+        rates[:, month] = rates[:, month - 1] + reversion_speed * (mean_rate - rates[:, month - 1]) / 12 + \
+                          volatility * np.sqrt(1 / 12) * shocks[:, month - 1]
+    # rates are reset every reset_every months and kept between resets
+    rates = rates[:, np.arange(months) // reset_every * reset_every]
+    return np.maximum(rates, min_rate)
+
+def simulate_rate_paths(initial_rate, months, paths, mean_rate=None, reversion_speed=0.5, volatility=1.0,
+                        reset_every=1, seed=None, min_rate=0.01):
+    """
+    Nominal rate paths (%) of the mean-reverting (Vasicek) model with monthly steps:
+    rate(t) = rate(t - 1) + reversion_speed * (mean_rate - rate(t - 1)) / 12 + volatility * sqrt(1 / 12) * Z(t),
+    where Z(t) are independent standard normal variables drawn from the generator of given seed. The first month
+    has the initial rate, rates change only every reset_every months and are floored at min_rate.
+    Mean rate defaults to the initial rate.
+    :return: Array of rates - rows: paths, columns: months.
+    """
+    shocks = np.random.default_rng(seed).standard_normal((paths, months - 1))
+    return _vasicek_paths(initial_rate, shocks, initial_rate if mean_rate is None else mean_rate, reversion_speed,
+                          volatility, reset_every, min_rate)
+
+def simulate_scenario_chunk(loans, seed, paths, model):
+    """
+    Amortizing all loans on one chunk of rate paths. The same standard normal shocks (drawn from the seed) drive
+    paths of all loans - every path is one market scenario. Every loan is simulated for all paths at once
+    by VariableRateBatch.
+    :return: Total interest and payment shock (%, the largest increase of installment compared with the fixed rate
+    schedule) - arrays with rows: loans, columns: paths.
+    """
+    mean_rate, reversion_speed, volatility, reset_every, min_rate = model
+    shocks = np.random.default_rng(seed).standard_normal((paths, max(loan[2] for loan in loans) - 1))
+    total_interest = np.empty((len(loans), paths))
+    payment_shock = np.empty((len(loans), paths))
+    for row, (loan_amount, nominal_rate, period_in_months, installments_type) in enumerate(loans):
+        rates = _vasicek_paths(nominal_rate, shocks[:, :period_in_months - 1],
+                               nominal_rate if mean_rate is None else mean_rate, reversion_speed, volatility,
+                               reset_every, min_rate)
+        fixed_rate = VariableRateBatch(loan_amount, nominal_rate, period_in_months, installments_type)
+        scenarios = VariableRateBatch(loan_amount, rates, period_in_months, installments_type)
+        total_interest[row] = scenarios.total_interest
+        payment_shock[row] = (scenarios.installments / fixed_rate.installments - 1).max(axis=1) * 100
+    return total_interest, payment_shock
+
+def simulate_rate_scenarios(mortgages, paths=1000, mean_rate=None, reversion_speed=0.5, volatility=1.0,
+                            reset_every=1, seed=0, workers=None, chunk_size=1000, percentiles=(5, 50, 95, 99),
+                            min_rate=0.01):
+    """
+    Monte Carlo simulation of total interest and payment shock of loans (Mortgage objects, overpayment lowers the
+    loan amount) under stochastic rate paths of the mean-reverting model (see simulate_rate_paths, mean rate defaults
+    to the nominal rate of every loan). Paths are split into chunks of chunk_size, simulated by worker processes.
+    Every chunk draws its shocks from its own seed spawned from the given seed, so results depend only on the seed
+    and chunk size - not on the number of workers.
+    :return: ScenarioResult - percentiles and arrays of their values (rows: loans, columns: percentiles) of total
+    interest and payment shock (%).
+    """
+    loans = [(mortgage.loan_amount - (mortgage.overpayment or 0), mortgage.nominal_rate, mortgage.period_in_months,
+              mortgage.installments_type) for mortgage in mortgages]
+    model = (mean_rate, reversion_speed, volatility, reset_every, min_rate)
+    chunks = [min(chunk_size, paths - start) for start in range(0, paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    workers = workers or os.cpu_count() or 1
+
+    arguments = ([loans] * len(chunks), seeds, chunks, [model] * len(chunks))
+    if workers == 1:
+        results = list(map(simulate_scenario_chunk, *arguments))
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(simulate_scenario_chunk, *arguments))
+
+    total_interest = np.concatenate([result[0] for result in results], axis=1)
+    payment_shock = np.concatenate([result[1] for result in results], axis=1)
+    return ScenarioResult(np.asarray(percentiles), np.percentile(total_interest, percentiles, axis=1).T,
+                          np.percentile(payment_shock, percentiles, axis=1).T)
+
+
+def price_quotes(keys):
+    """
+    :return: MortgageQuotes of loans given by normalized input parameters (QuoteCache keys), priced at once
+    with MortgageBatch.
+    """
+    loan, rate, months, installments, overpayment = zip(*keys)
+    batch = MortgageBatch(loan, rate, months, installments, [value or np.nan for value in overpayment])
+    quotes = []
+    for key, *characteristics in zip(keys, batch.monthly_payment.tolist(), batch.total_amount.tolist(),
+                                     batch.total_interest.tolist(), batch.new_monthly_payment.tolist(),
+                                     batch.new_total_amount.tolist(), batch.new_total_interest.tolist(),
+                                     batch.overpayment_saving.tolist()):
+        if not key[4]:
+            characteristics[3:] = [None] * 4
+        quotes.append(MortgageQuote(*key, *characteristics))
+    return quotes
+
+def price_quotes_separately(keys, price=price_quotes):
+    """
+    :return: MortgageQuotes of QuoteCache keys priced at once with price (price_quotes or ResultStore.quote_many
+    method - a function of the list of keys returning a list of quotes). If the batch fails (e.g. with
+    OverflowError for values accepted by the Mortgage setters but not by NumPy arrays), every key is priced
+    separately - keys that fail get their exception instead of a quote, the other keys are priced.
+    """
+    try:
+        return price(keys)
+    except Exception:
+        quotes = []
+        for key in keys:
+            try:
+                quotes.append(price([key])[0])
+            except Exception as error:
+                quotes.append(error)
+        return quotes
+
+def schedule_rows(mortgage):
+    """
+    :return: Dictionary with column names and rows of the payment schedule (with overpayment, if given)
+    split into interest and principal.
+    """
+    header, header_with_overpayment = _schedule_csv_headers(decomposition=True)
+    return {'columns': ['Month'] + (header_with_overpayment if mortgage.overpayment else header)[1:],
+            'rows': list(mortgage.iter_schedule(with_overpayment=True, decomposition=True))}
+
+
+# version of the calculation engine (Mortgage, MortgageBatch and functions they use) - bumped whenever a change of the
+# engine changes quotes or schedules, results stored by other versions of the engine are not reused
+ENGINE_VERSION = "1"
+
+def _pack_schedule(schedule_buffer):
+    """
+    :return: Compact serialized schedule buffer - compressed int64 cents.
+    """
+    import zlib
+    return zlib.compress(np.asarray(_to_cents(schedule_buffer), dtype='<i8').tobytes())
+
+def _unpack_schedule(data, overpayment):
+    """
+    :return: Schedule buffer (columns as in the Mortgage class) of a serialized schedule.
+    """
+    import zlib
+    return np.frombuffer(zlib.decompress(data), dtype='<i8').reshape(-1, 4 if overpayment else 2) / 100
+
+
+class ResultStore:
+    """
+    Persistent SQLite store of quotes and payment schedules (schedule buffers serialized as compressed int64 cents),
+    keyed on normalized input parameters (QuoteCache keys) and the engine version. The store is shared by processes
+    and runs - quote_many prices with MortgageBatch only the loans missing in the store, so repricing mostly unchanged
+    loans calculates only the changed ones. hits and misses count looked up quotes.
+    """
+    KEY_COLUMNS = ['loan_amount', 'nominal_rate', 'period_in_months', 'installments_type', 'overpayment']
+    QUOTE_COLUMNS = list(MortgageQuote._fields[5:])
+    # maximum number of keys looked up by one query (SQLite limits the number of query parameters)
+    LOOKUP_SIZE = 5000
+
+    def __init__(self, path="Mortgage_results.sqlite", timeout=60):
+        import sqlite3
+        self.path = path
+        self.engine = ENGINE_VERSION
+        self.hits = 0
+        self.misses = 0
+        self._connection = sqlite3.connect(path, timeout=timeout)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS results (engine TEXT NOT NULL, loan_amount REAL NOT NULL, "
+                f"nominal_rate REAL NOT NULL, period_in_months INTEGER NOT NULL, installments_type TEXT NOT NULL, "
+                f"overpayment REAL NOT NULL, {', '.join(column + ' REAL' for column in self.QUOTE_COLUMNS)}, "
+                f"schedule BLOB, PRIMARY KEY (engine, {', '.join(self.KEY_COLUMNS)}))")
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM results WHERE engine = ?", (self.engine,)).fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    @staticmethod
+    def _row_key(key):
+        """
+        :return: Stored key of a QuoteCache key - loans without overpayment are stored with overpayment 0
+        (NULL values are not unique in SQLite).
+        """
+        return (*key[:4], key[4] or 0.0)
+
+    def _lookup(self, keys, columns):
+        """
+        :return: Dictionary of stored keys and selected columns of rows found in the store.
+        """
+        found = {}
+        rows = list(dict.fromkeys(self._row_key(key) for key in keys))
+        for start in range(0, len(rows), self.LOOKUP_SIZE):
+            chunk = rows[start:start + self.LOOKUP_SIZE]
+            for row in self._connection.execute(
+                    f"SELECT {', '.join(self.KEY_COLUMNS + columns)} FROM results WHERE engine = ? AND "
+                    f"({', '.join(self.KEY_COLUMNS)}) IN (VALUES {', '.join(['(?, ?, ?, ?, ?)'] * len(chunk))})",
+                    [self.engine] + [value for key in chunk for value in key]):
+                found[tuple(row[:5])] = row[5:]
+        return found
+
+    def get_many(self, keys):
+        """
+        :return: List of stored MortgageQuotes (None for keys missing in the store) in the order of keys.
+        """
+        found = self._lookup(keys, self.QUOTE_COLUMNS)
+        quotes = []
+        for key in keys:
+            row = found.get(self._row_key(key))
+            self.hits += row is not None
+            self.misses += row is None
+            quotes.append(None if row is None else MortgageQuote(*key, *row))
+        return quotes
+
+    def put_many(self, quotes, schedule_buffers=None):
+        """
+        Storing quotes (replacing stored results of the same keys) with their schedule buffers, if given.
+        """
+        schedule_buffers = schedule_buffers or [None] * len(quotes)
+        with self._connection:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO results VALUES ({', '.join(['?'] * (len(MortgageQuote._fields) + 2))})",
+                [(self.engine, *self._row_key(QuoteCache.make_key(*quote[:5])), *quote[5:],
+                  None if schedule_buffer is None else _pack_schedule(schedule_buffer))
+                 for quote, schedule_buffer in zip(quotes, schedule_buffers)])
+
+    def quote_many(self, keys):
+        """
+        :return: List of MortgageQuotes of QuoteCache keys in the order of keys. Quotes missing in the store
+        are priced at once with MortgageBatch and stored.
+        """
+        quotes = self.get_many(keys)
+        missing = list(dict.fromkeys(key for key, quote in zip(keys, quotes) if quote is None))
+        if missing:
+            priced = dict(zip(missing, price_quotes(missing)))
+            self.put_many(list(priced.values()))
+            quotes = [quote or priced[key] for key, quote in zip(keys, quotes)]
+        return quotes
+
+    def schedule_buffer(self, key):
+        """
+        :return: Stored schedule buffer of the QuoteCache key (columns as in the Mortgage class) or None.
+        """
+        row = self._lookup([key], ['schedule']).get(self._row_key(key))
+        return None if row is None or row[0] is None else _unpack_schedule(row[0], key[4])
+
+    def warm(self, mortgages):
+        """
+        Storing quotes and schedules of Mortgage objects whose schedules are missing in the store.
+        :return: Number of stored loans.
+        """
+        mortgages = {QuoteCache.make_key(mortgage.loan_amount, mortgage.nominal_rate, mortgage.period_in_months,
+                                         mortgage.installments_type, mortgage.overpayment): mortgage
+                     for mortgage in mortgages}
+        stored = self._lookup(list(mortgages), ['schedule'])
+        missing = [mortgage for key, mortgage in mortgages.items()
+                   if stored.get(self._row_key(key), (None,))[0] is None]
+        self.put_many([mortgage.summarize() for mortgage in missing],
+                      [mortgage.schedule_buffer for mortgage in missing])
+        return len(missing)
+
+    def stats(self):
+        """
+        :return: Dictionary with the engine version, numbers of stored results of the current engine version
+        (with schedules) and of other versions, file size and lookup counters.
+        """
+        current, schedules = self._connection.execute(
+            "SELECT COUNT(*), COUNT(schedule) FROM results WHERE engine = ?", (self.engine,)).fetchone()
+        stale = self._connection.execute("SELECT COUNT(*) FROM results WHERE engine != ?", (self.engine,)).fetchone()[0]
+        size = sum(os.path.getsize(path) for path in [self.path, self.path + "-wal"] if os.path.exists(path))
+        return {'engine': self.engine, 'results': current, 'schedules': schedules, 'stale_results': stale,
+                'size_bytes': size, 'hits': self.hits, 'misses': self.misses}
+
+    def purge(self, stale_only=False):
+        """
+        Removing all stored results (or only results of other engine versions).
+        :return: Number of removed results.
+        """
+        with self._connection:
+            if stale_only:
+                removed = self._connection.execute("DELETE FROM results WHERE engine != ?", (self.engine,)).rowcount
+            else:
+                removed = self._connection.execute("DELETE FROM results").rowcount
+        self._connection.execute("VACUUM")
+        return removed
+
+class QuoteServer:
+    """
+    Asyncio HTTP server of loan quotes (standard library only, HTTP/1.1 with keep-alive):
+    GET /quote?loan=...&rate=...&months=...&installments=...&overpayment=... (or POST /quote with a JSON object)
+    returns the MortgageQuote as a JSON object, GET /schedule with the same parameters returns the payment schedule
+    (and the schedule with overpayment), GET /metrics returns counters, latency and batch size percentiles.
+    Inputs are validated by the Mortgage setters (400 with the Mortgage error message). Identical concurrent requests
+    are coalesced - they wait for the same result. Distinct requests arriving within batch_window seconds
+    are priced at once by MortgageBatch (at most max_batch_size loans), in the executor (default: thread pool),
+    same as schedules - the event loop only parses requests and writes responses. If a batch fails, its loans are
+    priced separately, so only requests of failing loans get an error (500 for errors other than ValueError).
+    """
+    QUOTE_PARAMETERS = {'loan': float, 'rate': float, 'months': int, 'installments': str, 'overpayment': float}
+    REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               500: 'Internal Server Error'}
+
+    def __init__(self, host='127.0.0.1', port=8000, batch_window=0.002, max_batch_size=1024, executor=None,
+                 metrics_size=10000):
+        self.host = host
+        self.port = port
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.executor = executor
+        self.requests = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=metrics_size)
+        self.batch_sizes = deque(maxlen=metrics_size)
+        self._server = None
+        self._in_flight = {}
+        self._pending = []
+        self._flush_handle = None
+
+    async def start(self):
+        """
+        Starting the server. With port 0 a free port is chosen and stored in the port attribute.
+        """
+        import asyncio
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def metrics(self):
+        """
+        :return: Dictionary with request counters, latency percentiles (milliseconds) of the last requests
+        and percentiles of sizes of the last batches.
+        """
+        latencies = np.array(self.latencies) * 1000
+        batch_sizes = np.array(self.batch_sizes)
+        return {'requests': self.requests,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'batches': len(batch_sizes),
+                'latency_ms': {f'p{percentile}': float(np.percentile(latencies, percentile)) if len(latencies)
+                               else None for percentile in (50, 99)},
+                'batch_size': {'p50': float(np.percentile(batch_sizes, 50)) if len(batch_sizes) else None,
+                               'max': int(batch_sizes.max()) if len(batch_sizes) else None}}
+
+    @classmethod
+    def parse_parameters(cls, parameters):
+        """
+        :return: Mortgage input parameters (in the order of the Mortgage class) from query or JSON parameters.
+        Values of query strings that cannot be converted are left unchanged - the Mortgage setters report them
+        as a wrong format.
+        """
+        return tuple(_convert_portfolio_value(parameters.get(name) or None, convert) if name == 'overpayment' else
+                     _convert_portfolio_value(parameters.get(name), convert)
+                     for name, convert in cls.QUOTE_PARAMETERS.items())
+
+    async def quote(self, loan_amount, nominal_rate, period_in_months, installments_type, overpayment=None):
+        """
+        :return: MortgageQuote of validated input parameters, priced in the next batch. Concurrent requests
+        with the same parameters share one result.
+        """
+        import asyncio
+        Mortgage(loan_amount, nominal_rate, period_in_months, installments_type, overpayment)
+        key = QuoteCache.make_key(loan_amount, nominal_rate, period_in_months, installments_type, overpayment)
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = self._in_flight[key] = loop.create_future()
+        self._pending.append(key)
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        """
+        Pricing all pending quotes at once in the executor.
+        """
+        import asyncio
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        keys, self._pending = self._pending, []
+        self.batch_sizes.append(len(keys))
+        task = asyncio.get_running_loop().run_in_executor(self.executor, price_quotes_separately, keys)
+        task.add_done_callback(functools.partial(self._set_results, keys))
+
+    def _set_results(self, keys, task):
+        """
+        Passing quotes of the priced batch to all waiting requests - exceptions only to requests of the keys
+        that failed (or to all requests if the batch could not be priced at all).
+        """
+        for row, key in enumerate(keys):
+            future = self._in_flight.pop(key)
+            if task.exception() is not None:
+                future.set_exception(task.exception())
+            elif isinstance(task.result()[row], Exception):
+                future.set_exception(task.result()[row])
+            else:
+                future.set_result(task.result()[row])
+
+    async def schedule(self, loan_amount, nominal_rate, period_in_months, installments_type, overpayment=None):
+        """
+        :return: Dictionary with payment schedules (lists of rows) of validated input parameters, calculated
+        in the executor.
+        """
+        import asyncio
+        mortgage = Mortgage(loan_amount, nominal_rate, period_in_months, installments_type, overpayment)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, schedule_rows, mortgage)
+
+    async def _respond(self, method, target, body):
+        """
+        :return: Status code and JSON serializable response of the request.
+        """
+        from urllib.parse import parse_qsl, urlsplit
+        url = urlsplit(target)
+        if url.path == '/metrics':
+            return 200, self.metrics()
+        if url.path not in ('/quote', '/schedule'):
+            return 404, {'error': f"Unknown path {url.path}"}
+        if method == 'POST':
+            try:
+                parameters = json.loads(body)
+            except ValueError:
+                return 400, {'error': "Request body is not a JSON object"}
+        elif method == 'GET':
+            parameters = dict(parse_qsl(url.query))
+        else:
+            return 405, {'error': f"Method {method} is not allowed"}
+        if not isinstance(parameters, dict):
+            return 400, {'error': "Request body is not a JSON object"}
+
+        try:
+            if url.path == '/quote':
+                return 200, (await self.quote(*self.parse_parameters(parameters)))._asdict()
+            return 200, await self.schedule(*self.parse_parameters(parameters))
+        except ValueError as error:
+            return 400, {'error': str(error).strip()}
+        except Exception as error:
+            # unexpected errors of one request are reported to its client, the server keeps running
+            return 500, {'error': f"{type(error).__name__}: {error}"}
+
+    async def _handle_connection(self, reader, writer):
+        """
+        Serving requests of one connection until it is closed by the client.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while (line := await reader.readline()).strip():
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                method, target = request_line.decode('latin-1').split()[:2]
+
+                start = time.perf_counter()
+                self.requests += 1
+                status, response = await self._respond(method, target, body)
+                self.errors += status != 200
+                self.latencies.append(time.perf_counter() - start)
+
+                content = json.dumps(response).encode()
+                writer.write(f"HTTP/1.1 {status} {self.REASONS[status]}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(content)}\r\n\r\n".encode() + content)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, ValueError, EOFError):
+            pass
+        finally:
+            writer.close()
+
+
+def print_mortgage_calculations(args):
+    """
+    Printing all calculations of the loan given by command line arguments and saving its payment schedule.
+    """
+    mortgage = Mortgage(args.loan, args.rate, args.months, args.installments, args.overpayment)
+
+    # sheets and full schedules are formatted straight from calculated values, without pandas
+    mortgage.render_sheets(sys.stdout, args.style)
+    print()
+    mortgage.render_schedule(sys.stdout, args.style)
+    print()
+    if mortgage.overpayment:
+        mortgage.render_schedule(sys.stdout, args.style, with_overpayment=True)
+    print()
+
+    mortgage.save_schedule_to_csv("Payment_schedule.csv")
+
+    # the attributes sheet of generate_mortgage_attributes_sheet is rendered as text - pandas is not imported
+    print("--- Additional functions usages ---: ")
+    print("calculate_mortgage_attributes_sheet: ")
+    render_sheet('Mortgage attributes sheet', *mortgage._attributes_sheet_rows(), sys.stdout, args.style)
+
+    if mortgage.overpayment:
+        print("calculate_overpayment_saving: ")
+        print(calculate_overpayment_saving(args.loan, args.rate, args.months, args.installments, args.overpayment))
+
+    print("calculate_decreasing_installments_saving: ")
+    print(calculate_decreasing_installments_saving(args.loan, args.rate, args.months))
+
+
+def main():
+    args = parser.parse_args()
+
+    with StageProfiler() if args.profile else contextlib.nullcontext() as profiler:
+        if args.serve is not None:
+            import asyncio
+            print(f"Serving quotes on http://{args.host}:{args.serve}")
+            asyncio.run(QuoteServer(args.host, args.serve).serve_forever())
+        elif args.stream:
+            try:
+                stream_quotes(sys.stdin, sys.stdout, args.chunk_size, args.schedules, args.store)
+            except BrokenPipeError:
+                # the reader of the output stream exited - remaining output is discarded
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        elif args.store_action:
+            args.store = args.store or "Mortgage_results.sqlite"
+            manage_store(args)
+        elif args.portfolio:
+            row_count, error_count = price_portfolio(args.portfolio, args.output, args.workers, args.chunk_size,
+                                                     args.store)
+            print(f"Portfolio priced: {row_count} rows, {error_count} incorrect. Summary saved to {args.output}")
+        else:
+            print_mortgage_calculations(args)
 
+    if args.profile:
+        print()
+        print("--- Profile of calculation stages (worker processes are not profiled) ---")
+        print(profiler.report())
 
 if __name__ == '__main__':
     main()
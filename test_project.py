@@ -1,6 +1,14 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
 import project
 import pytest
 import pandas as pd
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 
 TEST_LOAN_1e = 50000
@@ -401,3 +409,1319 @@ def test_installments_out_of_list():
         project.Mortgage(loan_amount=TEST_LOAN_1e, nominal_rate=TEST_RATE_1e, period_in_months=TEST_MONTHS_1e,
                          installments_type='EQUAL')
     assert message.value.args[0] == correct_message
+
+
+"""
+Batch engine tests.
+Testing that vectorized calculations give the same results as the Mortgage class.
+"""
+
+@pytest.mark.batch_engine_testing
+def test_mortgage_batch_matches_mortgage():
+    loans = [(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, TEST_INSTALLMENTS_1e, TEST_OVERPAYMENT_1e),
+             (TEST_LOAN_1d, TEST_RATE_1d, TEST_MONTHS_1d, TEST_INSTALLMENTS_1d, TEST_OVERPAYMENT_1d),
+             (261675, 4.4, 1, 'equal', None),
+             (350000, 5.25, 360, 'decreasing', None),
+             (120000.5, 3.1, 7, 'decreasing', 100000),
+             (480000, 6.6, 480, 'equal', 480000)]
+    batch = project.MortgageBatch(*zip(*[loan[:4] for loan in loans]),
+                                  overpayment=[loan[4] or float('nan') for loan in loans])
+
+    for row, loan in enumerate(loans):
+        mortgage = project.Mortgage(*loan)
+        assert batch.monthly_payment[row] == mortgage.monthly_payment
+        assert batch.total_amount[row] == mortgage.total_amount
+        assert batch.total_interest[row] == mortgage.total_interest
+        if mortgage.overpayment:
+            assert batch.new_monthly_payment[row] == mortgage.new_monthly_payment
+            assert batch.new_total_amount[row] == mortgage.new_total_amount
+            assert batch.new_total_interest[row] == mortgage.new_total_interest
+            assert batch.overpayment_saving[row] == mortgage.overpayment_saving
+        else:
+            assert batch.overpayment_saving[row] != batch.overpayment_saving[row]
+
+@pytest.mark.batch_engine_testing
+def test_mortgage_batch_wrong_installments_type():
+    correct_message = "An incorrect input for installments type was given. Please use string out of: 'equal'," \
+                      " 'decreasing'.\n\n"
+
+    with pytest.raises(ValueError) as message:
+        project.MortgageBatch([TEST_LOAN_1e, TEST_LOAN_1d], TEST_RATE_1e, TEST_MONTHS_1e, ['equal', 'decr'])
+    assert message.value.args[0] == correct_message
+
+
+"""
+Closed form engine tests.
+Testing closed form schedule queries against month by month calculations.
+"""
+
+@pytest.mark.closed_form_testing
+def test_closed_form_matches_month_by_month_schedule():
+    for installments in ['equal', 'decreasing']:
+        balance = TEST_LOAN_1e
+        cumulative_interest = 0
+        for month in range(1, TEST_MONTHS_1e + 1):
+            installment = project.closed_form_installment(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, installments,
+                                                          month)
+            interest = balance * TEST_RATE_1e / 100 / 12
+            cumulative_interest += interest
+            balance -= installment - interest
+
+            assert project.closed_form_balance(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, installments,
+                                               month) == pytest.approx(balance, abs=1e-6)
+            assert project.closed_form_cumulative_interest(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, installments,
+                                                           month) == pytest.approx(cumulative_interest, abs=1e-6)
+            assert project.closed_form_cumulative_principal(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, installments,
+                                                            month) == pytest.approx(TEST_LOAN_1e - balance, abs=1e-6)
+        assert balance == pytest.approx(0, abs=1e-6)
+
+@pytest.mark.closed_form_testing
+def test_closed_form_remaining():
+    mortgage = project.Mortgage(TEST_LOAN_1d, TEST_RATE_1d, TEST_MONTHS_1d, TEST_INSTALLMENTS_1d)
+    remaining = project.closed_form_remaining(TEST_LOAN_1d, TEST_RATE_1d, TEST_MONTHS_1d, TEST_INSTALLMENTS_1d,
+                                              [0, 24, TEST_MONTHS_1d])
+
+    # Mortgage rounds every installment separately - closed form differs by at most half a cent per installment
+    assert remaining[0] == pytest.approx(mortgage.total_amount, abs=TEST_MONTHS_1d * 0.005)
+    assert remaining[1] == pytest.approx(mortgage.remaining[23], abs=TEST_MONTHS_1d * 0.005)
+    assert remaining[2] == 0
+
+
+"""
+Lazy evaluation tests.
+Testing that characteristics are calculated on first access and recalculated after changing input parameters.
+"""
+
+@pytest.mark.lazy_evaluation_testing
+def test_nothing_calculated_on_init(mortgage_equal):
+    assert mortgage_equal._cache == {}
+
+    assert mortgage_equal.total_interest == 9403.6
+    assert 'payment_schedule' not in mortgage_equal._cache
+    assert 'calculation_summary' not in mortgage_equal._cache
+
+@pytest.mark.lazy_evaluation_testing
+def test_cache_cleared_by_setter(mortgage_equal):
+    assert mortgage_equal.total_interest == 9403.6
+    assert len(mortgage_equal.payment_schedule) == TEST_MONTHS_1e
+
+    mortgage_equal.period_in_months = 2 * TEST_MONTHS_1e
+    assert len(mortgage_equal.payment_schedule) == 2 * TEST_MONTHS_1e
+    assert mortgage_equal.total_interest == project.Mortgage(TEST_LOAN_1e, TEST_RATE_1e, 2 * TEST_MONTHS_1e,
+                                                             TEST_INSTALLMENTS_1e).total_interest
+
+    mortgage_equal.overpayment = None
+    assert mortgage_equal.overpayment_saving is None
+    assert mortgage_equal.payment_schedule_with_overpayment is None
+
+@pytest.mark.lazy_evaluation_testing
+def test_loan_amount_setter_checks_overpayment():
+    mortgage = project.Mortgage(1000, 5, 12, 'equal', 500)
+    saving = mortgage.overpayment_saving
+
+    with pytest.raises(ValueError) as message:
+        mortgage.loan_amount = 100
+    assert message.value.args[0] == project.Mortgage.VALUE_ERROR_MESSAGES['overpayment']
+    assert mortgage.loan_amount == 1000 and mortgage.overpayment_saving == saving
+
+    mortgage.loan_amount = 600
+    assert mortgage.new_total_interest == project.Mortgage(100, 5, 12, 'equal').total_interest
+
+
+"""
+Summary-only calculations tests.
+Testing that quotes calculated without payment schedules give the same results as the Mortgage class.
+"""
+
+@pytest.mark.summary_only_testing
+def test_quote_matches_mortgage(mortgage_equal, mortgage_decreasing):
+    for mortgage in [mortgage_equal, mortgage_decreasing]:
+        quote = project.Mortgage.quote(mortgage.loan_amount, mortgage.nominal_rate, mortgage.period_in_months,
+                                       mortgage.installments_type, mortgage.overpayment)
+
+        assert quote == (mortgage.loan_amount, mortgage.nominal_rate, mortgage.period_in_months,
+                         mortgage.installments_type, mortgage.overpayment, mortgage.monthly_payment,
+                         mortgage.total_amount, mortgage.total_interest, mortgage.new_monthly_payment,
+                         mortgage.new_total_amount, mortgage.new_total_interest, mortgage.overpayment_saving)
+        with pytest.raises(AttributeError):
+            quote.total_interest = 0
+
+@pytest.mark.summary_only_testing
+def test_summarize_calculates_no_schedules(mortgage_decreasing):
+    mortgage_decreasing.summarize()
+
+    assert 'all_installments' not in mortgage_decreasing._cache
+    assert 'new_all_installments' not in mortgage_decreasing._cache
+    assert 'payment_schedule' not in mortgage_decreasing._cache
+
+
+"""
+Portfolio mode tests.
+Testing pricing of loans read from a file by worker processes.
+"""
+
+@pytest.mark.portfolio_mode_testing
+def test_price_portfolio(tmp_path):
+    portfolio = tmp_path / "portfolio.csv"
+    portfolio.write_text("loan,rate,months,installments,overpayment\n"
+                         f"{TEST_LOAN_1e},{TEST_RATE_1e},{TEST_MONTHS_1e},{TEST_INSTALLMENTS_1e},{TEST_OVERPAYMENT_1e}\n"
+                         f"{TEST_LOAN_1d},{TEST_RATE_1d},{TEST_MONTHS_1d},{TEST_INSTALLMENTS_1d},\n"
+                         f"some_string,{TEST_RATE_1e},{TEST_MONTHS_1e},{TEST_INSTALLMENTS_1e},\n"
+                         f"{TEST_LOAN_1e},{TEST_RATE_1e},{TEST_MONTHS_1e},{TEST_INSTALLMENTS_1e},{2 * TEST_LOAN_1e}\n")
+    summary = tmp_path / "summary.csv"
+
+    assert project.price_portfolio(str(portfolio), str(summary), workers=2, chunk_size=1) == (4, 2)
+
+    rows = summary.read_text().splitlines()
+    assert rows[0] == ",".join(project.PORTFOLIO_SUMMARY_COLUMNS)
+    assert rows[1] == "1,50000.0,7.0,60,equal,5000.0,990.06,59403.6,9403.6,940.6,"
+    assert rows[2] == "2,50000.0,7.0,60,decreasing,,1125.0,58895.84,8895.84,,"
+    assert rows[3] == "3,some_string,7.0,60,equal,,,,,,Wrong loan amount format given. Please use float or int " \
+                      "value greater than 0."
+    assert rows[4].startswith("4,50000.0,7.0,60,equal,100000.0,,,,,An incorrect value of overpayment was given.")
+
+@pytest.mark.portfolio_mode_testing
+def test_read_portfolio_jsonl(tmp_path):
+    portfolio = tmp_path / "portfolio.jsonl"
+    portfolio.write_text('{"loan": 50000, "rate": 7, "months": 60, "installments": "equal"}\n\n'
+                         '{"loan": 50000, "rate": 7, "months": 60, "installments": "decreasing", "overpayment": 5000}\n'
+                         '{"loan": 10000, "rate": 5, "months": 12, "installments": "equal"}\n')
+
+    chunks = list(project.read_portfolio(str(portfolio), chunk_size=2))
+
+    assert chunks == [[[50000, 7, 60, 'equal', None], [50000, 7, 60, 'decreasing', 5000]],
+                      [[10000, 5, 12, 'equal', None]]]
+
+@pytest.mark.portfolio_mode_testing
+def test_read_portfolio_formats(tmp_path):
+    portfolio = tmp_path / "PORTFOLIO.CSV"
+    portfolio.write_text("loan,rate,months,installments,overpayment\n50000,7,60,equal,\n")
+    assert list(project.read_portfolio(str(portfolio), chunk_size=2)) == [[['50000', '7', '60', 'equal', '']]]
+
+    portfolio = tmp_path / "portfolio.Json"
+    portfolio.write_text('{"loan": 50000, "rate": 7, "months": 60, "installments": "equal"}\n')
+    assert list(project.read_portfolio(str(portfolio), chunk_size=2)) == [[[50000, 7, 60, 'equal', None]]]
+
+    for name in ["portfolio.txt", "portfolio"]:
+        with pytest.raises(ValueError) as message:
+            project.read_portfolio(str(tmp_path / name), chunk_size=2)
+        assert message.value.args[0] == project.Mortgage.VALUE_ERROR_MESSAGES['portfolio_format']
+    with pytest.raises(ValueError):
+        project.price_portfolio(str(tmp_path / "portfolio.txt"), str(tmp_path / "summary.csv"), workers=1)
+    assert not (tmp_path / "summary.csv").exists()
+
+@pytest.mark.portfolio_mode_testing
+def test_price_portfolio_jsonl_with_malformed_lines(tmp_path):
+    portfolio = tmp_path / "portfolio.jsonl"
+    portfolio.write_text('{"loan": 50000, "rate": 7, "months": 60, "installments": "equal"}\n'
+                         '{"loan": 50000, "rate": 7,\n'
+                         '[1, 2]\n'
+                         '{"loan": 50000, "rate": 7, "months": 60, "installments": "decreasing"}\n')
+    summary = tmp_path / "summary.csv"
+
+    assert project.price_portfolio(str(portfolio), str(summary), workers=1, chunk_size=2) == (4, 2)
+
+    rows = summary.read_text().splitlines()
+    assert rows[1] == "1,50000,7,60,equal,,990.06,59403.6,9403.6,,"
+    assert rows[2] == rows[3].replace("3,", "2,", 1) == "2,,,,,,,,,,Record is not a JSON object."
+    assert rows[4] == "4,50000,7,60,decreasing,,1125.0,58895.84,8895.84,,"
+
+
+"""
+Quote cache tests.
+Testing reuse of quotes, least recently used eviction and counters.
+"""
+
+@pytest.mark.quote_cache_testing
+def test_quote_cache_hits_and_eviction():
+    cache = project.QuoteCache(maxsize=2)
+
+    first = cache.quote(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, TEST_INSTALLMENTS_1e, TEST_OVERPAYMENT_1e)
+    assert cache.quote(float(TEST_LOAN_1e), TEST_RATE_1e, TEST_MONTHS_1e, TEST_INSTALLMENTS_1e,
+                       TEST_OVERPAYMENT_1e) is first
+    cache.quote(TEST_LOAN_1d, TEST_RATE_1d, TEST_MONTHS_1d, TEST_INSTALLMENTS_1d)
+    assert cache.quote(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, TEST_INSTALLMENTS_1e, TEST_OVERPAYMENT_1e) is first
+
+    # the decreasing quote is the least recently used one
+    cache.quote(TEST_LOAN_1e, TEST_RATE_1e, 2 * TEST_MONTHS_1e, TEST_INSTALLMENTS_1e)
+    assert cache.stats() == {'hits': 2, 'misses': 3, 'evictions': 1, 'size': 2, 'maxsize': 2}
+    assert cache.make_key(TEST_LOAN_1d, TEST_RATE_1d, TEST_MONTHS_1d, TEST_INSTALLMENTS_1d) not in cache._quotes
+    assert first.overpayment_saving == 940.6
+
+@pytest.mark.quote_cache_testing
+def test_quote_cache_incorrect_input_not_cached():
+    cache = project.QuoteCache()
+
+    with pytest.raises(ValueError):
+        cache.quote('some_string', TEST_RATE_1e, TEST_MONTHS_1e, TEST_INSTALLMENTS_1e)
+    with pytest.raises(ValueError):
+        cache.quote(-TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, TEST_INSTALLMENTS_1e)
+    assert len(cache) == 0
+
+@pytest.mark.quote_cache_testing
+def test_quote_cache_thread_safety():
+    cache = project.QuoteCache(maxsize=8)
+    months = [12 * (i % 16 + 1) for i in range(400)]
+
+    with ThreadPoolExecutor(8) as executor:
+        quotes = list(executor.map(lambda period: cache.quote(TEST_LOAN_1e, TEST_RATE_1e, period,
+                                                              TEST_INSTALLMENTS_1e), months))
+
+    assert [quote.period_in_months for quote in quotes] == months
+    stats = cache.stats()
+    assert stats['hits'] + stats['misses'] == len(months)
+    assert stats['size'] == 8
+
+
+"""
+Schedule storage tests.
+Testing that payment schedules are stored once and shared by all attributes and DataFrames.
+"""
+
+@pytest.mark.schedule_storage_testing
+def test_schedule_stored_once(mortgage_equal):
+    buffer = mortgage_equal.schedule_buffer
+
+    assert buffer.shape == (TEST_MONTHS_1e, 4)
+    for schedule in [mortgage_equal.all_installments, mortgage_equal.new_all_installments, mortgage_equal.remaining,
+                     mortgage_equal.new_remaining, mortgage_equal.payment_schedule.to_numpy(),
+                     mortgage_equal.payment_schedule_with_overpayment.to_numpy()]:
+        assert project.np.shares_memory(schedule, buffer)
+    assert mortgage_equal.payment_schedule.loc[TEST_MONTHS_1e].tolist() == [990.06, 0.0]
+    assert mortgage_equal.payment_schedule_with_overpayment.loc[1].tolist() == [990.06, 891.05, 58413.54, 52571.95]
+
+@pytest.mark.schedule_storage_testing
+def test_loan_characteristics_share_schedule_buffer():
+    for overpayment in [0, TEST_OVERPAYMENT_1e]:
+        mortgage = project.Mortgage(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, TEST_INSTALLMENTS_1e, overpayment)
+        lazy = mortgage.payment_schedule.to_numpy().copy()
+        mortgage.calculate_loan_characteristics()
+
+        schedules = [mortgage.all_installments, mortgage.remaining, mortgage.payment_schedule.to_numpy()]
+        if overpayment:
+            schedules += [mortgage.new_all_installments, mortgage.new_remaining]
+        for schedule in schedules:
+            assert np.shares_memory(schedule, mortgage.schedule_buffer)
+        assert np.array_equal(mortgage.payment_schedule.to_numpy(), lazy)
+
+@pytest.mark.schedule_storage_testing
+def test_schedule_buffer_read_only(mortgage_equal):
+    for schedule in [mortgage_equal.schedule_buffer, mortgage_equal.all_installments,
+                     mortgage_equal.new_all_installments, mortgage_equal.remaining, mortgage_equal.new_remaining]:
+        with pytest.raises(ValueError):
+            schedule[0] = 0
+    with pytest.raises(ValueError):
+        mortgage_equal.payment_schedule.iloc[0, 0] = 0
+    assert mortgage_equal.payment_schedule.loc[1].tolist() == [990.06, 58413.54]
+
+@pytest.mark.schedule_storage_testing
+def test_schedule_buffer_not_cached_after_failure(monkeypatch):
+    mortgage = project.Mortgage(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, TEST_INSTALLMENTS_1e, TEST_OVERPAYMENT_1e)
+
+    def failing_remaining(self, if_overpayment):
+        raise MemoryError
+    with monkeypatch.context() as patch:
+        patch.setattr(project.Mortgage, 'calculate_remaining', failing_remaining)
+        with pytest.raises(MemoryError):
+            mortgage.schedule_buffer
+    assert not {'schedule_buffer', 'all_installments', 'new_all_installments'} & set(mortgage._cache)
+
+    assert mortgage.payment_schedule_with_overpayment.loc[1].tolist() == [990.06, 891.05, 58413.54, 52571.95]
+
+@pytest.mark.schedule_storage_testing
+def test_remaining_without_negative_zero():
+    generator = np.random.default_rng(7)
+    for _ in range(200):
+        loan = round(float(generator.uniform(1000, 900000)), 2)
+        mortgage = project.Mortgage(loan, round(float(generator.uniform(0.5, 15)), 2), int(generator.integers(1, 480)),
+                                    str(generator.choice(['equal', 'decreasing'])), round(loan / 10, 2))
+        assert not np.signbit(mortgage.remaining).any()
+        assert not np.signbit(mortgage.new_remaining).any()
+    assert project.Mortgage(123456.78, 5.5, 37, 'equal', 1000).remaining[-1].tolist() == 0.0
+
+@pytest.mark.schedule_storage_testing
+def test_mortgage_has_no_instance_dict(mortgage_decreasing):
+    assert not hasattr(mortgage_decreasing, '__dict__')
+    with pytest.raises(AttributeError):
+        mortgage_decreasing.some_attribute = 0
+
+
+"""
+Startup tests.
+Testing that importing the program and calculating loan characteristics do not import pandas.
+"""
+
+@pytest.mark.startup_testing
+def test_pandas_not_imported_by_calculations():
+    code = "import sys\n" \
+           "import project\n" \
+           "mortgage = project.Mortgage(50000, 7, 60, 'decreasing', 5000)\n" \
+           "mortgage.schedule_buffer, mortgage.summarize(), project.calculate_decreasing_installments_saving(50000, 7, 60)\n" \
+           "print('pandas' in sys.modules)\n"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(project.__file__)))
+
+    assert result.stdout.strip() == 'False'
+
+@pytest.mark.startup_testing
+def test_pandas_not_imported_by_command_line(tmp_path):
+    code = "import sys, project\n" \
+           "sys.argv = ['project.py', '-l', '50000', '-r', '7', '-m', '60', '-i', 'equal', '-o', '5000']\n" \
+           "project.main()\n" \
+           "print('pandas' in sys.modules)\n"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=tmp_path,
+                            env={**os.environ, 'PYTHONPATH': os.path.dirname(os.path.abspath(project.__file__))})
+
+    assert "calculate_decreasing_installments_saving" in result.stdout
+    assert result.stdout.split()[-1] == 'False'
+    assert (tmp_path / "Payment_schedule.csv").exists()
+
+@pytest.mark.startup_testing
+def test_display_format_not_changed(mortgage_equal):
+    float_format = pd.get_option('display.float_format')
+    mortgage_equal.calculation_summary
+
+    assert pd.get_option('display.float_format') is float_format
+
+
+"""
+Benchmark suite tests.
+Testing that all benchmarks run and regressions are detected.
+"""
+
+@pytest.mark.benchmark_testing
+def test_run_benchmarks():
+    import benchmark
+
+    results = benchmark.run_benchmarks(repeat=2, months_list=[12], batch_sizes=[10], startup_repeat=0)
+
+    assert {result['name'] for result in results} == {
+        'mortgage_summary', 'mortgage_characteristics', 'mortgage_all_outputs', 'mortgage_schedule',
+        'mortgage_schedule_in_cents', 'save_schedule_to_csv',
+        'generate_mortgage_attributes_sheet', 'calculate_overpayment_saving',
+        'calculate_decreasing_installments_saving', 'mortgage_batch', 'mortgage_batch_apr', 'mortgage_grid',
+        'rate_scenarios'}
+    assert all(result['throughput_per_s'] > 0 and result['peak_memory_kb'] >= 0 for result in results)
+
+    slower = [dict(result, latency_us={'p50': 2 * result['latency_us']['p50']}) for result in results]
+    assert len(benchmark.compare_results(slower, results, threshold=0.5)) == len(results)
+    assert benchmark.compare_results(results, slower, threshold=0.5) == []
+
+
+"""
+Profiling tests.
+Testing that profiling hooks receive calculation stages and the profiler aggregates them.
+"""
+
+@pytest.mark.profiling_testing
+def test_profiling_hook_receives_stages(mortgage_equal):
+    calls = []
+    hook = lambda mortgage, stage, seconds, allocations: calls.append((mortgage, stage, seconds))
+
+    project.add_profiling_hook(hook)
+    try:
+        mortgage_equal.generate_calculation_summary()
+    finally:
+        project.remove_profiling_hook(hook)
+    mortgage_equal.generate_payment_schedule()
+
+    stages = [stage for mortgage, stage, seconds in calls]
+    assert stages[-1] == 'generate_calculation_summary'
+    assert {'calculate_monthly_payment', 'calculate_all_installments', 'calculate_total_amount',
+            'calculate_overpayment_saving'} <= set(stages)
+    assert all(mortgage is mortgage_equal and seconds >= 0 for mortgage, stage, seconds in calls)
+
+@pytest.mark.profiling_testing
+def test_stage_profiler_aggregates_many_mortgages():
+    with project.StageProfiler() as profiler:
+        for months in range(1, 11):
+            project.Mortgage(TEST_LOAN_1d, TEST_RATE_1d, months, TEST_INSTALLMENTS_1d).calculate_loan_characteristics()
+    project.Mortgage(TEST_LOAN_1d, TEST_RATE_1d, TEST_MONTHS_1d, TEST_INSTALLMENTS_1d).calculate_loan_characteristics()
+
+    summary = profiler.summary()
+    assert summary['calculate_loan_characteristics']['count'] == 10
+    assert summary['calculate_remaining']['count'] == 10
+    assert summary['calculate_loan_characteristics']['p50_us'] <= summary['calculate_loan_characteristics']['p99_us']
+    assert profiler.report().splitlines()[1].startswith('calculate_loan_characteristics')
+
+
+"""
+Streaming schedule tests.
+Testing that schedules generated month by month and streamed to csv files match the payment schedule DataFrames.
+"""
+
+@pytest.mark.streaming_schedule_testing
+def test_iter_schedule_matches_payment_schedule(mortgage_equal, mortgage_decreasing):
+    for mortgage in [mortgage_equal, mortgage_decreasing]:
+        rows = list(mortgage.iter_schedule())
+        rows_with_overpayment = list(mortgage.iter_schedule(with_overpayment=True))
+        assert 'schedule_buffer' not in mortgage._cache
+
+        assert rows == list(mortgage.payment_schedule.itertuples(name=None))
+        assert rows_with_overpayment == list(mortgage.payment_schedule_with_overpayment.itertuples(name=None))
+        assert list(mortgage.iter_schedule()) == rows
+
+@pytest.mark.streaming_schedule_testing
+def test_save_schedule_to_csv_layout(tmp_path, mortgage_decreasing):
+    path_to_save = str(tmp_path / "Payment_schedule.csv")
+    mortgage_decreasing.save_schedule_to_csv(path_to_save)
+
+    assert open(path_to_save).read() == mortgage_decreasing.payment_schedule.to_csv()
+    assert open(path_to_save[:-4] + "_with_overpayment.csv").read() == \
+           mortgage_decreasing.payment_schedule_with_overpayment.to_csv()
+
+@pytest.mark.streaming_schedule_testing
+def test_save_schedule_to_csv_matches_baseline_output(tmp_path):
+    # output of the original DataFrame based implementation (payment_schedule.to_csv)
+    expected = ",Installments,Remaining\n1,17831.22,106987.32\n2,17831.22,89156.1\n3,17831.22,71324.88\n" \
+               "4,17831.22,53493.66\n5,17831.22,35662.44\n6,17831.22,17831.22\n7,17831.22,0.0\n"
+    expected_with_overpayment = ",Installments,New installments,Remaining,New remaining\n" \
+                                "1,17831.22,17686.79,106987.32,106120.74\n2,17831.22,17686.79,89156.1,88433.95\n" \
+                                "3,17831.22,17686.79,71324.88,70747.16\n4,17831.22,17686.79,53493.66,53060.37\n" \
+                                "5,17831.22,17686.79,35662.44,35373.58\n6,17831.22,17686.79,17831.22,17686.79\n" \
+                                "7,17831.22,17686.79,0.0,0.0\n"
+    path_to_save = str(tmp_path / "Payment_schedule.csv")
+
+    # streamed month by month and read from the schedule buffer
+    for calculate_schedule in [False, True]:
+        mortgage = project.Mortgage(123456.78, 3.3, 7, 'equal', 1000)
+        if calculate_schedule:
+            mortgage.schedule_buffer
+        mortgage.save_schedule_to_csv(path_to_save)
+
+        assert open(path_to_save).read() == expected
+        assert open(path_to_save[:-4] + "_with_overpayment.csv").read() == expected_with_overpayment
+
+@pytest.mark.streaming_schedule_testing
+def test_save_schedules_to_csv(tmp_path):
+    mortgages = (project.Mortgage(TEST_LOAN_1e, TEST_RATE_1e, months, installments, overpayment)
+                 for months, installments, overpayment in [(12, 'equal', None), (6, 'decreasing', 1000),
+                                                           (3, 'equal', 500)])
+
+    paths = project.save_schedules_to_csv(mortgages, str(tmp_path / "Payment_schedules.csv"), loans_per_file=2)
+
+    assert [os.path.basename(path) for path in paths] == [
+        "Payment_schedules_1.csv", "Payment_schedules_1_with_overpayment.csv",
+        "Payment_schedules_2.csv", "Payment_schedules_2_with_overpayment.csv"]
+    first_file = open(paths[0]).read().splitlines()
+    assert first_file[0] == "Loan,,Installments,Remaining"
+    assert len(first_file) == 1 + 12 + 6
+    assert first_file[13].startswith("2,1,")
+    second_file_with_overpayment = open(paths[3]).read().splitlines()
+    assert second_file_with_overpayment[0] == "Loan,,Installments,New installments,Remaining,New remaining"
+    assert [row.split(',')[:2] for row in second_file_with_overpayment[1:]] == [['3', '1'], ['3', '2'], ['3', '3']]
+
+
+"""
+Binary export tests.
+Testing that schedules saved to .npy and Parquet files and loaded lazily match the Mortgage class.
+"""
+
+BINARY_EXPORT_LOANS = [(12, 'equal', None), (6, 'decreasing', 1000), (3, 'equal', 500)]
+
+@pytest.mark.binary_export_testing
+def test_save_schedules_to_npy(tmp_path):
+    mortgages = [project.Mortgage(TEST_LOAN_1e, TEST_RATE_1e, months, installments, overpayment)
+                 for months, installments, overpayment in BINARY_EXPORT_LOANS]
+
+    assert project.save_schedules_to_npy(iter(mortgages), str(tmp_path)) == 3
+    assert all('schedule_buffer' not in mortgage._cache for mortgage in mortgages)
+
+    store = project.ScheduleStore(str(tmp_path))
+    assert len(store) == 3
+    assert list(store.offsets) == [0, 12, 18, 21]
+    assert store[0][:, :4:2].tolist() == mortgages[0].schedule_buffer.tolist()
+    assert np.isnan(store[0][:, 1::2]).all()
+    assert store[-1][:, :4].tolist() == mortgages[2].schedule_buffer.tolist()
+    assert store[-1][:, 4:].tolist() == mortgages[2].decomposition_buffer.tolist()
+    assert isinstance(store.schedules, np.memmap)
+    with pytest.raises(IndexError):
+        store[3]
+
+    assert np.isnan(store.summaries[0]['overpayment']) and np.isnan(store.summaries[0]['overpayment_saving'])
+    assert store.summaries[1].tolist() == tuple(mortgages[1].summarize())
+
+@pytest.mark.binary_export_testing
+def test_save_schedules_to_parquet(tmp_path):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    mortgages = (project.Mortgage(TEST_LOAN_1e, TEST_RATE_1e, months, installments, overpayment)
+                 for months, installments, overpayment in BINARY_EXPORT_LOANS)
+
+    assert project.save_schedules_to_parquet(mortgages, str(tmp_path), row_group_size=10) == 3
+
+    schedules = parquet.read_table(str(tmp_path / "schedules.parquet")).to_pandas()
+    assert len(schedules) == 21
+    mortgage = project.Mortgage(TEST_LOAN_1e, TEST_RATE_1e, 6, 'decreasing', 1000)
+    second_loan = schedules[schedules['loan'] == 1]
+    assert second_loan['month'].tolist() == list(range(1, 7))
+    assert second_loan[project.SCHEDULE_COLUMNS[:4]].values.tolist() == mortgage.schedule_buffer.tolist()
+
+    summaries = parquet.read_table(str(tmp_path / "summaries.parquet")).to_pylist()
+    assert summaries[1]['installments_type'] == 'decreasing'
+    assert summaries[1]['overpayment_saving'] == mortgage.overpayment_saving
+
+
+"""
+Integer cents engine tests.
+Testing that schedules and totals calculated in int64 cents match the float results of the Mortgage class.
+"""
+
+@pytest.mark.integer_cents_testing
+def test_schedule_in_cents(mortgage_equal, mortgage_decreasing):
+    for mortgage in [mortgage_equal, mortgage_decreasing]:
+        schedule = mortgage.calculate_schedule_in_cents()
+        assert schedule.dtype == np.int64
+        assert (schedule == np.rint(mortgage.schedule_buffer * 100)).all()
+        assert schedule[-1, 2] == schedule[-1, 3] == 0
+
+@pytest.mark.integer_cents_testing
+def test_summarize_in_cents(mortgage_decreasing):
+    quote = mortgage_decreasing.summarize()
+    quote_in_cents = mortgage_decreasing.summarize_in_cents()
+
+    assert quote_in_cents.loan_amount == round(quote.loan_amount * 100)
+    assert quote_in_cents.nominal_rate == quote.nominal_rate
+    assert quote_in_cents.total_amount == round(quote.total_amount * 100)
+    assert quote_in_cents.new_total_interest == round(quote.new_total_interest * 100)
+    assert quote_in_cents.overpayment_saving == round(quote.overpayment_saving * 100)
+    assert all(isinstance(value, int) for value in quote_in_cents[5:])
+
+    quote_without_overpayment = project.Mortgage(TEST_LOAN_1e, TEST_RATE_1e, 12, 'equal').summarize_in_cents()
+    assert quote_without_overpayment.total_amount == quote_without_overpayment.monthly_payment * 12
+    assert quote_without_overpayment.new_total_amount is None
+
+@pytest.mark.integer_cents_testing
+def test_cross_check_cents():
+    generator = np.random.default_rng(13)
+    for _ in range(200):
+        loan = round(float(generator.uniform(1000, 900000)), 2)
+        mortgage = project.Mortgage(loan, round(float(generator.uniform(0.5, 15)), 2), int(generator.integers(1, 481)),
+                                    str(generator.choice(['equal', 'decreasing'])),
+                                    round(float(generator.uniform(1, loan / 2)), 2))
+        assert mortgage.cross_check_cents() == []
+
+
+"""
+Decomposition tests.
+Testing that installments are split into interest and principal consistent with the loan amount and total interest.
+"""
+
+@pytest.mark.decomposition_testing
+def test_decomposition_totals(mortgage_equal, mortgage_decreasing):
+    for mortgage in [mortgage_equal, mortgage_decreasing]:
+        for installments, interest, principal, outstanding_principal, loan_amount, total_interest in [
+            (mortgage.all_installments, mortgage.interest, mortgage.principal, mortgage.outstanding_principal,
+             mortgage.loan_amount, mortgage.total_interest),
+            (mortgage.new_all_installments, mortgage.new_interest, mortgage.new_principal,
+             mortgage.new_outstanding_principal, mortgage.loan_amount - mortgage.overpayment,
+             mortgage.new_total_interest)]:
+            assert np.allclose(interest + principal, installments)
+            assert round(float(principal.sum()), 2) == loan_amount
+            assert round(float(interest.sum()), 2) == total_interest
+            assert np.allclose(outstanding_principal, loan_amount - np.cumsum(principal))
+            assert outstanding_principal[-1] == 0
+
+@pytest.mark.decomposition_testing
+def test_decomposition_interest_not_negative():
+    mortgage = project.Mortgage(115525.32, 12.54, 472, 'equal')
+    assert (mortgage.interest >= 0).all()
+    assert np.allclose(mortgage.interest + mortgage.principal, mortgage.all_installments)
+    assert mortgage.interest[-1] == 0 and mortgage.outstanding_principal[-1] == 50.44
+    assert round(float(mortgage.principal.sum() + mortgage.outstanding_principal[-1]), 2) == mortgage.loan_amount
+
+    mortgage = project.Mortgage(3146.36, 10.65, 471, 'equal')
+    assert (mortgage.interest >= 0).all() and (mortgage.outstanding_principal >= 0).all()
+    assert round(float(mortgage.principal.sum()), 2) == mortgage.loan_amount
+    assert round(float(mortgage.interest.sum()), 2) == mortgage.total_interest
+
+    for loan, rate, months, installments in zip([1000, 50000, 250000.55, 99999.99], [0.5, 3.3, 7.25, 15],
+                                                [12, 120, 360, 480], ['equal', 'decreasing', 'equal', 'equal']):
+        mortgage = project.Mortgage(loan, rate, months, installments, loan / 10)
+        assert (mortgage.interest >= 0).all() and (mortgage.new_interest >= 0).all()
+
+@pytest.mark.decomposition_testing
+def test_decomposition_values(mortgage_equal, mortgage_decreasing):
+    assert mortgage_decreasing.payment_decomposition.iloc[0].tolist() == [1125.0, 291.67, 833.33, 49166.67]
+    assert np.allclose(mortgage_decreasing.principal, TEST_LOAN_1d / TEST_MONTHS_1d, atol=0.01)
+
+    months = np.arange(1, TEST_MONTHS_1e)
+    exact_interest = project.closed_form_cumulative_interest(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e,
+                                                             TEST_INSTALLMENTS_1e, months)
+    assert np.allclose(np.cumsum(mortgage_equal.interest)[:-1], exact_interest, atol=0.01 * months)
+
+    mortgage = project.Mortgage(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, TEST_INSTALLMENTS_1e)
+    assert mortgage.new_interest is None and mortgage.payment_decomposition_with_overpayment is None
+    assert list(mortgage_equal.payment_decomposition_with_overpayment.columns) == \
+           ['Installments', 'New installments'] + project.DECOMPOSITION_WITH_OVERPAYMENT_CSV_HEADER
+
+@pytest.mark.decomposition_testing
+def test_save_schedule_to_csv_with_decomposition(tmp_path, mortgage_decreasing):
+    path_to_save = str(tmp_path / "Payment_schedule.csv")
+    mortgage_decreasing.save_schedule_to_csv(path_to_save, decomposition=True)
+
+    rows = open(path_to_save).read().splitlines()
+    assert rows[0] == ",Installments,Remaining,Interest,Principal,Outstanding principal"
+    assert rows[1] == "1,1125.0,57770.84,291.67,833.33,49166.67"
+    rows_with_overpayment = open(path_to_save[:-4] + "_with_overpayment.csv").read().splitlines()
+    assert len(rows_with_overpayment[0].split(',')) == 11
+    assert rows_with_overpayment[-1].endswith(",0.0,0.0")
+
+    paths = project.save_schedules_to_csv([mortgage_decreasing], str(tmp_path / "Payment_schedules.csv"),
+                                          decomposition=True)
+    assert open(paths[0]).read().splitlines()[1] == "1," + rows[1]
+
+
+"""
+Rate-sensitivity grid tests.
+Testing that characteristics calculated for every combination of axes values match the Mortgage class.
+"""
+
+@pytest.mark.grid_testing
+def test_grid_matches_mortgage(mortgage_equal, mortgage_decreasing):
+    axes = {'nominal_rate': [3, 4.55, 9], 'period_in_months': [12, 120, 481], 'overpayment': [0, 1000, 5000]}
+    for mortgage in [mortgage_equal, mortgage_decreasing]:
+        grid = project.MortgageGrid(mortgage, exact=True, **axes)
+        assert grid.shape == (3, 3, 3) and grid.monthly_payment.shape == (3, 3, 3)
+        for i, rate in enumerate(axes['nominal_rate']):
+            for j, months in enumerate(axes['period_in_months']):
+                for k, overpayment in enumerate(axes['overpayment']):
+                    quote = project.Mortgage(mortgage.loan_amount, rate, months, mortgage.installments_type,
+                                             overpayment or None).summarize()
+                    for name in project.MortgageGrid.CHARACTERISTICS:
+                        expected = getattr(quote, name)
+                        assert np.isnan(grid[name][i, j, k]) if expected is None else grid[name][i, j, k] == expected
+
+@pytest.mark.grid_testing
+def test_grid_closed_form_decreasing(mortgage_decreasing):
+    grid = project.MortgageGrid(mortgage_decreasing, nominal_rate=np.arange(3, 9, 0.05),
+                                period_in_months=np.arange(120, 481, 40), loan_amount=[100000, 500000])
+    exact_grid = project.MortgageGrid(mortgage_decreasing, exact=True, nominal_rate=np.arange(3, 9, 0.05),
+                                      period_in_months=np.arange(120, 481, 40), loan_amount=[100000, 500000])
+    assert (grid.monthly_payment == exact_grid.monthly_payment).all()
+    assert np.allclose(grid.total_interest, exact_grid.total_interest, atol=0.5)
+
+    frame = grid.to_frame()
+    assert list(frame.index.names) == ['nominal_rate', 'period_in_months', 'loan_amount']
+    assert len(frame) == grid.monthly_payment.size
+    assert frame['total_interest'].iloc[-1] == grid.total_interest[-1, -1, -1]
+
+@pytest.mark.grid_testing
+def test_grid_incorrect_axes(mortgage_equal):
+    with pytest.raises(ValueError, match="nominal rate"):
+        project.MortgageGrid(mortgage_equal, nominal_rate=[3, 0])
+    with pytest.raises(ValueError, match="period in months format"):
+        project.MortgageGrid(mortgage_equal, period_in_months=[12.5])
+    with pytest.raises(ValueError, match="overpayment"):
+        project.MortgageGrid(mortgage_equal, loan_amount=[1000, 100000], overpayment=[5000])
+    with pytest.raises(ValueError, match="Unknown grid axis"):
+        project.MortgageGrid(mortgage_equal, installments_type=['equal'])
+
+
+"""
+Inverse solvers tests.
+Testing that solved loan amounts, periods and rates are the limits of monthly payments calculated by the Mortgage class.
+"""
+
+def monthly_payment(loan_amount, nominal_rate, period_in_months, installments_type):
+    return project.Mortgage(float(loan_amount), float(nominal_rate), int(period_in_months),
+                            str(installments_type)).monthly_payment
+
+@pytest.mark.inverse_solvers_testing
+def test_max_affordable_loan():
+    generator = np.random.default_rng(16)
+    caps, rates = generator.uniform(300, 8000, 200).round(2), generator.uniform(1, 12, 200).round(2)
+    months, types = generator.integers(1, 481, 200), generator.choice(['equal', 'decreasing'], 200)
+
+    loans = project.max_affordable_loan(caps, rates, months, types)
+    for cap, loan, rate, period, installments in zip(caps, loans, rates, months, types):
+        assert monthly_payment(loan, rate, period, installments) <= cap
+        assert monthly_payment(round(loan + 0.01, 2), rate, period, installments) > cap
+
+    assert project.max_affordable_loan(990.06, TEST_RATE_1e, TEST_MONTHS_1e, 'equal') >= \
+           TEST_LOAN_1e
+    assert np.isnan(project.max_affordable_loan(0, TEST_RATE_1e, TEST_MONTHS_1e, 'equal'))
+
+@pytest.mark.inverse_solvers_testing
+def test_min_period_for_payment():
+    generator = np.random.default_rng(17)
+    caps, loans = generator.uniform(300, 8000, 200).round(2), generator.uniform(20000, 900000, 200).round(2)
+    rates, types = generator.uniform(1, 12, 200).round(2), generator.choice(['equal', 'decreasing'], 200)
+
+    periods = project.min_period_for_payment(caps, loans, rates, types)
+    for cap, loan, rate, period, installments in zip(caps, loans, rates, periods, types):
+        if np.isnan(period):
+            assert loan * rate / 1200 >= cap
+            continue
+        assert monthly_payment(loan, rate, period, installments) <= cap
+        assert period == 1 or monthly_payment(loan, rate, period - 1, installments) > cap
+
+    assert project.min_period_for_payment(1125, TEST_LOAN_1d, TEST_RATE_1d, 'decreasing') == TEST_MONTHS_1d
+    assert np.isnan(project.min_period_for_payment(1125, TEST_LOAN_1d, TEST_RATE_1d, 'decreasing',
+                                                   max_period_in_months=TEST_MONTHS_1d - 1))
+
+@pytest.mark.inverse_solvers_testing
+def test_max_rate_for_payment():
+    generator = np.random.default_rng(18)
+    caps, loans = generator.uniform(300, 8000, 200).round(2), generator.uniform(20000, 900000, 200).round(2)
+    months, types = generator.integers(1, 481, 200), generator.choice(['equal', 'decreasing'], 200)
+
+    rates = project.max_rate_for_payment(caps, loans, months, types)
+    for cap, loan, rate, period, installments in zip(caps, loans, rates, months, types):
+        if np.isnan(rate):
+            assert monthly_payment(loan, 0.01, period, installments) > cap
+            continue
+        assert monthly_payment(loan, rate, period, installments) <= cap
+        assert monthly_payment(loan, round(rate + 0.01, 2), period, installments) > cap
+
+    assert project.max_rate_for_payment(990.06, TEST_LOAN_1e, TEST_MONTHS_1e, 'equal') == TEST_RATE_1e
+    with pytest.raises(ValueError):
+        project.max_rate_for_payment(990.06, TEST_LOAN_1e, TEST_MONTHS_1e, 'constant')
+
+
+"""
+APR tests.
+Testing internal rates of return of cash flow schedules and APR of loans calculated by the Mortgage and MortgageBatch classes.
+"""
+
+@pytest.mark.apr_testing
+def test_calculate_irr():
+    result = project.calculate_irr([[-100, 110, 0], [-100, 0, 121], [-100, 50, 60], [100, 1, 1]])
+
+    assert np.allclose(result.rate[:2], 0.1)
+    assert np.isclose(-100 + 50 / (1 + result.rate[2]) + 60 / (1 + result.rate[2]) ** 2, 0)
+    assert result.converged.tolist() == [True, True, True, False]
+    assert result.iterations == 50
+
+@pytest.mark.apr_testing
+def test_mortgage_apr(mortgage_equal, mortgage_decreasing):
+    for mortgage in [mortgage_equal, mortgage_decreasing]:
+        effective_rate = project.calculate_effective_annual_rate(mortgage.nominal_rate / 100 / 12)
+        assert abs(mortgage.apr - effective_rate) < 0.01
+        assert abs(mortgage.new_apr - effective_rate) < 0.01
+
+        monthly_rate = (1 + mortgage.new_apr / 100) ** (1 / 12) - 1
+        discount = (1 + monthly_rate) ** -np.arange(1, mortgage.period_in_months + 1)
+        assert np.isclose((mortgage.new_all_installments * discount).sum(), mortgage.loan_amount - mortgage.overpayment)
+
+    assert project.Mortgage(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, TEST_INSTALLMENTS_1e).new_apr is None
+
+@pytest.mark.apr_testing
+def test_batch_apr():
+    generator = np.random.default_rng(17)
+    loans = (generator.uniform(10000, 900000, 300).round(2), generator.uniform(1, 10, 300).round(2),
+             generator.choice([1, 12, 120, 360, 480], 300), generator.choice(['equal', 'decreasing'], 300),
+             np.where(generator.random(300) < 0.5, 5000.0, np.nan))
+    batch = project.MortgageBatch(*loans)
+
+    assert batch.calculate_apr().all()
+    for i, (loan, rate, months, installments, overpayment) in enumerate(zip(*loans)):
+        mortgage = project.Mortgage(float(loan), float(rate), int(months), str(installments),
+                                    None if np.isnan(overpayment) else float(overpayment))
+        assert abs(batch.apr[i] - mortgage.apr) < 1e-8
+        assert np.isnan(batch.new_apr[i]) if mortgage.new_apr is None else abs(batch.new_apr[i] - mortgage.new_apr) < 1e-8
+
+    closed_form_batch = project.MortgageBatch(*loans, exact=False)
+    closed_form_batch.calculate_apr()
+    assert np.allclose(closed_form_batch.apr, batch.apr, atol=0.01)
+
+
+"""
+Overpayment plan tests.
+Testing simulations of loans with many overpayment events for both strategies - shortening the period and reducing installments.
+"""
+
+@pytest.mark.overpayment_plan_testing
+def test_plan_without_events_matches_mortgage(mortgage_equal, mortgage_decreasing):
+    for mortgage in [mortgage_equal, mortgage_decreasing]:
+        for plan, installments in [(project.OverpaymentPlanBatch(mortgage.loan_amount, mortgage.nominal_rate,
+                                                                 mortgage.period_in_months, mortgage.installments_type,
+                                                                 [[]]), mortgage.all_installments),
+                                   (mortgage.simulate_overpayments([], 'reduce'), mortgage.new_all_installments)]:
+            assert plan.months[0] == mortgage.period_in_months
+            assert (plan.installments[0, :-1] == installments[:-1]).all()
+            assert abs(plan.installments[0, -1] - installments[-1]) < 1
+            assert plan.outstanding_principal[0, -1] == 0
+
+@pytest.mark.overpayment_plan_testing
+def test_plan_strategies(mortgage_equal, mortgage_decreasing):
+    events = project.recurring_overpayments(1000, TEST_MONTHS_1e, every=12) + [(30, 2500.5)]
+    assert events[:2] == [(12, 1000), (24, 1000)]
+
+    for mortgage in [mortgage_equal, mortgage_decreasing]:
+        shorten = mortgage.simulate_overpayments(events, 'shorten')
+        reduce = mortgage.simulate_overpayments(events, 'reduce')
+
+        assert shorten.months[0] < reduce.months[0] == mortgage.period_in_months
+        assert shorten.total_interest[0] < reduce.total_interest[0] < mortgage.new_total_interest
+        assert reduce.installments[0, 12] < mortgage.new_all_installments[12]
+        if mortgage.installments_type == 'equal':
+            assert shorten.installments[0, 12] == mortgage.monthly_payment
+        for plan in [shorten, reduce]:
+            assert plan.total_overpayment[0] == mortgage.overpayment + plan.overpayments[0, 1:].sum()
+            assert round(plan.principal[0].sum() + plan.total_overpayment[0], 2) == mortgage.loan_amount
+            assert np.allclose(plan.installments, plan.interest + plan.principal)
+            assert plan.total_amount[0] == round(plan.total_interest[0] + mortgage.loan_amount, 2)
+
+        schedule = shorten.schedule(0)
+        assert list(schedule.columns) == ['Installments', 'Overpayment', 'Interest', 'Principal',
+                                          'Outstanding principal']
+        assert len(schedule) == shorten.months[0] and schedule['Outstanding principal'].iloc[-1] == 0
+        assert schedule['Overpayment'].loc[30] == 2500.5
+
+@pytest.mark.overpayment_plan_testing
+def test_plan_batch_matches_single_plans():
+    generator = np.random.default_rng(18)
+    loans = (generator.uniform(10000, 900000, 50).round(2), generator.uniform(1, 10, 50).round(2),
+             generator.choice([12, 120, 360], 50), generator.choice(['equal', 'decreasing'], 50),
+             generator.choice(['shorten', 'reduce'], 50))
+    plans = [[(int(month), float(amount)) for month, amount in zip(generator.integers(0, 12, 3),
+                                                                    generator.uniform(100, 5000, 3).round(2))]
+             for _ in range(50)]
+
+    batch = project.OverpaymentPlanBatch(*loans[:4], plans, loans[4])
+    for i, (loan, rate, months, installments, strategy) in enumerate(zip(*loans)):
+        plan = project.Mortgage(float(loan), float(rate), int(months), str(installments)).simulate_overpayments(
+            plans[i], str(strategy))
+        assert (plan.installments[0] == batch.installments[i, :months]).all()
+        assert plan.total_interest[0] == batch.total_interest[i]
+
+@pytest.mark.overpayment_plan_testing
+def test_plan_incorrect_input(mortgage_equal):
+    with pytest.raises(ValueError, match="overpayment event"):
+        mortgage_equal.simulate_overpayments([(TEST_MONTHS_1e + 1, 100)])
+    with pytest.raises(ValueError, match="overpayment event"):
+        mortgage_equal.simulate_overpayments([(1, -100)])
+    with pytest.raises(ValueError, match="overpayment event"):
+        mortgage_equal.simulate_overpayments([1, 100])
+    with pytest.raises(ValueError, match="overpayment strategy"):
+        mortgage_equal.simulate_overpayments([(1, 100)], 'skip')
+
+
+"""
+Variable rate tests.
+Testing that rate changes recalculate only following months and give the same schedules as full simulations.
+"""
+
+@pytest.mark.variable_rate_testing
+def test_variable_rate_without_changes(mortgage_equal, mortgage_decreasing):
+    for mortgage in [mortgage_equal, mortgage_decreasing]:
+        loans = mortgage.simulate_rate_changes([])
+        assert (loans.installments[0] == mortgage.simulate_overpayments([], 'reduce').installments[0]).all()
+        assert (loans.installments[0, :-1] == mortgage.new_all_installments[:-1]).all()
+        assert (loans.rates == mortgage.nominal_rate).all()
+
+@pytest.mark.variable_rate_testing
+def test_variable_rate_changes(mortgage_equal, mortgage_decreasing):
+    for mortgage in [mortgage_equal, mortgage_decreasing]:
+        loans = mortgage.simulate_rate_changes([(13, 9), (25, 5.5)])
+        schedule = loans.schedule(0)
+
+        assert schedule['Nominal rate'].loc[[12, 13, 25]].tolist() == [7, 9, 5.5]
+        assert schedule['Installments'].loc[13] > schedule['Installments'].loc[12]
+        assert schedule['Installments'].loc[25] < schedule['Installments'].loc[24]
+        assert schedule['Outstanding principal'].iloc[-1] == 0
+        assert round(schedule['Principal'].sum(), 2) == mortgage.loan_amount - mortgage.overpayment
+        if mortgage.installments_type == 'decreasing':
+            assert np.allclose(schedule['Principal'].iloc[:-1], (TEST_LOAN_1d - TEST_OVERPAYMENT_1d) / TEST_MONTHS_1d,
+                               atol=0.01)
+
+@pytest.mark.variable_rate_testing
+def test_variable_rate_incremental_updates():
+    generator = np.random.default_rng(19)
+    loans = (generator.uniform(10000, 900000, 100).round(2), generator.uniform(1, 10, 100).round(2),
+             generator.choice([12, 120, 360], 100), generator.choice(['equal', 'decreasing'], 100))
+    batch = project.VariableRateBatch(*loans)
+    assert batch.recalculated_months == loans[2].sum()
+
+    rates = {}
+    for month in [3, 6, 9, 12]:
+        rates[month] = generator.uniform(1, 10, 100).round(2)
+        recalculated_months = batch.recalculated_months
+        batch.update_rates(month, rates[month])
+        assert batch.recalculated_months - recalculated_months == (loans[2] - month + 1).sum()
+    batch.update_rates(100, 3.5, rows=np.flatnonzero(loans[2] >= 100))
+
+    full_batch = project.VariableRateBatch(*loans, rate_changes=[
+        [(month, rates[month][row]) for month in rates] + ([(100, 3.5)] if loans[2][row] >= 100 else [])
+        for row in range(100)])
+    assert (full_batch.rates == batch.rates).all()
+    assert (full_batch.installments == batch.installments).all()
+    assert (full_batch.outstanding_principal == batch.outstanding_principal).all()
+
+@pytest.mark.variable_rate_testing
+def test_variable_rate_incorrect_input(mortgage_equal):
+    with pytest.raises(ValueError, match="rate change"):
+        mortgage_equal.simulate_rate_changes([(TEST_MONTHS_1e + 1, 5)])
+    with pytest.raises(ValueError, match="rate change"):
+        mortgage_equal.simulate_rate_changes([(12, 0)])
+
+
+"""
+Monte Carlo tests.
+Testing that rate scenarios are reproducible from the seed regardless of the number of workers and consistent with 
+fixed rate schedules.
+"""
+
+@pytest.mark.monte_carlo_testing
+def test_rate_paths():
+    rates = project.simulate_rate_paths(5, 24, 500, mean_rate=3, reversion_speed=2, volatility=1, reset_every=6,
+                                        seed=20)
+    assert rates.shape == (500, 24)
+    assert (rates[:, 0] == 5).all()
+    assert (rates[:, :6] == 5).all() and (rates[:, 6:12] == rates[:, [6]]).all()
+    assert rates[:, -1].mean() < 4
+    assert (project.simulate_rate_paths(5, 24, 500, seed=20) == project.simulate_rate_paths(5, 24, 500, seed=20)).all()
+    assert (project.simulate_rate_paths(1, 120, 100, volatility=5, seed=20) >= 0.01).all()
+
+@pytest.mark.monte_carlo_testing
+def test_rate_scenarios_reproducible(mortgage_equal, mortgage_decreasing):
+    mortgages = [mortgage_equal, mortgage_decreasing]
+    result = project.simulate_rate_scenarios(mortgages, paths=250, seed=7, workers=1, chunk_size=100)
+    parallel_result = project.simulate_rate_scenarios(mortgages, paths=250, seed=7, workers=2, chunk_size=100)
+    assert (result.total_interest == parallel_result.total_interest).all()
+    assert (result.payment_shock == parallel_result.payment_shock).all()
+    assert result.total_interest.shape == result.payment_shock.shape == (2, 4)
+    assert (np.diff(result.total_interest, axis=1) >= 0).all()
+    assert (project.simulate_rate_scenarios(mortgages, paths=250, seed=8, workers=1, chunk_size=100).total_interest
+            != result.total_interest).any()
+
+@pytest.mark.monte_carlo_testing
+def test_rate_scenarios_without_volatility(mortgage_equal, mortgage_decreasing):
+    mortgages = [mortgage_equal, mortgage_decreasing]
+    result = project.simulate_rate_scenarios(mortgages, paths=10, volatility=0, workers=1, percentiles=[50])
+    for row, mortgage in enumerate(mortgages):
+        fixed_rate = mortgage.simulate_rate_changes([])
+        assert result.total_interest[row, 0] == fixed_rate.total_interest[0]
+        assert result.payment_shock[row, 0] == 0
+
+
+"""
+Quote server tests.
+Testing that quotes served over HTTP match the Mortgage class, identical requests are coalesced and distinct requests
+are priced in batches.
+"""
+
+async def _http_request(port, target, body=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    content = json.dumps(body).encode() if body is not None else b''
+    writer.write(f"{'POST' if body is not None else 'GET'} {target} HTTP/1.1\r\nHost: localhost\r\n"
+                 f"Content-Length: {len(content)}\r\nConnection: close\r\n\r\n".encode() + content)
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(content)
+
+@pytest.mark.quote_server_testing
+def test_quote_server_quotes():
+    async def requests():
+        async with project.QuoteServer(port=0) as server:
+            return await asyncio.gather(
+                _http_request(server.port, f"/quote?loan={TEST_LOAN_1e}&rate={TEST_RATE_1e}&months={TEST_MONTHS_1e}"
+                                           f"&installments=equal&overpayment={TEST_OVERPAYMENT_1e}"),
+                _http_request(server.port, "/quote", {'loan': TEST_LOAN_1d, 'rate': TEST_RATE_1d,
+                                                      'months': TEST_MONTHS_1d, 'installments': 'decreasing'}),
+                _http_request(server.port, "/quote?loan=50000&rate=seven&months=60&installments=equal"),
+                _http_request(server.port, "/schedule?loan=50000&rate=7&months=12&installments=decreasing"),
+                _http_request(server.port, "/unknown"))
+
+    equal, decreasing, wrong_rate, schedule, unknown = asyncio.run(requests())
+    assert equal == (200, project.Mortgage.quote(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, 'equal',
+                                                 TEST_OVERPAYMENT_1e)._asdict())
+    assert decreasing == (200, project.Mortgage.quote(TEST_LOAN_1d, TEST_RATE_1d, TEST_MONTHS_1d,
+                                                      'decreasing')._asdict())
+    assert wrong_rate == (400, {'error': project.Mortgage.VALUE_ERROR_MESSAGES['nominal_rate_wrong_format'].strip()})
+    assert schedule[0] == 200 and len(schedule[1]['rows']) == 12
+    assert schedule[1]['rows'][-1][2] == 0
+    assert unknown[0] == 404
+
+@pytest.mark.quote_server_testing
+def test_quote_server_coalescing_and_batching():
+    async def requests():
+        async with project.QuoteServer(port=0, batch_window=0.05) as server:
+            responses = await asyncio.gather(*[_http_request(
+                server.port, f"/quote?loan={10000 + request % 20}&rate=5&months=360&installments=decreasing")
+                for request in range(100)])
+            metrics = (await _http_request(server.port, "/metrics"))[1]
+            return responses, metrics, sum(server.batch_sizes)
+
+    responses, metrics, priced = asyncio.run(requests())
+    assert all(status == 200 for status, _ in responses)
+    assert responses[0][1]['total_amount'] == responses[20][1]['total_amount'] == \
+        project.Mortgage(10000, 5, 360, 'decreasing').total_amount
+    assert metrics['requests'] == 101
+    assert metrics['coalesced'] + priced == 100
+    assert metrics['batches'] < 20 and metrics['batch_size']['max'] <= 20
+    assert metrics['latency_ms']['p50'] <= metrics['latency_ms']['p99']
+
+@pytest.mark.quote_server_testing
+def test_quote_server_isolates_failing_requests():
+    async def requests():
+        async with project.QuoteServer(port=0, batch_window=0.05) as server:
+            return await asyncio.gather(
+                _http_request(server.port, "/quote?loan=50000&rate=7&months=60&installments=equal"),
+                _http_request(server.port, "/quote", {'loan': 50000, 'rate': 7, 'months': 10 ** 20,
+                                                      'installments': 'equal'}),
+                _http_request(server.port, "/quote?loan=10000&rate=5&months=12&installments=decreasing"))
+
+    first, failing, last = asyncio.run(requests())
+    assert first == (200, project.Mortgage.quote(50000.0, 7.0, 60, 'equal')._asdict())
+    assert failing[0] == 500 and failing[1]['error'].startswith("OverflowError")
+    assert last == (200, project.Mortgage.quote(10000.0, 5.0, 12, 'decreasing')._asdict())
+
+
+"""
+Result store tests.
+Testing that quotes and schedules stored in the SQLite store are reused across store instances and runs
+and match the Mortgage class.
+"""
+
+@pytest.mark.result_store_testing
+def test_result_store_quotes(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    keys = [project.QuoteCache.make_key(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, 'equal', TEST_OVERPAYMENT_1e),
+            project.QuoteCache.make_key(TEST_LOAN_1d, TEST_RATE_1d, TEST_MONTHS_1d, 'decreasing')]
+
+    with project.ResultStore(path) as store:
+        assert store.get_many(keys) == [None, None]
+        quotes = store.quote_many(keys)
+        assert len(store) == 2
+
+    expected = [project.Mortgage.quote(*key) for key in keys]
+    with project.ResultStore(path) as store:
+        assert store.quote_many(keys + keys[:1]) == quotes + quotes[:1] == expected + expected[:1]
+        assert (store.hits, store.misses) == (3, 0)
+        store.quote_many([project.QuoteCache.make_key(10000, 5, 12, 'equal')])
+        assert (store.hits, store.misses, len(store)) == (3, 1, 3)
+
+        assert store.engine == store.stats()['engine'] == project.ENGINE_VERSION
+        store.engine = "other engine"
+        assert store.get_many(keys) == [None, None]
+        assert store.stats()['stale_results'] == 3
+        assert store.purge(stale_only=True) == 3
+        assert store.stats()['results'] == 0
+
+@pytest.mark.result_store_testing
+def test_result_store_schedules(tmp_path, mortgage_equal, mortgage_decreasing):
+    path = str(tmp_path / "results.sqlite")
+    with project.ResultStore(path) as store:
+        assert store.warm([mortgage_equal, mortgage_decreasing]) == 2
+        assert store.warm([mortgage_equal]) == 0
+        for mortgage in [mortgage_equal, mortgage_decreasing]:
+            key = project.QuoteCache.make_key(mortgage.loan_amount, mortgage.nominal_rate, mortgage.period_in_months,
+                                              mortgage.installments_type, mortgage.overpayment)
+            assert (store.schedule_buffer(key) == mortgage.schedule_buffer).all()
+        assert store.schedule_buffer(project.QuoteCache.make_key(10000, 5, 12, 'equal')) is None
+        assert store.stats()['schedules'] == 2
+        assert store.purge() == 2
+
+@pytest.mark.result_store_testing
+def test_price_portfolio_with_result_store(tmp_path):
+    portfolio = tmp_path / "portfolio.csv"
+    portfolio.write_text("loan,rate,months,installments,overpayment\n"
+                         f"{TEST_LOAN_1e},{TEST_RATE_1e},{TEST_MONTHS_1e},{TEST_INSTALLMENTS_1e},{TEST_OVERPAYMENT_1e}\n"
+                         f"{TEST_LOAN_1d},{TEST_RATE_1d},{TEST_MONTHS_1d},{TEST_INSTALLMENTS_1d},\n"
+                         f"some_string,{TEST_RATE_1e},{TEST_MONTHS_1e},{TEST_INSTALLMENTS_1e},\n")
+    path = str(tmp_path / "results.sqlite")
+    summaries = [tmp_path / "summary.csv", tmp_path / "stored_summary.csv", tmp_path / "second_summary.csv"]
+
+    project.price_portfolio(str(portfolio), str(summaries[0]), workers=1)
+    project.price_portfolio(str(portfolio), str(summaries[1]), workers=2, chunk_size=1, store_path=path)
+    project.price_portfolio(str(portfolio), str(summaries[2]), workers=2, chunk_size=1, store_path=path)
+
+    assert summaries[0].read_text() == summaries[1].read_text() == summaries[2].read_text()
+    assert project.warm_store(str(portfolio), path) == (2, 2)
+    with project.ResultStore(path) as store:
+        assert store.stats()['results'] == store.stats()['schedules'] == 2
+
+
+"""
+Streaming mode tests.
+Testing that JSON lines of loan parameters are streamed to result records matching the Mortgage class, with error
+records instead of exceptions for incorrect records.
+"""
+
+@pytest.mark.streaming_mode_testing
+def test_stream_quotes():
+    lines = [json.dumps({'id': 1, 'loan': TEST_LOAN_1e, 'rate': TEST_RATE_1e, 'months': TEST_MONTHS_1e,
+                         'installments': TEST_INSTALLMENTS_1e, 'overpayment': TEST_OVERPAYMENT_1e}),
+             "[1, 2]", "",
+             json.dumps({'id': 3, 'loan': TEST_LOAN_1d, 'rate': -1, 'months': TEST_MONTHS_1d,
+                         'installments': TEST_INSTALLMENTS_1d}),
+             json.dumps({'loan': TEST_LOAN_1d, 'rate': TEST_RATE_1d, 'months': TEST_MONTHS_1d,
+                         'installments': TEST_INSTALLMENTS_1d, 'schedule': True})]
+    output = io.StringIO()
+
+    assert project.stream_quotes(io.StringIO("\n".join(lines * 3)), output, chunk_size=2) == (12, 6)
+
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert results[:4] == results[4:8] == results[8:]
+    assert results[0] == {'id': 1, **project.Mortgage.quote(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e,
+                                                            TEST_INSTALLMENTS_1e, TEST_OVERPAYMENT_1e)._asdict()}
+    assert results[1] == {'error': "Record is not a JSON object."}
+    assert results[2] == {'id': 3, 'error': project.Mortgage.VALUE_ERROR_MESSAGES['nominal_rate'].strip()}
+    mortgage = project.Mortgage(TEST_LOAN_1d, TEST_RATE_1d, TEST_MONTHS_1d, TEST_INSTALLMENTS_1d)
+    assert results[3]['total_amount'] == mortgage.total_amount
+    assert results[3]['schedule']['rows'] == [list(row) for row in mortgage.iter_schedule(decomposition=True)]
+
+@pytest.mark.streaming_mode_testing
+def test_stream_quotes_with_failing_loan(tmp_path):
+    lines = [json.dumps({'id': record, 'loan': 10000, 'rate': 5, 'months': months, 'installments': 'equal'})
+             for record, months in enumerate([120, 10 ** 20, 60])]
+
+    for store_path in [None, str(tmp_path / "results.db")]:
+        output = io.StringIO()
+        assert project.stream_quotes(io.StringIO("\n".join(lines)), output, store_path=store_path) == (3, 1)
+
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        assert [result['id'] for result in results] == [0, 1, 2]
+        assert results[0]['monthly_payment'] == project.Mortgage(10000, 5, 120, 'equal').monthly_payment
+        assert set(results[1]) == {'id', 'error'} and results[1]['error'].startswith("OverflowError")
+        assert results[2]['monthly_payment'] == project.Mortgage(10000, 5, 60, 'equal').monthly_payment
+
+@pytest.mark.streaming_mode_testing
+def test_stream_quotes_with_non_finite_results():
+    lines = ['{"id": 1, "loan": 1e400, "rate": 5, "months": 12, "installments": "equal"}',
+             '{"id": 2, "loan": 1000, "rate": 1e400, "months": 12, "installments": "equal"}',
+             '{"id": 3, "loan": 1000, "rate": 5, "months": 12, "installments": "equal"}']
+    output = io.StringIO()
+
+    with np.errstate(all='ignore'):
+        assert project.stream_quotes(io.StringIO("\n".join(lines)), output) == (3, 2)
+
+    results = [json.loads(line, parse_constant=pytest.fail) for line in output.getvalue().splitlines()]
+    assert [result['error'] for result in results[:2]] == [project.NON_FINITE_ERROR_MESSAGE] * 2
+    assert results[2]['monthly_payment'] == project.Mortgage(1000, 5, 12, 'equal').monthly_payment
+
+@pytest.mark.streaming_mode_testing
+def test_stream_quotes_with_undecodable_line():
+    records = "".join(json.dumps({'id': record, 'loan': 10000, 'rate': 5, 'months': 120, 'installments': 'equal'})
+                      + "\n" for record in range(500)).encode()
+    input_file = io.TextIOWrapper(io.BytesIO(records + b'{"id": 500, "loan": "\xff"}\n' + records), encoding='utf-8')
+    output = io.StringIO()
+
+    record_count, error_count = project.stream_quotes(input_file, output, chunk_size=100)
+
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert record_count == len(results) > 1 and error_count == 1
+    assert [result['id'] for result in results[:-1]] == list(range(len(results) - 1))
+    assert results[-1]['error'].startswith("Reading input failed - UnicodeDecodeError")
+
+@pytest.mark.streaming_mode_testing
+def test_stream_mode_command_line():
+    records = "".join(json.dumps({'id': record, 'loan': 10000 + record, 'rate': 5, 'months': 120,
+                                  'installments': 'equal'}) + "\n" for record in range(1000))
+    result = subprocess.run([sys.executable, "project.py", "--stream", "--chunk-size=100"], input=records,
+                            capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(project.__file__)))
+
+    results = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [result['id'] for result in results] == list(range(1000))
+    assert results[-1]['monthly_payment'] == project.Mortgage(10999, 5, 120, 'equal').monthly_payment
+
+
+"""
+Text renderer tests.
+Testing that sheets and full schedules rendered without pandas in all styles contain the values of the DataFrames.
+"""
+
+@pytest.mark.text_renderer_testing
+def test_render_schedule_styles(mortgage_equal, mortgage_decreasing):
+    for mortgage in [mortgage_equal, mortgage_decreasing]:
+        schedule = mortgage.payment_schedule_with_overpayment
+
+        output = io.StringIO()
+        mortgage.render_schedule(output, 'csv', with_overpayment=True)
+        assert output.getvalue().splitlines()[0] == ",".join(project.SCHEDULE_WITH_OVERPAYMENT_CSV_HEADER)
+        rendered = pd.read_csv(io.StringIO(output.getvalue()), index_col=0)
+        assert np.allclose(rendered.to_numpy(), schedule.to_numpy(), atol=0.005, rtol=0)
+
+        output = io.StringIO()
+        mortgage.render_schedule(output, 'fixed', with_overpayment=True)
+        lines = output.getvalue().splitlines()
+        assert len(lines) == len(schedule) + 1 and len(set(map(len, lines))) == 1
+        assert lines[-1].split() == [str(len(schedule))] + [f"{value:.2f}" for value in schedule.iloc[-1]]
+
+        output = io.StringIO()
+        mortgage.render_schedule(output, 'markdown', decomposition=True)
+        lines = output.getvalue().splitlines()
+        assert lines[0] == "|  | " + " | ".join(project.SCHEDULE_CSV_HEADER[1:] +
+                                                project.DECOMPOSITION_CSV_HEADER) + " |"
+        first_row = next(mortgage.iter_schedule(decomposition=True))
+        assert lines[2] == "| 1 | " + " | ".join(f"{value:.2f}" for value in first_row[1:]) + " |"
+        assert len(lines) == len(schedule) + 2
+
+@pytest.mark.text_renderer_testing
+def test_render_sheets(mortgage_equal):
+    output = io.StringIO()
+    mortgage_equal.render_sheets(output)
+    sheet, summary = output.getvalue().split("\n\n")
+    assert sheet.splitlines()[1].split() == ['Loan', 'amount', str(TEST_LOAN_1e)]
+    assert summary.splitlines()[-1].split()[-1] == f"{mortgage_equal.new_monthly_payment:.2f}"
+    assert len(summary.splitlines()) == len(mortgage_equal.calculation_summary) + 1
+
+    output = io.StringIO()
+    mortgage_equal.render_sheets(output, 'csv')
+    assert output.getvalue().splitlines()[2] == '"Nominal interest rate, %",7'
+
+    with pytest.raises(ValueError, match="render style"):
+        mortgage_equal.render_schedule(output, 'html')
+
+
+"""
+Bulk validation tests.
+Testing that columns validated at once give the same valid rows and error messages as the Mortgage class.
+"""
+
+@pytest.mark.bulk_validation_testing
+def test_validate_loans_matches_mortgage():
+    values = {'loan': [50000, 1000.5, -1, 0, 'x', None, True],
+              'rate': [7, 3.5, 0, -2, '7', None],
+              'months': [60, 0, -5, 60.0, '60', None],
+              'installments': ['equal', 'decreasing', 'other', 1, None],
+              'overpayment': [None, 0, 500, -3, 2000000, 'x', '', 1000.5]}
+    generator = np.random.default_rng(25)
+    rows = [[values[column][generator.integers(len(values[column]))] for column in values] for _ in range(2000)]
+
+    validation = project.validate_loans(*zip(*rows))
+
+    for number, row in enumerate(rows):
+        errors = validation.errors[validation.errors['row'] == number]
+        try:
+            project.Mortgage(*row)
+        except ValueError as error:
+            assert not validation.valid[number]
+            assert errors['message'][0] == str(error).strip()
+        else:
+            assert validation.valid[number] and len(errors) == 0
+    assert set(validation.errors['field']) == {'loan_amount', 'nominal_rate', 'period_in_months', 'installments_type',
+                                               'overpayment'}
+
+@pytest.mark.bulk_validation_testing
+def test_validate_loans_arrays():
+    validation = project.validate_loans(np.array([50000.0, 50000.0, -1.0, 1000.0]), np.array([7, 7, 7, 0]),
+                                        np.array([60, 60, 60, 12]), np.array(['equal', 'monthly', 'equal', 'equal']),
+                                        np.array([np.nan, 5000.0, np.nan, 2000.0]))
+
+    assert validation.valid.tolist() == [True, False, False, False]
+    assert validation.errors[['row', 'field']].tolist() == [(1, 'installments_type'), (2, 'loan_amount'),
+                                                           (3, 'nominal_rate'), (3, 'overpayment')]
+    assert validation.errors['message'][0] == project.Mortgage.VALUE_ERROR_MESSAGES['installments_type'].strip()
+
+    assert not project.validate_loans([50000], [7], np.array([60.0]), ['equal']).valid.any()
+
+@pytest.mark.bulk_validation_testing
+def test_mortgage_batch_validated():
+    batch, validation = project.MortgageBatch.validated(
+        [TEST_LOAN_1e, 'x', TEST_LOAN_1d], [TEST_RATE_1e, 7, TEST_RATE_1d], [TEST_MONTHS_1e, 60, TEST_MONTHS_1d],
+        [TEST_INSTALLMENTS_1e, 'equal', TEST_INSTALLMENTS_1d], [TEST_OVERPAYMENT_1e, None, None])
+
+    assert validation.valid.tolist() == [True, False, True]
+    assert len(batch) == 2
+    assert batch.monthly_payment.tolist() == [
+        project.Mortgage(TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, TEST_INSTALLMENTS_1e).monthly_payment,
+        project.Mortgage(TEST_LOAN_1d, TEST_RATE_1d, TEST_MONTHS_1d, TEST_INSTALLMENTS_1d).monthly_payment]
+    assert batch.overpayment_saving[0] == project.calculate_overpayment_saving(
+        TEST_LOAN_1e, TEST_RATE_1e, TEST_MONTHS_1e, TEST_INSTALLMENTS_1e, TEST_OVERPAYMENT_1e)
+    assert np.isnan(batch.overpayment_saving[1])
+
+    assert project.MortgageBatch.validated([-1], [7], [60], ['equal'])[0] is None